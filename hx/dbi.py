@@ -1,31 +1,44 @@
 """
 Database interface classes
 """
+import array
 import base64
+import binascii
+import collections
 import contextlib
 import cfg
+import copy
+import itertools
+import logging
 import msg
+import multiprocessing
 import pdb
+import Queue
+import random
 import sqlite3
 import string
 import sys
+import threading
 import time
 import util as U
 import warnings
 
-try:
-    import ibm_db as db2
-    import ibm_db_dbi
-    db2_available = True
-except ImportError:
-    db2_available = False
+# The database drivers are imported the first time a connection of their type
+# is created (see load_driver()), so a program that never talks to mysql or
+# db2 doesn't pay to load their drivers
+db2 = None
+ibm_db_dbi = None
+mysql = None
+mysql_exc = None
 
-try:
-    import MySQLdb as mysql
-    import _mysql_exceptions as mysql_exc
-    mysql_available = True
-except ImportError:
-    mysql_available = False
+# Likewise numpy, the first time a columnar select needs it (see
+# column_array()). False means it isn't installed.
+numpy = None
+
+# The shapes select() and select_iter() can return rows in, and the named row
+# classes made so far (see row_class())
+row_formats = ('tuple', 'named', 'dict')
+row_classes = {}
 
 
 # -----------------------------------------------------------------------------
@@ -34,6 +47,34 @@ class DBI_abstract(object):
     DBI_abstract: Each of the specific database interface classes (DBIsqlite,
     DBImysql, etc.) inherit from this one
     """
+    retries = 0     # how many times retry() has had to try again
+    lost = False    # True when the connection has been lost
+    reconnects = 0  # how many times we've connected again after a loss
+    lock_waits = 0          # how many times we've hit lock contention
+    lock_wait_time = 0.0    # seconds spent waiting on locks
+
+    stage_table = 'hx_stage'    # temp table for bulk_update(), bulk_delete()
+    native_rows = 'tuple'       # row format when no row_format is given
+    escaped = '\x00\n\r\\\'"\x1a'   # characters escaped in a string literal
+
+    # optional arguments every database type takes (see arginfo())
+    common_opt = [('catalog_ttl', 60),
+                  ('cmd_cache_size', 500),
+                  ('lazy', False),
+                  ('row_format', ''),
+                  ('instrument', False),
+                  ('stats_interval', 0),
+                  ('slow_query_time', 0.0),
+                  ('slow_query_log', ''),
+                  ('slow_query_logsize', 10 * 1024 * 1024),
+                  ('slow_query_logmax', 5)]
+
+    # optional arguments for the database types that retry (see retry_setup())
+    retry_opt = [('retry_policy', None),
+                 ('retry_base', 0.1),
+                 ('retry_jitter', 0.5),
+                 ('breaker_threshold', 10),
+                 ('breaker_reset', 30.0)]
 
     # -------------------------------------------------------------------------
     def prefix(self, tabname):
@@ -56,24 +97,212 @@ class DBI_abstract(object):
     # -------------------------------------------------------------------------
     def retry(self, exception, payload, *args, **kwargs):
         """
-        DBI_abstract: Call *payload*. If it does not throw an exception, we're
-        done -- return. OTOH, if it does throw an exception, we call the
-        database specific err_handler(). It will either throw a DBIerror up the
-        stack and we're done, or it will sleep an appropriate amount of time
-        and return so we can keep trying again until the timeout expires.
+        DBI_abstract: Call *payload* under our retry policy (see RetryPolicy).
+        If it throws *exception*, the database specific err_handler() either
+        throws a DBIerror up the stack or returns to say the error is
+        transient, in which case the policy waits and tries again.
+        """
+        before = self.retry_policy.counts['retries']
+        try:
+            return self.retry_policy.run(exception, self.retry_classify,
+                                         self.attempt, payload,
+                                         *args, **kwargs)
+        finally:
+            self.retries += self.retry_policy.counts['retries'] - before
 
-        The timeout is set when the DBI object is instantiated.
+    # -------------------------------------------------------------------------
+    def retry_classify(self, err):
         """
-        rval = None
-        done = False
-        start = time.time()
-        while not done and time.time() - start < self.timeout:
-            try:
-                rval = payload(*args, **kwargs)
-                done = True
-            except exception as e:
-                self.err_handler(e)
-        return rval
+        DBI_abstract: Pass *err* to err_handler(), telling it the operation
+        will be retried if it returns
+        """
+        self.err_handler(err, retry=True)
+
+    # -------------------------------------------------------------------------
+    def attempt(self, payload, *args, **kwargs):
+        """
+        DBI_abstract: One try at *payload* for retry(). If the connection was
+        lost, we connect again first, so the operation is replayed on a
+        working connection.
+        """
+        self.reconnect_if_lost()
+        return payload(*args, **kwargs)
+
+    # -------------------------------------------------------------------------
+    def contended(self, err):
+        """
+        DBI_abstract: Return True if *err* means another connection has the
+        data locked. Only sqlite has to wait for other connections on the
+        client side.
+        """
+        return False
+
+    # -------------------------------------------------------------------------
+    def binary_param(self, value):
+        """
+        DBI_abstract: Return binary *value* ready to be bound to a '?' in a
+        statement, so it compares as bytes rather than text. Mysql takes a
+        plain string.
+        """
+        return value
+
+    # -------------------------------------------------------------------------
+    def lose_connection(self):
+        """
+        DBI_abstract: The connection is gone. Let go of it and anything tied
+        to it so the next operation starts over with a new one.
+        """
+        self.lost = True
+        self.disconnect()
+
+    # -------------------------------------------------------------------------
+    def new_cursor(self):
+        """
+        DBI_abstract: Make a cursor on the current connection for the cursor
+        cache
+        """
+        return self.dbh.cursor()
+
+    # -------------------------------------------------------------------------
+    def reconnect(self):
+        """
+        DBI_abstract: If the connection was lost, connect again, retrying
+        under the retry policy while the database is unreachable
+        """
+        if self.lost:
+            self.retry(self.db_error, self.reconnect_if_lost)
+
+    # -------------------------------------------------------------------------
+    def reconnect_if_lost(self):
+        """
+        DBI_abstract: If the connection was lost, make a new one from the
+        arguments we were built with. connect() restores the session settings
+        (autocommit, for example). The first connection (made here too) is not
+        a reconnection, so it's not counted.
+        """
+        if self.lost:
+            first = self.dbh is None
+            self.connect()
+            self.lost = False
+            if not first:
+                self.reconnects += 1
+                cfg.log("%s: reconnected to the database" % self.dbname)
+
+    # -------------------------------------------------------------------------
+    def retry_setup(self):
+        """
+        DBI_abstract: Set up the retry policy from the options. The caller can
+        pass in a policy object of its own (retry_policy), which is used as
+        is. Otherwise, operations are retried for up to timeout seconds.
+        """
+        if type(self.retry_policy) == str:
+            raise DBIerror(msg.invalid_opt_SS % ('retry_policy',
+                                                 self.retry_policy))
+        elif self.retry_policy is None:
+            self.retry_policy = RetryPolicy(name=self.dbname,
+                                            deadline=self.timeout,
+                                            base=self.retry_base,
+                                            cap=self.retry_cap,
+                                            jitter=self.retry_jitter,
+                                            threshold=self.breaker_threshold,
+                                            reset=self.breaker_reset)
+
+    # -------------------------------------------------------------------------
+    def row_chunks(self, data, rows, nbytes):
+        """
+        DBI_abstract: Split the rows in *data* into lists of at most *rows*
+        rows whose values come to no more than about *nbytes* bytes when
+        written into a statement. A single row bigger than *nbytes* gets a
+        chunk to itself.
+        """
+        chunk = []
+        size = 0
+        for row in data:
+            # each value is quoted and followed by a comma
+            rsize = sum([self.value_bytes(x) + 3 for x in row]) + 3
+            if chunk and (rows <= len(chunk) or nbytes < size + rsize):
+                yield chunk
+                chunk = []
+                size = 0
+            chunk.append(row)
+            size += rsize
+        if chunk:
+            yield chunk
+
+    # -------------------------------------------------------------------------
+    def value_bytes(self, value):
+        """
+        DBI_abstract: Return about how many bytes *value* takes up written
+        into a statement. Unicode goes out as utf-8, and each quote,
+        backslash, or control character in a string gets escaped, taking two
+        bytes.
+        """
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        elif not isinstance(value, str):
+            return len(repr(value))
+        return len(value) + sum([value.count(c) for c in self.escaped])
+
+    # -------------------------------------------------------------------------
+    @contextlib.contextmanager
+    def transaction(self, savepoint=True):
+        """
+        DBI_abstract: See DBI.transaction(). The database specific class
+        provides begin_cmd (the statement that opens a transaction) and
+        txn_sql() to run the transaction control statements.
+        """
+        depth = getattr(self, 'txn_depth', 0)
+        if 0 < depth and not savepoint:
+            # Just become part of the transaction that's already open
+            yield self
+            return
+
+        if depth == 0:
+            self.reconnect()
+            self.txn_sql(self.begin_cmd)
+        else:
+            spname = "hx_sp%d" % depth
+            self.txn_sql("savepoint %s" % spname)
+
+        self.txn_depth = depth + 1
+        try:
+            yield self
+        except:
+            self.txn_depth = depth
+            self.txn_undo(depth)
+            raise
+        else:
+            self.txn_depth = depth
+            if depth == 0:
+                try:
+                    self.txn_sql("commit")
+                except:
+                    # Don't leave the connection inside the transaction
+                    self.txn_undo(depth)
+                    raise
+            else:
+                self.txn_sql("release savepoint %s" % spname)
+
+    # -------------------------------------------------------------------------
+    def txn_undo(self, depth):
+        """
+        DBI_abstract: Roll back the transaction() block at *depth* while the
+        caller is handling an exception. If the rollback fails too (say, the
+        connection is gone), we log that and let the caller raise the
+        exception it already has.
+        """
+        # A rollback can undo a create or drop in the block
+        self.catalog.clear()
+        try:
+            if depth == 0:
+                self.txn_sql("rollback")
+            else:
+                spname = "hx_sp%d" % depth
+                self.txn_sql("rollback to savepoint %s" % spname)
+                self.txn_sql("release savepoint %s" % spname)
+        except DBIerror as e:
+            cfg.log("%s: transaction rollback failed: %s" %
+                    (self.dbname, str(e)))
 
     # -------------------------------------------------------------------------
     def validate_args(self, ai, kw, cname):
@@ -92,6 +321,337 @@ class DBI_abstract(object):
             if a not in kw:
                 raise DBIerror(msg.missing_arg_S % a)
 
+        # Finally, default any optional arguments that were not passed. Values
+        # that came from a cfg arrive as strings, so we convert them to the
+        # type of the default.
+        for a, default in ai['opt']:
+            if a not in kw:
+                setattr(self, a, default)
+            elif type(kw[a]) == str and type(default) == bool:
+                setattr(self, a, kw[a].lower() in ['1', 'true', 'yes', 'on'])
+            elif type(kw[a]) == str and type(default) in [int, float]:
+                try:
+                    setattr(self, a, type(default)(kw[a]))
+                except ValueError:
+                    raise DBIerror(msg.invalid_opt_SS % (a, kw[a]))
+
+    # -------------------------------------------------------------------------
+    def batch_size(self, batch):
+        """
+        DBI_abstract: Return the number of rows to fetch at a time. If the
+        caller didn't say (*batch* is None), we use the fetchsize set when the
+        object was built.
+        """
+        if batch is None:
+            batch = self.fetchsize
+        if type(batch) != int or batch <= 0:
+            raise DBIerror(msg.batch_int, dbname=self.dbname)
+        return batch
+
+    # -------------------------------------------------------------------------
+    def data_rows(self, data, caller, empty_msg):
+        """
+        DBI_abstract: Check that *data* is a list or some other iterable of
+        rows, like a generator (but not a string, tuple, or dict), with at
+        least one row in it. Return something that iterates over all of the
+        rows. A list comes back as is. Any other iterable is wrapped so the row
+        we had to look at to see if it was empty isn't lost.
+        """
+        if (type(data) in [str, unicode, tuple, dict] or
+                not hasattr(data, '__iter__')):
+            raise DBIerror(msg.data_list_S % caller, dbname=self.dbname)
+        elif type(data) == list:
+            if data == []:
+                raise DBIerror(empty_msg, dbname=self.dbname)
+            return data
+
+        rows = iter(data)
+        try:
+            first = next(rows)
+        except StopIteration:
+            raise DBIerror(empty_msg, dbname=self.dbname)
+        return itertools.chain([first], rows)
+
+    # -------------------------------------------------------------------------
+    def data_batches(self, data):
+        """
+        DBI_abstract: Generate lists of at most fetchsize rows from *data*. A
+        list is already in memory, so it comes back in one piece.
+        """
+        if type(data) == list:
+            yield data
+            return
+
+        rows = iter(data)
+        chunk = list(itertools.islice(rows, self.fetchsize))
+        while chunk:
+            yield chunk
+            chunk = list(itertools.islice(rows, self.fetchsize))
+
+    # -------------------------------------------------------------------------
+    def upsert_args(self, caller, table, fields, keys, data):
+        """
+        DBI_abstract: Validate the arguments to upsert(). Return the data rows
+        (see data_rows()) and the list of fields that are not keys, which are
+        the ones to be updated when a row is already present.
+        """
+        if type(table) != str:
+            raise DBIerror(msg.tbl_name_str_S % caller, dbname=self.dbname)
+        elif table == '':
+            raise DBIerror(msg.tbl_name_notmt_S % caller, dbname=self.dbname)
+        elif type(fields) != list:
+            raise DBIerror(msg.fields_list_S % caller, dbname=self.dbname)
+        elif fields == []:
+            raise DBIerror(msg.fields_notmt_S % caller, dbname=self.dbname)
+        elif type(keys) != list:
+            raise DBIerror(msg.keys_list_S % caller, dbname=self.dbname)
+        elif keys == []:
+            raise DBIerror(msg.keys_notmt_S % caller, dbname=self.dbname)
+        elif [k for k in keys if k not in fields]:
+            raise DBIerror(msg.keys_fields_S % caller, dbname=self.dbname)
+        data = self.data_rows(data, caller, msg.data_list_notmt)
+        return data, [f for f in fields if f not in keys]
+
+    # -------------------------------------------------------------------------
+    def delete_cmd(self, caller, table, where, data):
+        """
+        DBI_abstract: Return the statement for delete(). The backend's
+        delete_sql() checks the arguments and builds it the first time; after
+        that it comes from the command cache. Arguments of the wrong type are
+        never looked up (u'tbl' == 'tbl', but only 'tbl' passes the checks).
+        *caller* names the routine for error messages.
+        """
+        if type(table) is str and type(where) is str:
+            cmd = self.commands.get(('delete', table, where),
+                                    self.delete_sql, caller, table, where)
+        else:
+            cmd = self.delete_sql(caller, table, where)
+        self.where_data(caller, where, data, required=True)
+        return cmd
+
+    # -------------------------------------------------------------------------
+    def insert_cmd(self, caller, table, fields, ignore):
+        """
+        DBI_abstract: Return the statement for insert(), from the command
+        cache if we can. See delete_cmd().
+        """
+        if (type(table) is str and type(fields) is list and
+                type(ignore) is bool):
+            return self.commands.get(('insert', table, tuple(fields), ignore),
+                                     self.insert_sql, caller, table, fields,
+                                     ignore)
+        return self.insert_sql(caller, table, fields, ignore)
+
+    # -------------------------------------------------------------------------
+    def select_cmd(self, caller, table='', fields=[], where='', data=(),
+                   groupby='', orderby='', limit=None, offset=None):
+        """
+        DBI_abstract: Return the statement for select() or select_iter(),
+        from the command cache if we can. See delete_cmd(). The types of
+        *limit* and *offset* are part of the key since True == 1 but only 1
+        is a limit.
+        """
+        if (type(table) is str and type(fields) is list and
+                type(where) is str and type(groupby) is str and
+                type(orderby) is str):
+            cmd = self.commands.get(('select', table, tuple(fields), where,
+                                     groupby, orderby, limit, type(limit),
+                                     offset, type(offset)),
+                                    self.select_sql, caller, table, fields,
+                                    where, groupby, orderby, limit, offset)
+        else:
+            cmd = self.select_sql(caller, table, fields, where, groupby,
+                                  orderby, limit, offset)
+        self.where_data(caller, where, data)
+        return cmd
+
+    # -------------------------------------------------------------------------
+    def update_cmd(self, caller, table, where, fields):
+        """
+        DBI_abstract: Return the statement for update(), from the command
+        cache if we can. See delete_cmd().
+        """
+        if type(table) is str and type(where) is str and type(fields) is list:
+            return self.commands.get(('update', table, where, tuple(fields)),
+                                     self.update_sql, caller, table, where,
+                                     fields)
+        return self.update_sql(caller, table, where, fields)
+
+    # -------------------------------------------------------------------------
+    def where_data(self, caller, where, data, required=False):
+        """
+        DBI_abstract: Check *data* against the placeholders in *where*. This
+        depends on the data, so it's done on every call, even when the
+        statement comes from the command cache. With *required*, a where with
+        placeholders must have data.
+        """
+        if type(data) != tuple:
+            raise DBIerror(msg.data_tuple_S % caller, dbname=self.dbname)
+        elif '?' not in where and data != ():
+            raise DBIerror(msg.data_ignored, dbname=self.dbname)
+        elif required and '?' in where and data == ():
+            raise DBIerror(msg.crit_incomplete, dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def bulk_apply(self, table, fields, keys, data, cmd):
+        """
+        DBI_abstract: Load *data* (rows of *fields*) into a temporary staging
+        table indexed on *keys* and then run *cmd*, which joins the staging
+        table (stage_table, aliased as s) to *table*. It all happens in one
+        transaction, which also saves sqlite from committing each staged row.
+        The backend supplies bulk_exec() to run the statements and
+        stage_sql() to build the staging table.
+        """
+        stage = self.stage_table
+        start = time.time()
+        with self.transaction(savepoint=False):
+            create = self.stage_sql(stage, table, fields, keys)
+            self.bulk_exec(create[0])
+            try:
+                for stmt in create[1:]:
+                    self.bulk_exec(stmt)
+                self.bulk_exec("insert into %s(%s) values (%s)" %
+                               (stage, ",".join(fields),
+                                ",".join(["?" for x in fields])),
+                               data)
+                count = self.bulk_exec(cmd)
+            finally:
+                self.bulk_exec(self.stage_drop % stage)
+        self.log_slow(cmd, 0, count, start)
+
+    # -------------------------------------------------------------------------
+    def stage_sql(self, stage, table, fields, keys):
+        """
+        DBI_abstract: Return the statements that create staging table
+        *stage*, shaped like *fields* of *table* and indexed on *keys*. The
+        first one creates the table.
+        """
+        return ["create temporary table %s as select %s from %s "
+                "where 1 = 0" % (stage, ",".join(fields), self.prefix(table)),
+                "create index %s_idx on %s(%s)" % (stage, stage,
+                                                   ",".join(keys))]
+
+    # -------------------------------------------------------------------------
+    def bulk_match(self, table, keys):
+        """
+        DBI_abstract: Return the condition matching rows of *table* to the
+        staging table (aliased s) on *keys*
+        """
+        return " and ".join(["%s.%s = s.%s" % (table, k, k) for k in keys])
+
+    # -------------------------------------------------------------------------
+    def fetch_batches(self, cursor, batch, exception, cmd, params, start,
+                      row_format='tuple'):
+        """
+        DBI_abstract: Generate the rows waiting on *cursor*, pulling them from
+        the database *batch* rows at a time and handing them over in
+        *row_format*, or for 'columns', a batch at a time as columns. The
+        cursor is closed as soon as the rows run out or the consumer closes
+        the generator, whichever comes first. Database errors (*exception*)
+        are converted to DBIerror.
+
+        *cmd*, *params*, and *start* (when the statement was started) are for
+        log_slow(). The time includes however long the consumer takes.
+        """
+        count = 0
+        try:
+            if row_format != 'tuple':
+                names = self.column_names(cursor)
+            rows = cursor.fetchmany(batch)
+            while rows:
+                if row_format == 'columns':
+                    count += len(rows)
+                    yield columnar(rows, names)
+                    rows = cursor.fetchmany(batch)
+                    continue
+                elif row_format != 'tuple':
+                    rows = self.format_rows(rows, names, row_format)
+                for row in rows:
+                    count += 1
+                    yield row
+                rows = cursor.fetchmany(batch)
+        except exception as e:
+            raise DBIerror(str(e), dbname=self.dbname)
+        finally:
+            self.close_cursor(cursor)
+            self.log_slow(cmd, params, count, start)
+
+    # -------------------------------------------------------------------------
+    def column_names(self, cursor):
+        """
+        DBI_abstract: Return the names of the columns in *cursor*'s result
+        """
+        return [d[0] for d in cursor.description]
+
+    # -------------------------------------------------------------------------
+    def format_rows(self, rows, names, row_format):
+        """
+        DBI_abstract: Return *rows* (tuples) in *row_format*: as they are
+        ('tuple'), as named rows (see row_class()), as dicts keyed by the
+        column *names*, or turned into columns (see columnar())
+        """
+        if row_format == 'tuple':
+            return rows
+        elif row_format == 'named':
+            return map(row_class(names)._make, rows)
+        elif row_format == 'columns':
+            return columnar(rows, names)
+        return [dict(zip(names, row)) for row in rows]
+
+    # -------------------------------------------------------------------------
+    def row_format_default(self, row_format, columnar=False):
+        """
+        DBI_abstract: Resolve the *row_format* and *columnar* arguments to
+        select() or select_iter(). A row_format of None means the
+        connection's row_format option, and no option means whatever the
+        database hands back (native_rows). Columnar results are made from
+        tuples, so for those, return 'columns' in place of the row format.
+        """
+        if type(columnar) != bool:
+            raise DBIerror(msg.invalid_opt_SS % ('columnar', columnar),
+                           dbname=self.dbname)
+        if row_format is None:
+            row_format = self.row_format or self.native_rows
+        if row_format not in row_formats:
+            raise DBIerror(msg.invalid_opt_SS % ('row_format', row_format),
+                           dbname=self.dbname)
+        return 'columns' if columnar else row_format
+
+    # -------------------------------------------------------------------------
+    def close_cursor(self, cursor):
+        """
+        DBI_abstract: Close a cursor that fetch_batches() is done with
+        """
+        cursor.close()
+
+    # -------------------------------------------------------------------------
+    def log_slow(self, cmd, params, rows, start):
+        """
+        DBI_abstract: If the statement *cmd*, started at time *start*, took at
+        least slow_query_time seconds, write it to the slow query log along
+        with how many parameters were bound to it (per row, for statements
+        run over many rows), how many rows it returned or affected, and how
+        long it took. A slow_query_time of 0 turns this off.
+
+        The slow query log is the file named by slow_query_log, rotated and
+        archived like the main log once it reaches slow_query_logsize bytes,
+        or the main log (cfg.log()) if slow_query_log is not set.
+        """
+        if self.slow_query_time <= 0:
+            return
+        elapsed = time.time() - start
+        if elapsed < self.slow_query_time:
+            return
+
+        text = ("slow query (dbname=%s): %.6f seconds, %d params, %d rows: %s"
+                % (self.dbname, elapsed, params, rows, cmd))
+        if self.slow_query_log:
+            slow_logger(self.slow_query_log,
+                        self.slow_query_logsize,
+                        self.slow_query_logmax).info(text)
+        else:
+            cfg.log(text)
+
 
 # -----------------------------------------------------------------------------
 class DBI(object):
@@ -142,6 +702,21 @@ class DBI(object):
           'password' - for connecting to database; required if cfg absent and
              dbtype is not 'sqlite'
           'timeout' - max length of time to retry failing operations. optional
+          'instrument' - if True, keep per-operation statistics (see stats()).
+             optional
+          'stats_interval' - with instrument, write the statistics to the log
+             this often (seconds). 0 means never. optional
+          'lazy' - if True, don't connect until the first operation that
+             needs the database. optional
+          'row_format' - 'tuple', 'named', or 'dict': the default shape of
+             the rows select() and select_iter() return (see select()).
+             optional
+          'cmd_cache_size' - how many built statements to remember for
+             repeated selects, inserts, updates, and deletes. 0 turns the
+             cache off. optional
+          'pragma_profile', 'journal_mode', 'synchronous', etc. - sqlite
+             tuning applied at connect time (see DBIsqlite.set_pragmas()).
+             optional
 
         If 'cfg' and 'section' are provided, we get everything we need from
         'section' of 'cfg'.
@@ -226,6 +801,10 @@ class DBI(object):
                     if item not in kwargs:
                         kwargs[item] = default
 
+        # What it takes to open another connection like this one somewhere
+        # else (another process, for example)
+        self._dbargs = dict(kwargs, dbtype=dbtype)
+
         self.closed = False
         if dbtype == 'sqlite':
             self._dbobj = DBIsqlite(**kwargs)
@@ -237,6 +816,10 @@ class DBI(object):
             raise DBIerror(msg.unknown_dbtype_S)
 
         self.dbname = self._dbobj.dbname
+        if self._dbobj.instrument:
+            self._stats = DBIstats(interval=self._dbobj.stats_interval)
+        else:
+            self._stats = None
 
     # -------------------------------------------------------------------------
     def __repr__(self):
@@ -249,6 +832,19 @@ class DBI(object):
             rv = "[closed]" + rv
         return rv
 
+    # -------------------------------------------------------------------------
+    def _call(self, op, kwargs):
+        """
+        DBI: Run operation *op* on the database object. If the connection
+        was lost, we connect again first. When instrumentation is on, the call
+        is measured on the way through.
+        """
+        if self._dbobj.lost:
+            self._dbobj.reconnect()
+        if self._stats is None:
+            return getattr(self._dbobj, op)(**kwargs)
+        return self._stats.measure(self._dbobj, op, kwargs)
+
     # -------------------------------------------------------------------------
     def alter(self, **kwargs):
         """
@@ -259,17 +855,66 @@ class DBI(object):
         """
         if self.closed:
             raise DBIerror(msg.db_closed, dbname=self._dbobj.dbname)
-        return self._dbobj.alter(**kwargs)
+        try:
+            return self._call('alter', kwargs)
+        finally:
+            self._dbobj.catalog.clear()
+
+    # -------------------------------------------------------------------------
+    def bulk_delete(self, **kwargs):
+        """
+        DBI: Delete the rows whose keys are listed in data. Keys is a list of
+        field names and data is a list (or other iterable) of tuples of their
+        values. The keys are loaded into a temporary table and the matching
+        rows deleted in a single statement, which is much faster than a
+        delete per key when there are a lot of them.
+        """
+        if self.closed:
+            raise DBIerror(msg.db_closed, dbname=self._dbobj.dbname)
+        return self._call('bulk_delete', kwargs)
+
+    # -------------------------------------------------------------------------
+    def bulk_update(self, **kwargs):
+        """
+        DBI: Update many rows at once. Fields and data are as for upsert():
+        each row of data holds the values for fields, and keys (a subset of
+        fields) picks out the row to update, whose other fields are set from
+        the new values. Rows with no match are ignored. As for bulk_delete(),
+        the data goes into a temporary table and a single joined update does
+        the work.
+        """
+        if self.closed:
+            raise DBIerror(msg.db_closed, dbname=self._dbobj.dbname)
+        return self._call('bulk_update', kwargs)
+
+    # -------------------------------------------------------------------------
+    def stats(self):
+        """
+        DBI: Return a snapshot of the statistics kept when the DBI was created
+        with instrument=True, as a dict of dicts: op -> table -> counters. See
+        DBIstats.snapshot(). Without instrumentation, the dict is empty.
+        """
+        if self._stats is None:
+            return {}
+        return self._stats.snapshot()
 
     # -------------------------------------------------------------------------
     def table_exists(self, **kwargs):
         """
         DBI: Return True if the table argument is not empty and the named table
         exists (even if the table itself is empty). Otherwise, return False.
+
+        The answers from table_exists(), table_list(), and describe() are
+        cached for catalog_ttl seconds (0 turns the cache off). Our own
+        create(), drop(), and alter() empty the cache. Changes made by other
+        clients show up once the cached answer expires.
         """
         if self.closed:
             raise DBIerror(msg.db_closed, dbname=self._dbobj.dbname)
-        return self._dbobj.table_exists(**kwargs)
+        if self._dbobj.lost:
+            self._dbobj.reconnect()
+        return self._dbobj.catalog.get(('table_exists', kwargs.get('table')),
+                                       self._dbobj.table_exists, **kwargs)
 
     # -------------------------------------------------------------------------
     def table_list(self, **kwargs):
@@ -278,7 +923,10 @@ class DBI(object):
         """
         if self.closed:
             raise DBIerror(msg.db_closed, dbname=self._dbobj.dbname)
-        return self._dbobj.table_list(**kwargs)
+        if self._dbobj.lost:
+            self._dbobj.reconnect()
+        return self._dbobj.catalog.get(('table_list', kwargs.get('table')),
+                                       self._dbobj.table_list, **kwargs)
 
     # -------------------------------------------------------------------------
     def close(self):
@@ -302,7 +950,10 @@ class DBI(object):
         """
         if self.closed:
             raise DBIerror(msg.db_closed, dbname=self._dbobj.dbname)
-        return self._dbobj.create(**kwargs)
+        try:
+            return self._call('create', kwargs)
+        finally:
+            self._dbobj.catalog.clear()
 
     # -------------------------------------------------------------------------
     def cursor(self, **kwargs):
@@ -311,6 +962,8 @@ class DBI(object):
         """
         if self.closed:
             raise DBIerror(msg.db_closed, dbname=self._dbobj.dbname)
+        if self._dbobj.lost:
+            self._dbobj.reconnect()
         return self._dbobj.cursor(**kwargs)
 
     # -------------------------------------------------------------------------
@@ -321,7 +974,7 @@ class DBI(object):
         """
         if self.closed:
             raise DBIerror(msg.db_closed, dbname=self._dbobj.dbname)
-        return self._dbobj.delete(**kwargs)
+        return self._call('delete', kwargs)
 
     # -------------------------------------------------------------------------
     def describe(self, **kwargs):
@@ -330,7 +983,10 @@ class DBI(object):
         """
         if self.closed:
             raise DBIerror(msg.db_closed, dbname=self._dbobj.dbname)
-        return self._dbobj.describe(**kwargs)
+        if self._dbobj.lost:
+            self._dbobj.reconnect()
+        return self._dbobj.catalog.get(('describe', kwargs.get('table')),
+                                       self._dbobj.describe, **kwargs)
 
     # -------------------------------------------------------------------------
     def drop(self, **kwargs):
@@ -339,17 +995,27 @@ class DBI(object):
         """
         if self.closed:
             raise DBIerror(msg.db_closed, dbname=self._dbobj.dbname)
-        return self._dbobj.drop(**kwargs)
+        try:
+            return self._call('drop', kwargs)
+        finally:
+            self._dbobj.catalog.clear()
 
     # -------------------------------------------------------------------------
     def insert(self, **kwargs):
         """
         DBI: Insert data into the table. Fields is a list of field names. Data
-        is a list of tuples.
+        is a list of tuples or any other iterable of tuples, like a generator.
+        Rows from an iterator are written as they come rather than being
+        collected in memory first. If ignore is True, rows that would
+        duplicate a key are skipped.
+
+        With bulk=True, mysql sends the rows as multi-row inserts of at most
+        chunk_rows rows and about chunk_bytes bytes each. See
+        DBImysql.insert().
         """
         if self.closed:
             raise DBIerror(msg.db_closed, dbname=self._dbobj.dbname)
-        return self._dbobj.insert(**kwargs)
+        return self._call('insert', kwargs)
 
     # -------------------------------------------------------------------------
     def select(self, **kwargs):
@@ -365,21 +1031,278 @@ class DBI(object):
 
         If orderby is empty, the rows are returned in the order they are
         retrieved from the database. If orderby contains an field name, the
-        rows are returned in that order.
+        rows are returned in that order. With limit, at most that many rows
+        are returned. With offset, that many rows are skipped first.
+
+        With unbuffered=True, mysql reads the rows from a server-side cursor
+        rather than having the whole result copied into client memory first.
+        The default comes from the connection's unbuffered option. The other
+        databases ignore it.
+
+        row_format says what the rows look like: 'tuple', 'named' (tuples
+        whose values can also be reached as attributes named for the
+        columns), or 'dict' (keyed by column name). The default comes from
+        the connection's row_format option. Without that, sqlite and mysql
+        return tuples and DB2 returns dicts keyed by its upper case column
+        names. Tuples are the smallest and quickest to build.
+
+        With columnar=True, the result is turned inside out: rather than a
+        list of rows, select() returns one array per field, holding that
+        field's values in row order. The arrays come in a named row, so
+        they can be reached by position or as attributes named for the
+        columns:
+
+            cols = db.select(table='bitfile', fields=['bfid', 'size'],
+                             columnar=True)
+            total = sum(cols.size)
+
+        Integer columns are packed in 64 bit ints and other numeric columns
+        in doubles, as numpy arrays if numpy is installed, otherwise as
+        array.arrays. Other columns (strings, NULLs, decimals) go in numpy
+        object arrays, or lists. row_format doesn't apply.
+        """
+        if self.closed:
+            raise DBIerror(msg.db_closed, dbname=self._dbobj.dbname)
+        return self._call('select', kwargs)
+
+    # -------------------------------------------------------------------------
+    def select_in(self, table='', fields=[], column='', values=[], where='',
+                  data=(), chunk=None, pool=None, threads=None,
+                  row_format=None):
+        """
+        DBI: Generate the rows of *table* whose *column* is one of *values*,
+        for when there are too many values to put in one statement. The
+        values go out *chunk* at a time as 'column in (?, ?, ...)' queries,
+        each one ANDed with *where* (whose parameters are in *data*, as for
+        select()). The chunk is held under the backend's limit on parameters
+        per statement (max_params), which is also the default.
+
+        With *pool* (a DBIpool), the chunks are run concurrently by *threads*
+        threads (default pool_max), each on a connection borrowed from the
+        pool. The rows of a chunk stay together, but chunks come back in the
+        order they finish. *row_format* is as for select().
+        """
+        if self.closed:
+            raise DBIerror(msg.db_closed, dbname=self._dbobj.dbname)
+        if not column:
+            raise DBIerror(msg.column_notmt_S % 'select_in',
+                           dbname=self.dbname)
+        if isinstance(values, basestring) or not hasattr(values, '__iter__'):
+            raise DBIerror(msg.values_list_S % 'select_in',
+                           dbname=self.dbname)
+        if type(data) != tuple:
+            raise DBIerror(msg.data_tuple_S % 'select_in',
+                           dbname=self.dbname)
+        limit = self._dbobj.max_params - len(data)
+        if limit < 1:
+            raise DBIerror(msg.select_in_data_SS % (len(data),
+                                                   self._dbobj.max_params),
+                           dbname=self.dbname)
+        if chunk is None:
+            chunk = limit
+        if type(chunk) != int or chunk <= 0:
+            raise DBIerror(msg.chunk_int, dbname=self.dbname)
+        chunk = min(chunk, limit)
+
+        def query(db, keys):
+            """
+            Select the rows for one chunk of keys on *db*
+            """
+            cond = "%s in (%s)" % (column, ", ".join(["?"] * len(keys)))
+            return db.select(table=table, fields=fields,
+                             where="(%s) and %s" % (where, cond)
+                             if where else cond,
+                             data=data + tuple(keys),
+                             row_format=row_format)
+
+        chunks = value_chunks(values, chunk)
+        if pool is None:
+            return itertools.chain.from_iterable(query(self, keys)
+                                                 for keys in chunks)
+        return pooled_results(pool, query, chunks, threads or pool.pool_max)
+
+    # -------------------------------------------------------------------------
+    def select_iter(self, **kwargs):
+        """
+        DBI: Like select(), but rather than returning a list of all the
+        matching rows, return an iterator that generates them. Rows are pulled
+        from the database *batch* at a time (default is the fetchsize set for
+        the connection), so the whole result never has to be in memory.
+
+        The cursor is closed when the rows run out or when the caller closes
+        the iterator, whichever comes first. A caller that may stop early
+        should close it explicitly (or use contextlib.closing()).
+
+        Mysql normally copies the whole result into client memory before the
+        first row is handed over. With unbuffered=True (see select()), the
+        rows come from a server-side cursor as they're fetched instead. The
+        connection can't be used for anything else until the iterator is
+        exhausted or closed, and closing it early reads and discards the rest
+        of the result. row_format is as for select().
+
+        With columnar=True (see select()), rather than rows, the iterator
+        generates the columns of each batch of rows as it's fetched.
+        """
+        if self.closed:
+            raise DBIerror(msg.db_closed, dbname=self._dbobj.dbname)
+        return self._call('select_iter', kwargs)
+
+    # -------------------------------------------------------------------------
+    def partitions(self, table='', key='', count=4, where='', data=(),
+                   binary=False):
+        """
+        DBI: Split the rows of *table* (those matching *where* and *data*, if
+        given) into *count* ranges of *key* holding about the same number of
+        rows. Return a list of (low, high) pairs: a range holds the rows with
+        low < key <= high, and None means no limit. Each boundary is found
+        by a query picking the key at its offset in key order, so the rows
+        themselves are never read here. With binary=True, the boundaries are
+        hex strings, as for scan().
+        """
+        if type(count) != int or count <= 0:
+            raise DBIerror(msg.partitions_int, dbname=self.dbname)
+        row = self.select(table=table, fields=['count(*)'], where=where,
+                          data=data, row_format='tuple')[0]
+        total = row[0]
+
+        bounds = []
+        for mark in sorted(set([i * total // count
+                                for i in range(1, count)])):
+            if mark == 0:
+                continue
+            rows = self.select(table=table, fields=[key], where=where,
+                               data=data, orderby=key, limit=1,
+                               offset=mark - 1, row_format='tuple')
+            if not rows:
+                continue
+            kval = rows[0][0]
+            if binary:
+                kval = binascii.hexlify(kval).upper()
+            if not bounds or bounds[-1] != kval:
+                bounds.append(kval)
+        return zip([None] + bounds, bounds + [None])
+
+    # -------------------------------------------------------------------------
+    def scan_partitions(self, table='', key='', fields=[], partitions=4,
+                        batch=None, where='', data=(), binary=False,
+                        reducer=None, processes=None, row_format=None):
+        """
+        DBI: Scan *table* in parallel. The key range is split into partitions
+        -- either *partitions* of them, found with partitions(), or the
+        (low, high) ranges passed as *partitions* -- and each one is scanned
+        in key order (see scan()) by a worker process with a connection of
+        its own, opened with the same arguments as this one. At most
+        *processes* (default: one per partition) run at once.
+
+        Without a *reducer*, return an iterator over the rows as the workers
+        send them back, a batch at a time. The rows of a partition arrive in
+        key order, but the partitions are mixed together.
+
+        With a *reducer*, each worker calls reducer(rows) on an iterator over
+        the rows of its partition and sends back the result. In that case,
+        return the list of results, in partition order. The reducer must be a
+        module level function so it can be sent to the workers.
+
+        Rows and reducer results have to be picklable to come back from the
+        workers. Named rows (see select()'s row_format) are.
+        """
+        if self.closed:
+            raise DBIerror(msg.db_closed, dbname=self._dbobj.dbname)
+        if type(partitions) == int:
+            partitions = self.partitions(table=table, key=key,
+                                         count=partitions, where=where,
+                                         data=data, binary=binary)
+        dbargs = dict(self._dbargs)
+        dbargs.pop('retry_policy', None)
+        scanargs = {'table': table, 'key': key, 'fields': fields,
+                    'batch': self._dbobj.batch_size(batch), 'where': where,
+                    'data': data, 'binary': binary, 'row_format': row_format}
+        rows = partition_results(dbargs, scanargs, list(partitions), reducer,
+                                 processes or len(partitions))
+        if reducer is None:
+            return rows
+
+        rval = [None] * len(partitions)
+        for idx, result in rows:
+            rval[idx] = result
+        return rval
+
+    # -------------------------------------------------------------------------
+    def scan(self, **kwargs):
+        """
+        DBI: Return an iterator (a DBIscan) over the rows of a table in *key*
+        order, fetched a page of *batch* rows at a time:
+
+            scan = db.scan(table='bitfile', key='bfid', fields=[...],
+                           binary=True)
+            for row in scan:
+                ...
+
+        Each page is selected with 'key > <last key seen> order by key', so a
+        page costs the same however far into the table the scan is. The key
+        should be unique and indexed. *where* and *data* narrow the scan as
+        they do for select().
+
+        The scan's position attribute is the key of the last row generated.
+        Passing it as *start* to a later scan() picks up after that row, so a
+        caller can save it and resume after a restart. With binary=True, the
+        key is binary (like a DB2 bfid) and position is its hex string.
+        *row_format* is as for select().
+        """
+        if self.closed:
+            raise DBIerror(msg.db_closed, dbname=self._dbobj.dbname)
+        return DBIscan(self, **kwargs)
+
+    # -------------------------------------------------------------------------
+    def transaction(self, **kwargs):
+        """
+        DBI: Return a context manager that holds the operations in its block in
+        one transaction rather than committing each one on its own:
+
+            with db.transaction():
+                db.insert(table='foo', fields=[...], data=[...])
+                db.update(table='bar', ...)
+
+        The transaction is committed when the block finishes normally and
+        rolled back if an exception leaves the block (the exception still
+        propagates). If the commit itself fails, the transaction is rolled
+        back and the error raised. A transaction() inside another one sets a
+        savepoint, so an exception in the inner block only rolls back to
+        there. With savepoint=False, the inner block just joins the outer
+        transaction.
+
+        Not available for DB2, which we only read.
+        """
+        if self.closed:
+            raise DBIerror(msg.db_closed, dbname=self._dbobj.dbname)
+        return self._dbobj.transaction(**kwargs)
+
+    # -------------------------------------------------------------------------
+    def upsert(self, **kwargs):
+        """
+        DBI: Insert rows into the table, updating the rows that are already
+        there instead. Fields is a list of field names and data is a list (or
+        other iterable) of tuples, as for insert(). Keys is the list of fields
+        (a subset of fields) making up the unique key that decides whether a
+        row is already present. When it is, the fields that are not keys are
+        set from the new row. All the rows go to the database in one
+        executemany() pass rather than a select and an insert or update per
+        row.
         """
         if self.closed:
             raise DBIerror(msg.db_closed, dbname=self._dbobj.dbname)
-        return self._dbobj.select(**kwargs)
+        return self._call('upsert', kwargs)
 
     # -------------------------------------------------------------------------
     def update(self, **kwargs):
         """
         DBI: Update data in the table. Where indicates which records are to be
-        updated. Fields is a list of field names. Data is a list of tuples.
+        updated. Fields is a list of field names. Data is a list of tuples or
+        any other iterable of tuples, like a generator.
         """
         if self.closed:
             raise DBIerror(msg.db_closed, dbname=self._dbobj.dbname)
-        return self._dbobj.update(**kwargs)
+        return self._call('update', kwargs)
 
 
 # -----------------------------------------------------------------------------
@@ -404,1208 +1327,3591 @@ class DBIerror(Exception):
 
 
 # -----------------------------------------------------------------------------
-class DBIsqlite(DBI_abstract):
+class DBIpool(object):
+    """
+    A thread-safe pool of DBI connections. Worker threads borrow a connection
+    for a while and give it back rather than sharing one DBI or connecting
+    over and over:
+
+        pool = DBIpool(cfg=cf, section='dbi-crawler')
+        with pool.connection() as db:
+            db.select(...)
+
+    The pool takes the same arguments as DBI(). The pool sizing comes from
+    the arguments or from the db section of the cfg:
+
+        pool_min  - connections to keep open even when idle (default 1)
+        pool_max  - most connections open at once (default 5)
+        pool_idle - close idle connections beyond pool_min after this long
+                    (default 5 minutes)
+        pool_wait - how long checkout() waits for a free connection before
+                    giving up (default 30 seconds)
+    """
     # -------------------------------------------------------------------------
-    @classmethod
-    def arginfo(cls):
+    def __init__(self, **kwargs):
         """
-        Set required and optional arguments for sqlite db connections
+        DBIpool: Work out the pool sizing, remember the DBI arguments, and open
+        pool_min connections.
         """
-        return {'req': ['dbname', 'tbl_prefix'],
-                'opt': []}
+        cf = kwargs.get('cfg', None)
+        section = kwargs.get('section', None)
+        for name, default in [('pool_min', 1), ('pool_max', 5)]:
+            if name in kwargs:
+                val = kwargs.pop(name)
+            elif cf is not None and section is not None:
+                val = int(cf.get_d(section, name, default))
+            else:
+                val = default
+            setattr(self, name, val)
+        for name, default in [('pool_idle', 300), ('pool_wait', 30)]:
+            if name in kwargs:
+                val = kwargs.pop(name)
+            elif cf is not None and section is not None:
+                val = cf.get_time(section, name, default)
+            else:
+                val = default
+            setattr(self, name, val)
+
+        if (type(self.pool_min) != int or type(self.pool_max) != int or
+                self.pool_max < 1 or
+                not 0 <= self.pool_min <= self.pool_max):
+            raise DBIerror(msg.pool_size_SS % (self.pool_min, self.pool_max))
+
+        # A pooled sqlite connection is used by one thread at a time, but not
+        # always the thread that opened it
+        if 'dbtype' in kwargs:
+            dbtype = kwargs['dbtype']
+        elif cf is not None and cf.has_option(section, 'dbtype'):
+            dbtype = cf.get(section, 'dbtype')
+        else:
+            dbtype = None
+        if dbtype == 'sqlite':
+            kwargs['check_same_thread'] = False
+        self.dbargs = kwargs
+
+        self.cond = threading.Condition()
+        self.closed = False
+        self.idle = []          # (DBI, time checked in), most recent last
+        self.size = 0           # connections open, idle or checked out
+        self.in_use = {}        # id(DBI) -> time checked out
+        self.started = time.time()
+        self.counts = {'checkouts': 0,
+                       'waits': 0,
+                       'wait_time': 0.0,
+                       'wait_max': 0.0,
+                       'busy_time': 0.0,
+                       'peak_in_use': 0,
+                       'created': 0,
+                       'discarded': 0,
+                       'expired': 0}
+
+        for idx in range(self.pool_min):
+            self.idle.append((self.connect(), time.time()))
+            self.size += 1
 
     # -------------------------------------------------------------------------
-    def __init__(self, *args, **kwargs):
+    def __repr__(self):
         """
-        DBIsqlite: See DBI.__init__()
+        DBIpool: Human readable representation
         """
-        self.validate_args(self.arginfo(), kwargs, self.__class__)
-
-        if self.tbl_prefix != '':
-            self.tbl_prefix = self.tbl_prefix.rstrip('_') + '_'
-        try:
-            self.dbh = sqlite3.connect(self.dbname)
-            # set autocommit mode
-            self.dbh.isolation_level = None
-            self.table_exists(table="sqlite_master")
-        except sqlite3.Error as e:
-            raise DBIerror(''.join(e.args), dbname=self.dbname)
+        return ("DBIpool(size=%d, in_use=%d, max=%d)" %
+                (self.size, len(self.in_use), self.pool_max))
 
     # -------------------------------------------------------------------------
-    def __repr__(self):
+    def checkin(self, db):
         """
-        DBIsqlite: See DBI.__repr__()
+        DBIpool: Give *db* back to the pool. It must be a connection checked
+        out of this pool and not already given back, or two threads could
+        end up sharing it.
         """
-        rv = "DBIsqlite(dbname='%s')" % self.dbname
-        return rv
+        with self.cond:
+            now = time.time()
+            stamp = self.in_use.pop(id(db), None)
+            if stamp is None:
+                raise DBIerror(msg.pool_checkin)
+            self.counts['busy_time'] += now - stamp
+            if self.closed:
+                self.size -= 1
+                self.discard(db)
+            else:
+                self.idle.append((db, now))
+            self.cond.notify()
 
     # -------------------------------------------------------------------------
-    def err_handler(self, err):
+    def checkout(self):
         """
-        DBIsqlite: error handler
+        DBIpool: Borrow a connection from the pool. We prefer the connection
+        used most recently, then opening a new one if we're below pool_max.
+        Otherwise we wait up to pool_wait seconds for one to be checked in.
+        The connection is checked before we hand it over and replaced if it
+        has gone bad. The caller must give it back with checkin().
         """
-        raise DBIerror(''.join(err.args), dbname=self.dbname)
+        start = time.time()
+        db = None
+        with self.cond:
+            while True:
+                if self.closed:
+                    raise DBIerror(msg.pool_closed)
+                self.expire()
+                if self.idle:
+                    db, stamp = self.idle.pop()
+                    break
+                elif self.size < self.pool_max:
+                    self.size += 1
+                    break
+                remaining = start + self.pool_wait - time.time()
+                if remaining <= 0:
+                    raise DBIerror(msg.pool_timeout_S % self.pool_wait)
+                self.cond.wait(remaining)
+
+            waited = time.time() - start
+            self.counts['checkouts'] += 1
+            if 0.001 < waited:
+                self.counts['waits'] += 1
+            self.counts['wait_time'] += waited
+            self.counts['wait_max'] = max(waited, self.counts['wait_max'])
+
+        # Talking to the database happens outside the lock so other threads
+        # aren't held up. Our slot in self.size is already reserved.
+        try:
+            if db is not None and not self.healthy(db):
+                self.discard(db)
+                with self.cond:
+                    self.counts['discarded'] += 1
+                db = None
+            if db is None:
+                db = self.connect()
+        except:
+            with self.cond:
+                self.size -= 1
+                self.cond.notify()
+            raise
+
+        with self.cond:
+            self.in_use[id(db)] = time.time()
+            self.counts['peak_in_use'] = max(len(self.in_use),
+                                             self.counts['peak_in_use'])
+        return db
 
     # -------------------------------------------------------------------------
-    def alter(self, table='', addcol=None, dropcol=None, pos=None):
+    def close(self):
         """
-        DBIsqlite: Sqlite ignores pos if it's set and does not support dropcol.
+        DBIpool: Close the idle connections. Connections that are checked out
+        are closed when they come back.
         """
-        if type(table) != str:
-            raise DBIerror(msg.tbl_name_str_S % U.my_name(),
-                           dbname=self.dbname)
-        elif table == '':
-            raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
-                           dbname=self.dbname)
-        elif dropcol is not None:
-            raise DBIerror(msg.unsupp_dropcol_sqlite,
-                           dbname=self.dbname)
-        elif addcol is None:
-            raise DBIerror("ALTER requires an action")
-        elif addcol.strip() == "":
-            raise DBIerror(msg.alter_addcol_not_empty)
-        elif any([x in addcol for x in ['"', "'", ';', '=']]):
-            raise DBIerror("Invalid addcol argument")
+        with self.cond:
+            self.closed = True
+            while self.idle:
+                db, stamp = self.idle.pop()
+                self.size -= 1
+                self.discard(db)
+            self.cond.notify_all()
 
-        try:
-            cmd = ("alter table %s add column %s" %
-                   (self.prefix(table), addcol))
-            c = self.dbh.cursor()
-            c.execute(cmd)
-        except sqlite3.Error as e:
-            raise DBIerror(''.join(e.args), dbname=self.dbname)
+    # -------------------------------------------------------------------------
+    def connect(self):
+        """
+        DBIpool: Open a new connection. DBI() consumes its arguments, so it
+        gets a copy.
+        """
+        db = DBI(**dict(self.dbargs))
+        with self.cond:
+            self.counts['created'] += 1
+        return db
 
     # -------------------------------------------------------------------------
-    def close(self):
+    @contextlib.contextmanager
+    def connection(self):
         """
-        DBIsqlite: See DBI.close()
+        DBIpool: Check out a connection for the duration of a with block
         """
-        # Close the database connection
-        if hasattr(self, "sqlite_closed") and self.sqlite_closed:
-            raise DBIerror("closing a closed connection", dbname=self.dbname)
-        self.sqlite_closed = True
+        db = self.checkout()
         try:
-            self.dbh.close()
-        # Convert any sqlite3 error into a DBIerror
-        except sqlite3.Error as e:
-            raise DBIerror(''.join(e.args), dbname=self.dbname)
+            yield db
+        finally:
+            self.checkin(db)
 
     # -------------------------------------------------------------------------
-    def create(self, table='', fields=[]):
+    def discard(self, db):
         """
-        DBIsqlite: See DBI.create()
+        DBIpool: Close *db* if it's still open, ignoring any complaints. The
+        caller takes care of self.size.
         """
-
-        if type(fields) != list:
-            raise DBIerror(msg.fields_list_S % U.my_name(),
-                           dbname=self.dbname)
-        elif fields == []:
-            raise DBIerror(msg.fields_notmt_S % U.my_name(),
-                           dbname=self.dbname)
-        if type(table) != str:
-            raise DBIerror(msg.tbl_name_str_S % U.my_name(),
-                           dbname=self.dbname)
-        elif table == '':
-            raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
-                           dbname=self.dbname)
-
-        # Construct and run the create statement
         try:
-            cmd = ("create table %s(" % self.prefix(table) +
-                   ", ".join(fields) +
-                   ")")
-            c = self.dbh.cursor()
-            c.execute(cmd)
-        # Convert any sqlite3 error into a DBIerror
-        except sqlite3.Error as e:
-            raise DBIerror(''.join(e.args), dbname=self.dbname)
+            if not db.closed:
+                db.close()
+        except DBIerror:
+            pass
 
     # -------------------------------------------------------------------------
-    def cursor(self):
+    def expire(self):
         """
-        DBIsqlite: See DBI.cursor()
+        DBIpool: Close connections that have been idle longer than pool_idle,
+        as long as that leaves at least pool_min open. Called with self.cond
+        held. The oldest idle connections are at the front of the list.
         """
-        try:
-            rval = self.dbh.cursor()
-            return rval
-        except sqlite3.Error as e:
-            raise DBIerror(''.join(e.args), dbname=self.dbname)
+        now = time.time()
+        while (self.idle and self.pool_min < self.size and
+               self.pool_idle <= now - self.idle[0][1]):
+            db, stamp = self.idle.pop(0)
+            self.size -= 1
+            self.counts['expired'] += 1
+            self.discard(db)
 
     # -------------------------------------------------------------------------
-    def delete(self, table='', where='', data=()):
+    def healthy(self, db):
         """
-        DBIsqlite: See DBI.delete()
+        DBIpool: Return True if *db* is open and its connection still works. A
+        lazy connection that hasn't been opened yet will be when it's used.
         """
-        # Handle invalid arguments
-        if type(table) != str:
-            raise DBIerror(msg.tbl_name_str_S % U.my_name(),
-                           dbname=self.dbname)
-        elif table == '':
-            raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
-                           dbname=self.dbname)
-        elif type(where) != str:
-            raise DBIerror(msg.where_str_S % U.my_name(),
-                           dbname=self.dbname)
-        elif type(data) != tuple:
-            raise DBIerror(msg.data_tuple_S % U.my_name(),
-                           dbname=self.dbname)
-        elif '?' not in where and data != ():
-            raise DBIerror(msg.data_ignored, dbname=self.dbname)
-        elif '?' in where and data == ():
-            raise DBIerror(msg.crit_incomplete,
-                           dbname=self.dbname)
+        if db.closed:
+            return False
+        return db._dbobj.dbh is None or db._dbobj.ping()
 
-        # Build and run the statement
-        try:
-            cmd = "delete from %s" % self.prefix(table)
-            if where != '':
-                cmd += " where %s" % where
+    # -------------------------------------------------------------------------
+    def stats(self):
+        """
+        DBIpool: Return a dict describing the pool and how it has been used.
+        'utilization' is the fraction of pool_max checked out right now.
+        'avg_utilization' is the same thing averaged over the pool's life.
+        """
+        with self.cond:
+            now = time.time()
+            rval = dict(self.counts)
+            busy = rval['busy_time'] + sum([now - x
+                                            for x in self.in_use.values()])
+            rval.update({'size': self.size,
+                         'idle': len(self.idle),
+                         'in_use': len(self.in_use),
+                         'pool_min': self.pool_min,
+                         'pool_max': self.pool_max,
+                         'utilization': (float(len(self.in_use)) /
+                                         self.pool_max),
+                         'avg_utilization': (busy /
+                                             (self.pool_max *
+                                              max(now - self.started,
+                                                  0.001)))})
+        return rval
 
-            c = self.dbh.cursor()
-            if '?' in cmd:
-                c.execute(cmd, data)
-            else:
-                c.execute(cmd)
 
-            c.close()
-        # Translate any sqlite3 errors to DBIerror
-        except sqlite3.Error as e:
-            raise DBIerror(cmd + ': ' + ''.join(e.args), dbname=self.dbname)
+# -----------------------------------------------------------------------------
+class DBIstats(object):
+    """
+    Per-operation, per-table statistics for an instrumented DBI: calls,
+    errors, retries, rows in and out, the time taken, and how much of it was
+    spent waiting on locks (lock_wait). Latencies go into a
+    histogram with power of two buckets (bucket n counts calls that took less
+    than 2**n microseconds), from which snapshot() estimates percentiles.
+
+    If *interval* is greater than 0, the statistics are written through
+    cfg.log() at most that often (in seconds), as operations are recorded.
+    """
+    percentiles = [50, 90, 99]
+    row_ops = ['bulk_delete', 'bulk_update', 'insert', 'update', 'upsert']
 
     # -------------------------------------------------------------------------
-    def describe(self, table=''):
+    def __init__(self, interval=0):
         """
-        DBIsqlite: Return the description of a table.
+        DBIstats: Start with nothing recorded
         """
-        cmd = "pragma table_info(%s)" % self.prefix(table)
-        try:
-            c = self.dbh.cursor()
-            c.execute(cmd)
-            rows = c.fetchall()
-        except sqlite3.Error as e:
-            self.err_handler(e)
+        self.interval = interval
+        self.ops = {}
+        self.last_dump = time.time()
 
-        if [] == rows:
-            raise DBIerror(msg.no_such_table_S % self.prefix(table))
+    # -------------------------------------------------------------------------
+    def count_rows(self, data, counter):
+        """
+        DBIstats: Pass the rows of *data* through, counting them in
+        counter[0]
+        """
+        for row in data:
+            counter[0] += 1
+            yield row
 
-        return rows
+    # -------------------------------------------------------------------------
+    def dump(self):
+        """
+        DBIstats: Write the current statistics to the log, one line per
+        operation and table
+        """
+        self.last_dump = time.time()
+        snap = self.snapshot()
+        for op in sorted(snap):
+            for table in sorted(snap[op]):
+                e = snap[op][table]
+                cfg.log("dbi %s %s: calls=%d errors=%d retries=%d "
+                        "rows_in=%d rows_out=%d time=%.6f lock_wait=%.6f " %
+                        (op, table, e['calls'], e['errors'], e['retries'],
+                         e['rows_in'], e['rows_out'], e['time'],
+                         e['lock_wait']) +
+                        " ".join(["p%d=%.6f" % (p, e['p%d' % p])
+                                  for p in self.percentiles]))
 
     # -------------------------------------------------------------------------
-    def drop(self, table=''):
+    def measure(self, dbobj, op, kwargs):
         """
-        DBIsqlite: See DBI.create()
+        DBIstats: Call *op* on *dbobj* with *kwargs* and record how it went.
+        Rows written are counted as the database takes them, so a generator
+        passed as data is not read ahead. The rows from select_iter() are
+        counted, and the time spent fetching them measured, as the caller
+        consumes them. A columnar result is counted by the length of its
+        columns.
         """
-        # Handle bad arguments
+        table = kwargs.get('table', '')
         if type(table) != str:
-            raise DBIerror(msg.tbl_name_str_S % "drop",
-                           dbname=self.dbname)
-        elif table == '':
-            raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
-                           dbname=self.dbname)
-
-        # Construct and run the drop statement
+            table = str(table)
+        counter = [0]
+        data = kwargs.get('data')
+        if op in self.row_ops:
+            if type(data) == list:
+                counter[0] = len(data)
+            elif (hasattr(data, '__iter__') and
+                  type(data) not in [str, unicode, tuple, dict]):
+                kwargs = dict(kwargs, data=self.count_rows(data, counter))
+
+        retries = dbobj.retries
+        waited = dbobj.lock_wait_time
+        start = time.time()
         try:
-            cmd = ("drop table %s" % self.prefix(table))
-            c = self.dbh.cursor()
-            c.execute(cmd)
-        # Convert any sqlite3 error into a DBIerror
-        except sqlite3.Error as e:
-            raise DBIerror(''.join(e.args), dbname=self.dbname)
+            rval = getattr(dbobj, op)(**kwargs)
+        except:
+            self.record(op, table, time.time() - start, error=True,
+                        retries=dbobj.retries - retries, rows_in=counter[0],
+                        lock_wait=dbobj.lock_wait_time - waited)
+            raise
+        elapsed = time.time() - start
+
+        columnar = kwargs.get('columnar', False)
+        if op == 'select_iter':
+            return self.measure_iter(dbobj, table, rval, elapsed, retries,
+                                     dbobj.lock_wait_time - waited,
+                                     columnar)
+        self.record(op, table, elapsed,
+                    retries=dbobj.retries - retries,
+                    rows_in=counter[0],
+                    rows_out=(self.row_count(rval, columnar)
+                              if op == 'select' else 0),
+                    lock_wait=dbobj.lock_wait_time - waited)
+        return rval
 
     # -------------------------------------------------------------------------
-    def insert(self, table='', ignore=False, fields=[], data=[]):
+    def row_count(self, rval, columnar):
         """
-        DBIsqlite: See DBI.insert()
+        DBIstats: Return the number of rows in select() result *rval*. A
+        columnar result holds as many rows as its first column has values.
         """
-        # Handle any bad arguments
-        if type(table) != str:
-            raise DBIerror(msg.tbl_name_str_S % U.my_name(),
-                           dbname=self.dbname)
-        elif table == '':
-            raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
-                           dbname=self.dbname)
-        elif type(fields) != list:
-            raise DBIerror(msg.fields_list_S % U.my_name(),
-                           dbname=self.dbname)
-        elif fields == []:
-            raise DBIerror(msg.fields_notmt, dbname=self.dbname)
-        elif type(data) != list:
-            raise DBIerror(msg.data_list_S % U.my_name(),
-                           dbname=self.dbname)
-        elif data == []:
-            raise DBIerror(msg.data_list_notmt,
-                           dbname=self.dbname)
-        elif type(ignore) != bool:
-            raise DBIerror(msg.insert_ignore_bool, dbname=self.dbname)
+        if not columnar:
+            return len(rval)
+        return len(rval[0]) if 0 < len(rval) else 0
 
-        # Construct and run the insert statement
+    # -------------------------------------------------------------------------
+    def measure_iter(self, dbobj, table, rows, elapsed, retries, lock_wait,
+                     columnar=False):
+        """
+        DBIstats: Pass along the rows from select_iter(), adding the time
+        spent getting each one to *elapsed*. The call is recorded when the
+        rows run out or the caller stops early. *lock_wait* is the time spent
+        waiting on locks to start the select. With *columnar*, each item is
+        a batch of columns rather than a row.
+        """
+        count = 0
+        error = False
         try:
-            cmd = ("insert %s" % ("or ignore " if ignore else "") +
-                   "into %s(" % self.prefix(table) +
-                   ",".join(fields) +
-                   ") values (" +
-                   ",".join(["?" for x in fields]) +
-                   ")")
-            c = self.dbh.cursor()
-            c.executemany(cmd, data)
-            c.close()
-        # Translate sqlite specific exception into a DBIerror
-        except sqlite3.Error as e:
-            raise DBIerror(cmd + ": " + ''.join(e.args),
-                           dbname=self.dbname)
+            while True:
+                start = time.time()
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    elapsed += time.time() - start
+                    break
+                elapsed += time.time() - start
+                count += self.row_count(row, columnar) if columnar else 1
+                yield row
+        except Exception:
+            error = True
+            raise
+        finally:
+            rows.close()
+            self.record('select_iter', table, elapsed, error=error,
+                        retries=dbobj.retries - retries, rows_out=count,
+                        lock_wait=lock_wait)
 
     # -------------------------------------------------------------------------
-    def select(self, table='',
-               fields=[],
-               where='',
-               data=(),
-               groupby='',
-               orderby='',
-               limit=None):
+    def record(self, op, table, elapsed, error=False, retries=0, rows_in=0,
+               rows_out=0, lock_wait=0.0):
         """
-        DBIsqlite: See DBI.select()
+        DBIstats: Add one call to the statistics for *op* on *table*. If it's
+        time, write the statistics to the log.
         """
-        # Handle invalid arguments
-        if type(table) != str:
-            raise DBIerror(msg.tbl_name_str_S % U.my_name(),
-                           dbname=self.dbname)
-        elif table == '':
-            raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
-                           dbname=self.dbname)
-        elif type(fields) != list:
-            raise DBIerror(msg.fields_list_S % U.my_name(),
-                           dbname=self.dbname)
-        elif fields == []:
-            raise DBIerror("Wildcard selects are not supported." +
-                           " Please supply a list of fields.",
-                           dbname=self.dbname)
-        elif type(where) != str:
-            raise DBIerror(msg.where_str_S % U.my_name(),
-                           dbname=self.dbname)
-        elif type(data) != tuple:
-            raise DBIerror(msg.data_tuple_S % U.my_name(), dbname=self.dbname)
-        elif type(groupby) != str:
-            raise DBIerror(msg.select_gb_str, dbname=self.dbname)
-        elif type(orderby) != str:
-            raise DBIerror(msg.select_nso,
-                           dbname=self.dbname)
-        elif '?' not in where and data != ():
-            raise DBIerror(msg.data_ignored,
-                           dbname=self.dbname)
-        elif limit is not None and type(limit) not in [int, float]:
-            raise DBIerror(msg.select_l_nint)
+        entry = self.ops.setdefault(op, {}).get(table)
+        if entry is None:
+            entry = {'calls': 0, 'errors': 0, 'retries': 0, 'rows_in': 0,
+                     'rows_out': 0, 'time': 0.0, 'max': 0.0, 'lock_wait': 0.0,
+                     'hist': []}
+            self.ops[op][table] = entry
+        entry['calls'] += 1
+        entry['errors'] += int(error)
+        entry['retries'] += retries
+        entry['rows_in'] += rows_in
+        entry['rows_out'] += rows_out
+        entry['time'] += elapsed
+        entry['max'] = max(entry['max'], elapsed)
+        entry['lock_wait'] += lock_wait
+
+        bucket = int(elapsed * 1000000).bit_length()
+        hist = entry['hist']
+        if len(hist) <= bucket:
+            hist.extend([0] * (bucket + 1 - len(hist)))
+        hist[bucket] += 1
+
+        if (0 < self.interval and
+                self.interval <= time.time() - self.last_dump):
+            self.dump()
 
-        # Build and run the select statement
-        try:
-            cmd = "select "
-            cmd += ",".join(fields)
-            cmd += " from %s" % self.prefix(table)
-            if where != '':
-                cmd += " where %s" % where
-            if groupby != '':
-                cmd += " group by %s" % groupby
-            if orderby != '':
-                cmd += " order by %s" % orderby
-            if limit is not None:
-                cmd += " limit %d" % int(limit)
+    # -------------------------------------------------------------------------
+    def snapshot(self):
+        """
+        DBIstats: Return a copy of the statistics as a dict of dicts: op ->
+        table -> counters. Besides the counters, each entry has the mean and
+        max time, the histogram ('hist', a list of counts by bucket), and
+        'p50', 'p90', and 'p99' -- the upper bound in seconds of the bucket
+        holding that percentile.
+        """
+        rval = {}
+        for op in self.ops:
+            rval[op] = {}
+            for table, entry in self.ops[op].items():
+                e = dict(entry, hist=list(entry['hist']))
+                e['mean'] = entry['time'] / entry['calls']
+                for p in self.percentiles:
+                    e['p%d' % p] = self.percentile(entry, p)
+                rval[op][table] = e
+        return rval
+
+    # -------------------------------------------------------------------------
+    def percentile(self, entry, pct):
+        """
+        DBIstats: Estimate percentile *pct* of the latencies in *entry* from
+        its histogram
+        """
+        need = entry['calls'] * pct / 100.0
+        seen = 0
+        for bucket, count in enumerate(entry['hist']):
+            seen += count
+            if need <= seen:
+                return (2 ** bucket) / 1000000.0
+        return entry['max']
 
-            c = self.dbh.cursor()
-            if '?' in cmd:
-                c.execute(cmd, data)
-            else:
-                c.execute(cmd)
-            rv = c.fetchall()
-            c.close()
-            return rv
-        # Translate any sqlite3 errors to DBIerror
-        except sqlite3.Error as e:
-            raise DBIerror(''.join(e.args),
-                           dbname=self.dbname)
 
+# -----------------------------------------------------------------------------
+class DBIscan(object):
+    """
+    A resumable walk through a table in key order. See DBI.scan().
+    """
     # -------------------------------------------------------------------------
-    def table_exists(self, table=''):
+    def __init__(self, db, table='', key='', fields=[], batch=None, where='',
+                 data=(), start=None, binary=False, row_format=None):
         """
-        DBIsqlite: See DBI.table_exists()
+        DBIscan: Check the arguments and get ready to fetch the first page
         """
-        try:
-            dbc = self.dbh.cursor()
-            dbc.execute("""
-                        select name from sqlite_master
-                        where type='table'
-                        and name=?
-                        """, (self.prefix(table),))
-            rows = dbc.fetchall()
-            dbc.close()
-            if 0 == len(rows):
-                return False
-            elif 1 == len(rows):
-                return True
-            else:
-                raise DBIerror(msg.more_than_one_ss % ('sqlite_master', table))
-        except sqlite3.Error as e:
-            raise DBIerror(''.join(e.args), dbname=self.dbname)
+        if type(key) != str or type(fields) != list or key not in fields:
+            raise DBIerror(msg.scan_key_S % key, dbname=db.dbname)
+        self.db = db
+        self.table = table
+        self.key = key
+        self.fields = fields
+        self.batch = db._dbobj.batch_size(batch)
+        self.where = where
+        self.data = data
+        self.binary = binary
+        self.row_format = row_format
+        self.position = start
+        self.pages = 0
+        self.rows = 0
 
     # -------------------------------------------------------------------------
-    def table_list(self):
+    def __iter__(self):
         """
-        DBIsqlite: See DBI.table_list()
+        DBIscan: Generate the rows, a page at a time, starting after position
         """
-        try:
-            dbc = self.dbh.cursor()
-            dbc.execute("""
-                        select name from sqlite_master
-                        where type='table'
-                        and name like ?
-                        """, (self.prefix('%'),))
-            rows = dbc.fetchall()
-            dbc.close()
-            return rows
-        except sqlite3.Error as e:
-            raise DBIerror(''.join(e.args), dbname=self.dbname)
+        while True:
+            rows = self.page()
+            for row in rows:
+                self.position = self.row_key(row)
+                self.rows += 1
+                yield row
+            if len(rows) < self.batch:
+                return
 
     # -------------------------------------------------------------------------
-    def update(self, table='', where='', fields=[], data=[]):
+    def page(self):
         """
-        DBIsqlite: See DBI.update()
+        DBIscan: Select the next page of rows, the ones after position
         """
-        # Handle invalid arguments
-        if type(table) != str:
-            raise DBIerror(msg.tbl_name_str_S % U.my_name(),
-                           dbname=self.dbname)
+        where = self.where
+        data = self.data
+        if self.position is not None:
+            # The key is bound rather than written in, so every page runs
+            # the same statement
+            after = "%s > ?" % self.key
+            if self.binary:
+                data = data + (self.db._dbobj.binary_param(
+                    binascii.unhexlify(self.position)),)
+            else:
+                data = data + (self.position,)
+            where = "(%s) and %s" % (where, after) if where else after
+        self.pages += 1
+        return self.db.select(table=self.table, fields=self.fields,
+                              where=where, data=data, orderby=self.key,
+                              limit=self.batch, row_format=self.row_format)
+
+    # -------------------------------------------------------------------------
+    def row_key(self, row):
+        """
+        DBIscan: Get the key out of *row*. Dict rows are keyed by column
+        name, which is upper case on DB2. For a binary key, return its hex
+        string.
+        """
+        if type(row) == dict:
+            rval = row.get(self.key.upper(), row.get(self.key))
+        else:
+            rval = row[self.fields.index(self.key)]
+        if self.binary:
+            rval = binascii.hexlify(rval).upper()
+        return rval
+
+
+# -----------------------------------------------------------------------------
+class CatalogCache(object):
+    """
+    A cache of answers to questions about the database catalog (does a table
+    exist, what columns does it have, which tables are there). An answer is
+    good for *ttl* seconds, so changes made by other clients are eventually
+    seen. A ttl of 0 turns the cache off.
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, ttl):
+        """
+        CatalogCache: Set the time to live and zero the counters
+        """
+        self.ttl = ttl
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.clears = 0
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+        """
+        CatalogCache: How many answers are in the cache
+        """
+        return len(self.entries)
+
+    # -------------------------------------------------------------------------
+    def clear(self):
+        """
+        CatalogCache: Forget everything. This is called when the catalog
+        changes under us -- a table is created, dropped, or altered.
+        """
+        self.entries.clear()
+        self.clears += 1
+
+    # -------------------------------------------------------------------------
+    def get(self, key, load, **kwargs):
+        """
+        CatalogCache: Return the answer for *key*. If we don't have one or it
+        has expired, call *load(**kwargs)* to get a fresh one and remember it.
+        Callers get a copy, so changing what comes back doesn't change the
+        cache. Keys that can't be hashed (because of a bad argument) go
+        straight to *load*, which will complain about the argument.
+        """
+        try:
+            hash(key)
+        except TypeError:
+            return load(**kwargs)
+        if self.ttl <= 0:
+            return load(**kwargs)
+
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is not None and now < entry[0]:
+            self.hits += 1
+            value = entry[1]
+        else:
+            self.misses += 1
+            value = load(**kwargs)
+            self.entries[key] = (now + self.ttl, value)
+        return copy.deepcopy(value)
+
+    # -------------------------------------------------------------------------
+    def stats(self):
+        """
+        CatalogCache: Return a dict of counters describing how the cache is
+        doing
+        """
+        return {'ttl': self.ttl,
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'clears': self.clears}
+
+
+# -----------------------------------------------------------------------------
+class CommandCache(object):
+    """
+    Statements already built from checked arguments, keyed by the operation
+    and the arguments that shape the statement. A repeated call gets its
+    statement from here and skips both the checking and the string building.
+    When the cache fills up, it is emptied and starts over -- keeping it in
+    LRU order, as StatementCache does, costs more on each hit than building
+    the statement again. A size of 0 turns the cache off.
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, size):
+        """
+        CommandCache: Hold at most *size* statements
+        """
+        self.size = size
+        self.cmds = {}
+        self.hits = 0
+        self.misses = 0
+        self.clears = 0
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+        """
+        CommandCache: How many statements are in the cache
+        """
+        return len(self.cmds)
+
+    # -------------------------------------------------------------------------
+    def clear(self):
+        """
+        CommandCache: Forget every statement
+        """
+        self.cmds.clear()
+        self.clears += 1
+
+    # -------------------------------------------------------------------------
+    def get(self, key, build, *args):
+        """
+        CommandCache: Return the statement for *key*, a tuple of the
+        operation and the arguments that shape the statement. If we don't
+        have it, *build(*args)* checks the arguments and builds it, and we
+        remember it. A key holding something that can't be hashed (a bad
+        argument) goes straight to *build*, which will complain about it.
+        """
+        try:
+            rval = self.cmds.get(key)
+        except TypeError:
+            return build(*args)
+        if rval is not None:
+            self.hits += 1
+            return rval
+
+        self.misses += 1
+        rval = build(*args)
+        if 0 < self.size:
+            if self.size <= len(self.cmds):
+                self.clear()
+            self.cmds[key] = rval
+        return rval
+
+    # -------------------------------------------------------------------------
+    def stats(self):
+        """
+        CommandCache: Return a dict of counters describing how the cache is
+        doing
+        """
+        return {'size': self.size,
+                'entries': len(self.cmds),
+                'hits': self.hits,
+                'misses': self.misses,
+                'clears': self.clears}
+
+
+# -----------------------------------------------------------------------------
+class StatementCache(object):
+    """
+    A bounded cache of prepared statement handles keyed by their SQL text.
+    When the cache is full, the least recently used statement is pushed out to
+    make room. Statements that leave the cache (pushed out or cleared) are
+    handed to *release* so the database can free them.
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, size, release=None):
+        """
+        StatementCache: Hold at most *size* statements (but always at least
+        the one most recently prepared).
+        """
+        self.size = size
+        self.release = release
+        self.stmts = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.clears = 0
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+        """
+        StatementCache: How many statements are in the cache
+        """
+        return len(self.stmts)
+
+    # -------------------------------------------------------------------------
+    def clear(self):
+        """
+        StatementCache: Release every cached statement. This is called when
+        the statements can no longer be trusted -- for example, when the
+        connection they belong to is closed or lost.
+        """
+        while self.stmts:
+            cmd, stmt = self.stmts.popitem(last=False)
+            self.free(stmt)
+        self.clears += 1
+
+    # -------------------------------------------------------------------------
+    def discard(self, cmd):
+        """
+        StatementCache: Drop and release the statement for *cmd* if we have
+        it. Used when a statement fails and its state is unknown.
+        """
+        stmt = self.stmts.pop(cmd, None)
+        if stmt is not None:
+            self.free(stmt)
+
+    # -------------------------------------------------------------------------
+    def free(self, stmt):
+        """
+        StatementCache: Pass *stmt* to the release function, if there is one
+        """
+        if self.release is not None:
+            self.release(stmt)
+
+    # -------------------------------------------------------------------------
+    def get(self, cmd, prepare):
+        """
+        StatementCache: Return the statement for *cmd*. If it's not in the
+        cache, call *prepare(cmd)* to get one and remember it.
+        """
+        if cmd in self.stmts:
+            self.hits += 1
+            stmt = self.stmts.pop(cmd)
+        else:
+            self.misses += 1
+            stmt = prepare(cmd)
+            while self.stmts and self.size <= len(self.stmts):
+                old_cmd, old_stmt = self.stmts.popitem(last=False)
+                self.evictions += 1
+                self.free(old_stmt)
+        self.stmts[cmd] = stmt
+        return stmt
+
+    # -------------------------------------------------------------------------
+    def stats(self):
+        """
+        StatementCache: Return a dict of counters describing how the cache is
+        doing
+        """
+        return {'size': self.size,
+                'entries': len(self.stmts),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'clears': self.clears}
+
+
+# -----------------------------------------------------------------------------
+class CursorCache(object):
+    """
+    Cursors kept open for reuse, so a run of small statements doesn't pay to
+    make and close a cursor for each one. There is at most one idle cursor
+    per kind of statement ('write', 'catalog', 'txn', ...). A cursor that is
+    out on loan is not in the cache, so a statement started while another of
+    its kind is running just gets a cursor of its own. Cursors belong to the
+    connection that made them, so the cache must be cleared before that
+    connection goes away.
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, make):
+        """
+        CursorCache: *make()* returns a new cursor on the current connection
+        """
+        self.make = make
+        self.idle = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.closes = 0
+        self.clears = 0
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+        """
+        CursorCache: How many idle cursors are in the cache
+        """
+        return len(self.idle)
+
+    # -------------------------------------------------------------------------
+    def clear(self):
+        """
+        CursorCache: Close every idle cursor. Cursors out on loan when this
+        happens are closed when they come back instead of being kept, since
+        their connection is gone.
+        """
+        while self.idle:
+            kind, cursor = self.idle.popitem()
+            self.discard(cursor)
+        self.generation += 1
+        self.clears += 1
+
+    # -------------------------------------------------------------------------
+    def cursor(self, kind):
+        """
+        CursorCache: Lend out a cursor for a *kind* of statement for the
+        length of a with block (see CursorLoan)
+        """
+        return CursorLoan(self, kind)
+
+    # -------------------------------------------------------------------------
+    def discard(self, cursor):
+        """
+        CursorCache: Close *cursor*. It's being thrown away, so we don't care
+        if that fails.
+        """
+        self.closes += 1
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+    # -------------------------------------------------------------------------
+    def stats(self):
+        """
+        CursorCache: Return a dict of counters describing how the cache is
+        doing
+        """
+        return {'entries': len(self.idle),
+                'hits': self.hits,
+                'misses': self.misses,
+                'closes': self.closes,
+                'clears': self.clears}
+
+
+# -----------------------------------------------------------------------------
+class CursorLoan(object):
+    """
+    A cursor from a CursorCache, on loan for the length of a with block.
+    When the block finishes normally, the cursor goes back in the cache. If
+    the block raises, the cursor could be in any state, so it is closed
+    instead. This is a class rather than a generator because it runs on
+    every statement and a generator based context manager costs several
+    times as much.
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, cache, kind):
+        """
+        CursorLoan: Remember where the cursor comes from
+        """
+        self.cache = cache
+        self.kind = kind
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+        """
+        CursorLoan: Take an idle cursor of our kind from the cache, or make
+        a new one if there isn't one
+        """
+        cache = self.cache
+        self.generation = cache.generation
+        self.cursor = cache.idle.pop(self.kind, None)
+        if self.cursor is None:
+            cache.misses += 1
+            self.cursor = cache.make()
+        else:
+            cache.hits += 1
+        return self.cursor
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, type, value, traceback):
+        """
+        CursorLoan: Give the cursor back, unless something went wrong, the
+        cache was cleared while we had it, or there's already one of its
+        kind idle. In those cases, close it.
+        """
+        cache = self.cache
+        if (type is None and self.generation == cache.generation and
+                self.kind not in cache.idle):
+            cache.idle[self.kind] = self.cursor
+        else:
+            cache.discard(self.cursor)
+
+
+# -----------------------------------------------------------------------------
+class RetryPolicy(object):
+    """
+    Decides when to try a failing operation again and how long to wait first.
+
+    The waits back off exponentially from *base* seconds, doubling after each
+    failure up to *cap*, with a random part (the *jitter* fraction of the
+    wait) so clients that failed together don't all come back together. Each
+    operation starts again from *base* and gives up once it has been retrying
+    for *deadline* seconds.
+
+    The circuit breaker counts failures in a row across operations. After
+    *threshold* of them (0 means never), the breaker opens and operations fail
+    at once rather than piling up behind a database that is down. After
+    *reset* seconds, one operation is let through to test the water. If it
+    works, the breaker closes. If not, it opens again.
+
+    The policy keeps counts of what it has done in self.counts for
+    monitoring. Breaker state changes are also logged.
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, name='', deadline=3600, base=0.1, cap=10.0,
+                 jitter=0.5, threshold=10, reset=30.0,
+                 sleep=time.sleep, clock=time.time):
+        """
+        RetryPolicy: *name* identifies the database in messages. *sleep* and
+        *clock* are there for testing.
+        """
+        self.name = name
+        self.deadline = deadline
+        self.base = base
+        self.cap = cap
+        self.jitter = jitter
+        self.threshold = threshold
+        self.reset = reset
+        self.sleep = sleep
+        self.clock = clock
+        self.state = 'closed'
+        self.failures = 0           # failures in a row, for the breaker
+        self.opened = 0.0           # when the breaker last opened
+        self.last_error = ''
+        self.counts = {'calls': 0,
+                       'retries': 0,
+                       'sleep_time': 0.0,
+                       'deadline_exceeded': 0,
+                       'fast_fails': 0,
+                       'breaker_opens': 0,
+                       'breaker_half_opens': 0,
+                       'breaker_closes': 0}
+
+    # -------------------------------------------------------------------------
+    def delay(self, attempt):
+        """
+        RetryPolicy: How long to wait after failure number *attempt* (counting
+        from 0) of an operation
+        """
+        backoff = min(self.cap, self.base * 2 ** attempt)
+        return backoff * (1.0 - self.jitter * random.random())
+
+    # -------------------------------------------------------------------------
+    def admit(self):
+        """
+        RetryPolicy: Raise a DBIerror if the breaker is open. Once it has been
+        open long enough, let the caller through as a trial.
+        """
+        if self.state != 'open':
+            return
+        elif self.clock() - self.opened < self.reset:
+            self.counts['fast_fails'] += 1
+            raise DBIerror(msg.breaker_open_S % self.last_error,
+                           dbname=self.name)
+        self.state = 'half-open'
+        self.counts['breaker_half_opens'] += 1
+        cfg.log("%s: circuit breaker half-open, trying again" % self.name)
+
+    # -------------------------------------------------------------------------
+    def failed(self, err):
+        """
+        RetryPolicy: Note a transient failure. Return True if that opened the
+        breaker.
+        """
+        self.failures += 1
+        self.last_error = str(err)
+        if (self.state == 'half-open' or
+                (0 < self.threshold <= self.failures and
+                 self.state == 'closed')):
+            self.state = 'open'
+            self.opened = self.clock()
+            self.counts['breaker_opens'] += 1
+            cfg.log("%s: circuit breaker open after %d failures: %s" %
+                    (self.name, self.failures, self.last_error))
+            return True
+        return False
+
+    # -------------------------------------------------------------------------
+    def run(self, exception, classify, payload, *args, **kwargs):
+        """
+        RetryPolicy: Call *payload* with *args* and *kwargs* and return what
+        it returns. If it throws *exception*, *classify* gets the exception.
+        It raises a DBIerror if the error is not worth retrying. Otherwise, we
+        wait and try again until the deadline passes or the breaker opens.
+        """
+        self.admit()
+        self.counts['calls'] += 1
+        start = self.clock()
+        attempt = 0
+        while True:
+            try:
+                rval = payload(*args, **kwargs)
+            except exception as e:
+                classify(e)
+                if self.failed(e):
+                    raise DBIerror(msg.breaker_open_S % self.last_error,
+                                   dbname=self.name)
+                wait = self.delay(attempt)
+                if self.deadline <= self.clock() - start + wait:
+                    self.counts['deadline_exceeded'] += 1
+                    raise DBIerror(msg.retry_deadline_SS %
+                                   (self.deadline, self.last_error),
+                                   dbname=self.name)
+                self.sleep(wait)
+                self.counts['retries'] += 1
+                self.counts['sleep_time'] += wait
+                attempt += 1
+            else:
+                self.succeeded()
+                return rval
+
+    # -------------------------------------------------------------------------
+    def succeeded(self):
+        """
+        RetryPolicy: Note a success. The failure run is over and a trial
+        operation closes the breaker.
+        """
+        self.failures = 0
+        if self.state == 'half-open':
+            self.state = 'closed'
+            self.counts['breaker_closes'] += 1
+            cfg.log("%s: circuit breaker closed" % self.name)
+
+    # -------------------------------------------------------------------------
+    def stats(self):
+        """
+        RetryPolicy: Return the counters along with the breaker state
+        """
+        rval = dict(self.counts)
+        rval.update({'state': self.state, 'failures': self.failures})
+        return rval
+
+
+# -----------------------------------------------------------------------------
+class DBIsqlite(DBI_abstract):
+    begin_cmd = "begin"     # how to open a transaction
+    db_error = sqlite3.Error
+    stage_drop = "drop table %s"
+    max_params = 999        # SQLITE_MAX_VARIABLE_NUMBER in older builds
+
+    # pragmas that can be set from the cfg, in the order they're applied.
+    # page_size has to come before journal_mode, since it can't be changed
+    # once the database is in WAL mode.
+    pragmas = ['page_size', 'journal_mode', 'synchronous', 'cache_size',
+               'mmap_size', 'temp_store', 'busy_timeout']
+
+    # named sets of pragmas for pragma_profile. Negative cache sizes are in
+    # KiB rather than pages.
+    pragma_profiles = {
+        # loading lots of data that could be reloaded after a crash
+        'bulkload': {'journal_mode': 'wal',
+                     'synchronous': 'off',
+                     'cache_size': -262144,
+                     'temp_store': 'memory'},
+        # one writer with report jobs reading at the same time
+        'concurrent-read': {'journal_mode': 'wal',
+                            'synchronous': 'normal',
+                            'cache_size': -65536,
+                            'mmap_size': 268435456,
+                            'busy_timeout': 30000},
+    }
+
+    # what sqlite says when another connection holds a lock we need
+    # (SQLITE_BUSY, SQLITE_LOCKED)
+    contention_msgs = ['database is locked',
+                       'database table is locked',
+                       'database schema is locked']
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def arginfo(cls):
+        """
+        Set required and optional arguments for sqlite db connections. Lock
+        contention is waited out for up to timeout seconds. Contention is not
+        an outage, so by default it doesn't trip the circuit breaker.
+        """
+        return {'req': ['dbname', 'tbl_prefix'],
+                'opt': [('timeout', 60),
+                        ('fetchsize', 1000),
+                        ('check_same_thread', True),
+                        ('pragma_profile', None),
+                        ('retry_cap', 2.0)] +
+                [(x, None) for x in cls.pragmas] +
+                [(name, 0 if name == 'breaker_threshold' else default)
+                 for name, default in DBI_abstract.retry_opt] +
+                DBI_abstract.common_opt}
+
+    # -------------------------------------------------------------------------
+    def __init__(self, *args, **kwargs):
+        """
+        DBIsqlite: See DBI.__init__()
+        """
+        self.validate_args(self.arginfo(), kwargs, self.__class__)
+
+        if self.tbl_prefix != '':
+            self.tbl_prefix = self.tbl_prefix.rstrip('_') + '_'
+        self.catalog = CatalogCache(self.catalog_ttl)
+        self.commands = CommandCache(self.cmd_cache_size)
+        self.retry_setup()
+
+        # With lazy, the database file isn't opened (or checked) until it's
+        # needed
+        self.dbh = None
+        self.lost = True
+        if not self.lazy:
+            self.reconnect_if_lost()
+
+    # -------------------------------------------------------------------------
+    def connect(self):
+        """
+        DBIsqlite: Open the database, set autocommit mode and the pragmas,
+        and make sure the file really is a database
+        """
+        try:
+            self.dbh = sqlite3.connect(
+                self.dbname, check_same_thread=self.check_same_thread)
+            # set autocommit mode
+            self.dbh.isolation_level = None
+            self.set_pragmas()
+            self.table_exists(table="sqlite_master")
+        except sqlite3.Error as e:
+            raise DBIerror(''.join(e.args), dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def disconnect(self):
+        """
+        DBIsqlite: Let go of the connection, ignoring complaints
+        """
+        try:
+            if self.dbh is not None:
+                self.dbh.close()
+        except sqlite3.Error:
+            pass
+
+    # -------------------------------------------------------------------------
+    def set_pragmas(self):
+        """
+        DBIsqlite: Apply the pragmas named in pragma_profile (see
+        pragma_profiles), overridden by any set individually (journal_mode,
+        synchronous, cache_size, mmap_size, temp_store, busy_timeout,
+        page_size). Pragmas that are not set keep the library defaults.
+        """
+        settings = {}
+        if self.pragma_profile:
+            if self.pragma_profile not in self.pragma_profiles:
+                raise DBIerror(msg.invalid_opt_SS % ('pragma_profile',
+                                                     self.pragma_profile),
+                               dbname=self.dbname)
+            settings.update(self.pragma_profiles[self.pragma_profile])
+        for name in self.pragmas:
+            if getattr(self, name) is not None:
+                settings[name] = getattr(self, name)
+
+        for name in [x for x in self.pragmas if x in settings]:
+            # The value goes into the statement as is, so it had better be a
+            # word or a number
+            value = str(settings[name])
+            if not value.lstrip('-').isalnum():
+                raise DBIerror(msg.invalid_opt_SS % (name, value),
+                               dbname=self.dbname)
+            self.dbh.execute("pragma %s = %s" % (name, value)).close()
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+        """
+        DBIsqlite: See DBI.__repr__()
+        """
+        rv = "DBIsqlite(dbname='%s')" % self.dbname
+        return rv
+
+    # -------------------------------------------------------------------------
+    def binary_param(self, value):
+        """
+        DBIsqlite: See DBI_abstract.binary_param(). A str would be bound as
+        text, which sqlite sorts before every blob.
+        """
+        return buffer(value)
+
+    # -------------------------------------------------------------------------
+    def txn_sql(self, cmd):
+        """
+        DBIsqlite: Run a transaction control statement
+        """
+        try:
+            self.dbh.execute(cmd)
+        except sqlite3.Error as e:
+            raise DBIerror(cmd + ': ' + ''.join(e.args), dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def bulk_exec(self, cmd, data=None):
+        """
+        DBIsqlite: Run a statement for bulk_apply(), for each row of *data* if
+        there is any. Return the number of rows affected.
+        """
+        try:
+            with contextlib.closing(self.dbh.cursor()) as c:
+                if data is None:
+                    self.execute(c, cmd)
+                else:
+                    self.executemany(c, cmd, data)
+                rval = c.rowcount
+            return rval
+        except sqlite3.Error as e:
+            raise DBIerror(cmd + ': ' + ''.join(e.args), dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def attempt(self, payload, *args, **kwargs):
+        """
+        DBIsqlite: One try at *payload* for retry(), noting when it started so
+        retry_classify() can tell how long it spent stuck on a lock
+        """
+        self.attempt_start = time.time()
+        return payload(*args, **kwargs)
+
+    # -------------------------------------------------------------------------
+    def contended(self, err):
+        """
+        DBIsqlite: See DBI_abstract.contended()
+        """
+        return (isinstance(err, sqlite3.OperationalError) and
+                ''.join(err.args) in self.contention_msgs)
+
+    # -------------------------------------------------------------------------
+    def execute(self, c, cmd, data=None):
+        """
+        DBIsqlite: Run *cmd* on cursor *c*, waiting out lock contention under
+        the retry policy. Inside a transaction, the caller has to deal with
+        contention -- sqlite may need the transaction rolled back to get out
+        of a deadlock -- so there we just run it.
+        """
+        args = (cmd,) if data is None else (cmd, data)
+        if getattr(self, 'txn_depth', 0):
+            return c.execute(*args)
+        return self.retry(sqlite3.Error, c.execute, *args)
+
+    # -------------------------------------------------------------------------
+    def executemany(self, c, cmd, data):
+        """
+        DBIsqlite: Run *cmd* on cursor *c* for each row of *data*. Outside a
+        transaction, the rows are written in one of our own, so a failure
+        part way through can't leave some of them behind. The write lock is
+        taken up front (begin immediate), and that and the commit are where
+        contention shows up, so they're what we retry. The rows are only
+        read once, so a generator is fine.
+        """
+        if getattr(self, 'txn_depth', 0):
+            return c.executemany(cmd, data)
+        self.retry(sqlite3.Error, self.dbh.execute, "begin immediate")
+        try:
+            c.executemany(cmd, data)
+            self.retry(sqlite3.Error, self.dbh.execute, "commit")
+        except:
+            err = sys.exc_info()
+            try:
+                self.dbh.execute("rollback")
+            except sqlite3.Error:
+                pass
+            raise err[0], err[1], err[2]
+
+    # -------------------------------------------------------------------------
+    def retry(self, exception, payload, *args, **kwargs):
+        """
+        DBIsqlite: See DBI_abstract.retry(). The time spent sleeping between
+        tries counts as waiting on locks.
+        """
+        before = self.retry_policy.counts['sleep_time']
+        try:
+            return DBI_abstract.retry(self, exception, payload, *args,
+                                      **kwargs)
+        finally:
+            self.lock_wait_time += (self.retry_policy.counts['sleep_time'] -
+                                    before)
+
+    # -------------------------------------------------------------------------
+    def retry_classify(self, err):
+        """
+        DBIsqlite: Lock contention is worth waiting out. Anything else goes
+        back to the caller as it is.
+        """
+        if not self.contended(err):
+            raise err
+        self.lock_waits += 1
+        self.lock_wait_time += time.time() - self.attempt_start
+
+    # -------------------------------------------------------------------------
+    def ping(self):
+        """
+        DBIsqlite: Return True if the connection is usable
+        """
+        try:
+            self.dbh.execute("select 1").close()
+            return True
+        except sqlite3.Error:
+            return False
+
+    # -------------------------------------------------------------------------
+    def err_handler(self, err):
+        """
+        DBIsqlite: error handler
+        """
+        raise DBIerror(''.join(err.args), dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def alter(self, table='', addcol=None, dropcol=None, pos=None):
+        """
+        DBIsqlite: Sqlite ignores pos if it's set and does not support dropcol.
+        """
+        if type(table) != str:
+            raise DBIerror(msg.tbl_name_str_S % U.my_name(),
+                           dbname=self.dbname)
+        elif table == '':
+            raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
+                           dbname=self.dbname)
+        elif dropcol is not None:
+            raise DBIerror(msg.unsupp_dropcol_sqlite,
+                           dbname=self.dbname)
+        elif addcol is None:
+            raise DBIerror("ALTER requires an action")
+        elif addcol.strip() == "":
+            raise DBIerror(msg.alter_addcol_not_empty)
+        elif any([x in addcol for x in ['"', "'", ';', '=']]):
+            raise DBIerror("Invalid addcol argument")
+
+        try:
+            cmd = ("alter table %s add column %s" %
+                   (self.prefix(table), addcol))
+            with contextlib.closing(self.dbh.cursor()) as c:
+                self.execute(c, cmd)
+        except sqlite3.Error as e:
+            raise DBIerror(''.join(e.args), dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        """
+        DBIsqlite: See DBI.close()
+        """
+        # Close the database connection
+        if hasattr(self, "sqlite_closed") and self.sqlite_closed:
+            raise DBIerror("closing a closed connection", dbname=self.dbname)
+        self.sqlite_closed = True
+        try:
+            if self.dbh is not None:
+                self.dbh.close()
+        # Convert any sqlite3 error into a DBIerror
+        except sqlite3.Error as e:
+            raise DBIerror(''.join(e.args), dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def create(self, table='', fields=[]):
+        """
+        DBIsqlite: See DBI.create()
+        """
+
+        if type(fields) != list:
+            raise DBIerror(msg.fields_list_S % U.my_name(),
+                           dbname=self.dbname)
+        elif fields == []:
+            raise DBIerror(msg.fields_notmt_S % U.my_name(),
+                           dbname=self.dbname)
+        if type(table) != str:
+            raise DBIerror(msg.tbl_name_str_S % U.my_name(),
+                           dbname=self.dbname)
+        elif table == '':
+            raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
+                           dbname=self.dbname)
+
+        # Construct and run the create statement
+        try:
+            cmd = ("create table %s(" % self.prefix(table) +
+                   ", ".join(fields) +
+                   ")")
+            with contextlib.closing(self.dbh.cursor()) as c:
+                self.execute(c, cmd)
+        # Convert any sqlite3 error into a DBIerror
+        except sqlite3.Error as e:
+            raise DBIerror(''.join(e.args), dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def cursor(self):
+        """
+        DBIsqlite: See DBI.cursor()
+        """
+        try:
+            rval = self.dbh.cursor()
+            return rval
+        except sqlite3.Error as e:
+            raise DBIerror(''.join(e.args), dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def delete(self, table='', where='', data=()):
+        """
+        DBIsqlite: See DBI.delete()
+        """
+        cmd = self.delete_cmd(U.my_name(), table, where, data)
+
+        # Run the statement
+        try:
+            start = time.time()
+            with contextlib.closing(self.dbh.cursor()) as c:
+                if '?' in cmd:
+                    self.execute(c, cmd, data)
+                else:
+                    self.execute(c, cmd)
+
+                self.log_slow(cmd, len(data), c.rowcount, start)
+        # Translate any sqlite3 errors to DBIerror
+        except sqlite3.Error as e:
+            raise DBIerror(cmd + ': ' + ''.join(e.args), dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def delete_sql(self, caller, table, where):
+        """
+        DBIsqlite: Check the arguments for delete() (apart from the data, see
+        where_data()) and build the delete statement
+        """
+        # Handle invalid arguments
+        if type(table) != str:
+            raise DBIerror(msg.tbl_name_str_S % caller,
+                           dbname=self.dbname)
+        elif table == '':
+            raise DBIerror(msg.tbl_name_notmt_S % caller,
+                           dbname=self.dbname)
+        elif type(where) != str:
+            raise DBIerror(msg.where_str_S % caller,
+                           dbname=self.dbname)
+
+        cmd = "delete from %s" % self.prefix(table)
+        if where != '':
+            cmd += " where %s" % where
+        return cmd
+
+    # -------------------------------------------------------------------------
+    def describe(self, table=''):
+        """
+        DBIsqlite: Return the description of a table.
+        """
+        cmd = "pragma table_info(%s)" % self.prefix(table)
+        try:
+            with contextlib.closing(self.dbh.cursor()) as c:
+                self.execute(c, cmd)
+                rows = c.fetchall()
+        except sqlite3.Error as e:
+            self.err_handler(e)
+
+        if [] == rows:
+            raise DBIerror(msg.no_such_table_S % self.prefix(table))
+
+        return rows
+
+    # -------------------------------------------------------------------------
+    def drop(self, table=''):
+        """
+        DBIsqlite: See DBI.create()
+        """
+        # Handle bad arguments
+        if type(table) != str:
+            raise DBIerror(msg.tbl_name_str_S % "drop",
+                           dbname=self.dbname)
+        elif table == '':
+            raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
+                           dbname=self.dbname)
+
+        # Construct and run the drop statement
+        try:
+            cmd = ("drop table %s" % self.prefix(table))
+            with contextlib.closing(self.dbh.cursor()) as c:
+                self.execute(c, cmd)
+        # Convert any sqlite3 error into a DBIerror
+        except sqlite3.Error as e:
+            raise DBIerror(''.join(e.args), dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def insert(self, table='', ignore=False, fields=[], data=[],
+               bulk=None, chunk_rows=None, chunk_bytes=None):
+        """
+        DBIsqlite: See DBI.insert(). sqlite runs executemany() in process, so
+        there are no round trips for bulk mode to save. The bulk arguments are
+        accepted so callers can make the same call on any database.
+        """
+        cmd = self.insert_cmd(U.my_name(), table, fields, ignore)
+        data = self.data_rows(data, U.my_name(), msg.data_list_notmt)
+
+        # Run the insert statement. executemany() takes the rows one at a
+        # time from an iterator, so rows from a generator are never all in
+        # memory at once.
+        try:
+            start = time.time()
+            with contextlib.closing(self.dbh.cursor()) as c:
+                self.executemany(c, cmd, data)
+                self.log_slow(cmd, len(fields), c.rowcount, start)
+        # Translate sqlite specific exception into a DBIerror
+        except sqlite3.Error as e:
+            raise DBIerror(cmd + ": " + ''.join(e.args),
+                           dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def insert_sql(self, caller, table, fields, ignore):
+        """
+        DBIsqlite: Check the arguments for insert() (apart from the data) and
+        build the insert statement
+        """
+        # Handle any bad arguments
+        if type(table) != str:
+            raise DBIerror(msg.tbl_name_str_S % caller,
+                           dbname=self.dbname)
+        elif table == '':
+            raise DBIerror(msg.tbl_name_notmt_S % caller,
+                           dbname=self.dbname)
+        elif type(fields) != list:
+            raise DBIerror(msg.fields_list_S % caller,
+                           dbname=self.dbname)
+        elif fields == []:
+            raise DBIerror(msg.fields_notmt, dbname=self.dbname)
+        elif type(ignore) != bool:
+            raise DBIerror(msg.insert_ignore_bool, dbname=self.dbname)
+
+        return ("insert %s" % ("or ignore " if ignore else "") +
+                "into %s(" % self.prefix(table) +
+                ",".join(fields) +
+                ") values (" +
+                ",".join(["?" for x in fields]) +
+                ")")
+
+    # -------------------------------------------------------------------------
+    def select(self, table='',
+               fields=[],
+               where='',
+               data=(),
+               groupby='',
+               orderby='',
+               limit=None,
+               offset=None,
+               unbuffered=None,
+               row_format=None,
+               columnar=False):
+        """
+        DBIsqlite: See DBI.select(). The rows are already in process, so
+        *unbuffered* doesn't apply.
+        """
+        cmd = self.select_cmd(U.my_name(), table=table, fields=fields,
+                              where=where, data=data, groupby=groupby,
+                              orderby=orderby, limit=limit,
+                              offset=offset)
+        row_format = self.row_format_default(row_format, columnar)
+
+        # Run the select statement
+        try:
+            start = time.time()
+            with contextlib.closing(self.dbh.cursor()) as c:
+                if '?' in cmd:
+                    self.execute(c, cmd, data)
+                else:
+                    self.execute(c, cmd)
+                rv = c.fetchall()
+                self.log_slow(cmd, len(data), len(rv), start)
+                if row_format != 'tuple':
+                    rv = self.format_rows(rv, self.column_names(c), row_format)
+            return rv
+        # Translate any sqlite3 errors to DBIerror
+        except sqlite3.Error as e:
+            raise DBIerror(''.join(e.args),
+                           dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def select_sql(self, caller, table, fields, where, groupby, orderby,
+                   limit, offset):
+        """
+        DBIsqlite: Check the arguments for select() or select_iter() (apart
+        from the data, see where_data()) and build the select statement they
+        describe. See DBI_abstract.select_cmd().
+        """
+        # Handle invalid arguments
+        if type(table) != str:
+            raise DBIerror(msg.tbl_name_str_S % caller,
+                           dbname=self.dbname)
+        elif table == '':
+            raise DBIerror(msg.tbl_name_notmt_S % caller,
+                           dbname=self.dbname)
+        elif type(fields) != list:
+            raise DBIerror(msg.fields_list_S % caller,
+                           dbname=self.dbname)
+        elif fields == []:
+            raise DBIerror("Wildcard selects are not supported." +
+                           " Please supply a list of fields.",
+                           dbname=self.dbname)
+        elif type(where) != str:
+            raise DBIerror(msg.where_str_S % caller,
+                           dbname=self.dbname)
+        elif type(groupby) != str:
+            raise DBIerror(msg.select_gb_str, dbname=self.dbname)
+        elif type(orderby) != str:
+            raise DBIerror(msg.select_nso,
+                           dbname=self.dbname)
+        elif limit is not None and type(limit) not in [int, float]:
+            raise DBIerror(msg.select_l_nint)
+        elif offset is not None and type(offset) not in [int, long]:
+            raise DBIerror(msg.select_o_nint)
+
+        # Build the select statement
+        cmd = "select "
+        cmd += ",".join(fields)
+        cmd += " from %s" % self.prefix(table)
+        if where != '':
+            cmd += " where %s" % where
+        if groupby != '':
+            cmd += " group by %s" % groupby
+        if orderby != '':
+            cmd += " order by %s" % orderby
+        if limit is not None:
+            cmd += " limit %d" % int(limit)
+        elif offset is not None:
+            cmd += " limit -1"
+        if offset is not None:
+            cmd += " offset %d" % offset
+        return cmd
+
+    # -------------------------------------------------------------------------
+    def select_iter(self, table='',
+                    fields=[],
+                    where='',
+                    data=(),
+                    groupby='',
+                    orderby='',
+                    limit=None,
+                    offset=None,
+                    batch=None,
+                    unbuffered=None,
+                    row_format=None,
+                    columnar=False):
+        """
+        DBIsqlite: See DBI.select_iter(). sqlite steps through the rows as
+        they're fetched, so it is always unbuffered.
+        """
+        cmd = self.select_cmd(U.my_name(), table=table, fields=fields,
+                              where=where, data=data, groupby=groupby,
+                              orderby=orderby, limit=limit,
+                              offset=offset)
+        batch = self.batch_size(batch)
+        row_format = self.row_format_default(row_format, columnar)
+
+        # Start the select here so bad SQL is reported to the caller now
+        # rather than on the first call to next()
+        start = time.time()
+        c = self.dbh.cursor()
+        try:
+            if '?' in cmd:
+                self.execute(c, cmd, data)
+            else:
+                self.execute(c, cmd)
+        except sqlite3.Error as e:
+            c.close()
+            raise DBIerror(''.join(e.args), dbname=self.dbname)
+        return self.fetch_batches(c, batch, sqlite3.Error, cmd, len(data),
+                                  start, row_format)
+
+    # -------------------------------------------------------------------------
+    def table_exists(self, table=''):
+        """
+        DBIsqlite: See DBI.table_exists()
+        """
+        try:
+            with contextlib.closing(self.dbh.cursor()) as dbc:
+                dbc.execute("""
+                            select name from sqlite_master
+                            where type='table'
+                            and name=?
+                            """, (self.prefix(table),))
+                rows = dbc.fetchall()
+            if 0 == len(rows):
+                return False
+            elif 1 == len(rows):
+                return True
+            else:
+                raise DBIerror(msg.more_than_one_ss % ('sqlite_master', table))
+        except sqlite3.Error as e:
+            raise DBIerror(''.join(e.args), dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def table_list(self):
+        """
+        DBIsqlite: See DBI.table_list()
+        """
+        try:
+            with contextlib.closing(self.dbh.cursor()) as dbc:
+                dbc.execute("""
+                            select name from sqlite_master
+                            where type='table'
+                            and name like ?
+                            """, (self.prefix('%'),))
+                rows = dbc.fetchall()
+            return rows
+        except sqlite3.Error as e:
+            raise DBIerror(''.join(e.args), dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def update(self, table='', where='', fields=[], data=[]):
+        """
+        DBIsqlite: See DBI.update()
+        """
+        cmd = self.update_cmd(U.my_name(), table, where, fields)
+        data = self.data_rows(data, U.my_name(), msg.data_notmt)
+
+        # Run the update statement
+        try:
+            start = time.time()
+            with contextlib.closing(self.dbh.cursor()) as c:
+                self.executemany(c, cmd, data)
+                self.log_slow(cmd, cmd.count('?'), c.rowcount, start)
+        # Translate database-specific exceptions into DBIerrors
+        except sqlite3.Error as e:
+            raise DBIerror(''.join(e.args),
+                           dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def update_sql(self, caller, table, where, fields):
+        """
+        DBIsqlite: Check the arguments for update() (apart from the data) and
+        build the update statement
+        """
+        # Handle invalid arguments
+        if type(table) != str:
+            raise DBIerror(msg.tbl_name_str_S % caller,
+                           dbname=self.dbname)
+        elif table == '':
+            raise DBIerror(msg.tbl_name_notmt_S % caller,
+                           dbname=self.dbname)
+        elif type(where) != str:
+            raise DBIerror(msg.where_str_S % caller,
+                           dbname=self.dbname)
+        elif type(fields) != list:
+            raise DBIerror(msg.fields_list_S % caller,
+                           dbname=self.dbname)
+        elif fields == []:
+            raise DBIerror(msg.fields_notmt_S % caller,
+                           dbname=self.dbname)
+        elif '"?"' in where or "'?'" in where:
+            raise DBIerror(msg.param_noquote)
+
+        cmd = "update %s" % self.prefix(table)
+        cmd += " set %s" % ",".join(["%s=?" % x for x in fields])
+        if where != '':
+            cmd += " where %s" % where
+        return cmd
+
+    # -------------------------------------------------------------------------
+    def bulk_delete(self, table='', keys=[], data=[]):
+        """
+        DBIsqlite: See DBI.bulk_delete()
+        """
+        data, rest = self.upsert_args(U.my_name(), table, keys, keys, data)
+        tname = self.prefix(table)
+        if len(keys) == 1:
+            cmd = ("delete from %s where %s in (select %s from %s)" %
+                   (tname, keys[0], keys[0], self.stage_table))
+        else:
+            cmd = ("delete from %s where exists (select 1 from %s s "
+                   "where %s)" % (tname, self.stage_table,
+                                  self.bulk_match(tname, keys)))
+        self.bulk_apply(table, keys, keys, data, cmd)
+
+    # -------------------------------------------------------------------------
+    def bulk_update(self, table='', fields=[], keys=[], data=[]):
+        """
+        DBIsqlite: See DBI.bulk_update(). Older sqlite has no update ...
+        from, so each field is set from a correlated subquery on the indexed
+        staging table.
+        """
+        data, upd = self.upsert_args(U.my_name(), table, fields, keys, data)
+        if not upd:
+            raise DBIerror(msg.update_keys_only_S % U.my_name(),
+                           dbname=self.dbname)
+        tname = self.prefix(table)
+        match = self.bulk_match(tname, keys)
+        cmd = ("update %s set " % tname +
+               ",".join(["%s=(select s.%s from %s s where %s)" %
+                         (f, f, self.stage_table, match) for f in upd]) +
+               " where exists (select 1 from %s s where %s)" %
+               (self.stage_table, match))
+        self.bulk_apply(table, fields, keys, data, cmd)
+
+    # -------------------------------------------------------------------------
+    def upsert(self, table='', fields=[], keys=[], data=[]):
+        """
+        DBIsqlite: See DBI.upsert(). This is 'insert ... on conflict (keys) do
+        update', so keys must match a primary key or unique index on the
+        table.
+        """
+        data, upd = self.upsert_args(U.my_name(), table, fields, keys, data)
+
+        try:
+            cmd = ("insert into %s(" % self.prefix(table) +
+                   ",".join(fields) +
+                   ") values (" +
+                   ",".join(["?" for x in fields]) +
+                   ") on conflict(%s) do " % ",".join(keys))
+            if upd:
+                cmd += "update set " + ",".join(["%s=excluded.%s" % (x, x)
+                                                 for x in upd])
+            else:
+                cmd += "nothing"
+            start = time.time()
+            with contextlib.closing(self.dbh.cursor()) as c:
+                self.executemany(c, cmd, data)
+                self.log_slow(cmd, len(fields), c.rowcount, start)
+        # Translate sqlite specific exception into a DBIerror
+        except sqlite3.Error as e:
+            raise DBIerror(cmd + ": " + ''.join(e.args),
+                           dbname=self.dbname)
+
+
+# -----------------------------------------------------------------------------
+class DBImysql(DBI_abstract):
+    begin_cmd = "start transaction"     # how to open a transaction
+    lost_codes = [2003, 2006, 2013]     # connection refused, gone, lost
+    max_params = 10000                  # well inside max_allowed_packet
+    stage_drop = "drop temporary table %s"
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def arginfo(cls):
+        """
+        Set required and optional arguments for mysql db connections
+        """
+        return {'req': ['dbname', 'tbl_prefix',
+                        'hostname', 'username', 'password'],
+                'opt': [('timeout', 3600),
+                        ('fetchsize', 1000),
+                        ('bulk_insert', False),
+                        ('insert_chunk_rows', 1000),
+                        ('insert_chunk_bytes', 1024 * 1024),
+                        ('retry_cap', 10.0),
+                        ('unbuffered', False)] +
+                DBI_abstract.retry_opt +
+                DBI_abstract.common_opt}
+
+    # -------------------------------------------------------------------------
+    def __init__(self, *args, **kwargs):
+        """
+        DBImysql: See DBI.__init__()
+        """
+        self.validate_args(self.arginfo(), kwargs, self.__class__)
+        load_driver('mysql')
+        self.db_error = mysql_exc.Error     # what the driver raises
+
+        if self.tbl_prefix != '':
+            self.tbl_prefix = self.tbl_prefix.rstrip('_') + '_'
+        self.catalog = CatalogCache(self.catalog_ttl)
+        self.commands = CommandCache(self.cmd_cache_size)
+        self.cursors = CursorCache(self.new_cursor)
+        self.retry_setup()
+
+        # The first connection is made the same way as a reconnection. With
+        # lazy, that waits for the first operation.
+        self.dbh = None
+        self.lost = True
+        if not self.lazy:
+            self.reconnect()
+
+    # -------------------------------------------------------------------------
+    def connect(self):
+        """
+        DBImysql: Open a connection with the arguments we were built with
+        and put it in autocommit mode
+        """
+        self.dbh = mysql.connect(host=self.hostname,
+                                 user=self.username,
+                                 passwd=base64.b64decode(self.password),
+                                 db=self.dbname)
+        self.dbh.autocommit(True)
+
+    # -------------------------------------------------------------------------
+    def disconnect(self):
+        """
+        DBImysql: Close what's left of a lost connection. It's gone, so we
+        don't care if that fails.
+        """
+        self.cursors.clear()
+        try:
+            if self.dbh is not None:
+                self.dbh.close()
+        except Exception:
+            pass
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+        """
+        DBImysql: See DBI.__repr__()
+        """
+        rv = "DBImysql(dbname='%s')" % self.dbname
+        return rv
+
+    # -------------------------------------------------------------------------
+    def txn_sql(self, cmd):
+        """
+        DBImysql: Run a transaction control statement. These are not
+        retried -- after a failed commit, the caller has to decide what to
+        do.
+        """
+        try:
+            with self.cursors.cursor('txn') as c:
+                c.execute(cmd)
+        except mysql_exc.Error as e:
+            raise DBIerror(cmd + ': ' + str(e), dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def bulk_exec(self, cmd, data=None):
+        """
+        DBImysql: Run a statement for bulk_apply(), for each row of *data*
+        if there is any, fetchsize rows per multi-row insert. Return the
+        number of rows affected.
+        """
+        try:
+            cmd = cmd.replace('?', '%s')
+            with self.cursors.cursor('write') as c:
+                if data is None:
+                    c.execute(cmd)
+                    return c.rowcount
+                rval = 0
+                for chunk in self.data_batches(data):
+                    c.executemany(cmd, chunk)
+                    rval += c.rowcount
+                return rval
+        except mysql_exc.Error as e:
+            self.err_handler(e)
+
+    # -------------------------------------------------------------------------
+    def stage_sql(self, stage, table, fields, keys):
+        """
+        DBImysql: See DBI_abstract.stage_sql(). A separate 'create index'
+        would commit the transaction bulk_apply() is running in (and any
+        the caller has open), so the index is declared with the table.
+        Creating a temporary table doesn't commit.
+        """
+        return ["create temporary table %s (index (%s)) as select %s "
+                "from %s where 1 = 0" % (stage, ",".join(keys),
+                                         ",".join(fields),
+                                         self.prefix(table))]
+
+    # -------------------------------------------------------------------------
+    def ping(self):
+        """
+        DBImysql: Return True if the connection is usable
+        """
+        try:
+            self.dbh.ping()
+            return True
+        except mysql_exc.Error:
+            return False
+
+    # -------------------------------------------------------------------------
+    def err_handler(self, err, retry=False):
+        """
+        DBImysql: Error handler. If this returns, the error is transient
+        and the operation may be retried (*retry* says the caller will do
+        that). How long to wait before trying again is up to the retry
+        policy.
+
+        If the connection has been lost, we drop it so the next try starts
+        on a new one. Inside a transaction, the server has already rolled
+        back the work, so we don't retry.
+        """
+        if isinstance(err, DBIerror):
+            raise err
+        elif isinstance(err, mysql_exc.ProgrammingError):
+            raise DBIerror(str(err), dbname=self.dbname)
+        elif 1 < len(err.args) and err.args[0] in self.lost_codes:
+            self.lose_connection()
+            if retry and getattr(self, 'txn_depth', 0) == 0:
+                return
+            raise DBIerror("%d: %s" % err.args, dbname=self.dbname)
+        elif 1 < len(err.args) and err.args[0] == 1047 and retry:
+            return
+        else:
+            raise DBIerror("%d: %s" % err.args, dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def alter(self, table='', addcol=None, dropcol=None, pos=None):
+        """
+        DBImysql: Alter the table as indicated.
+        """
+        cmd = ''
+        if type(table) != str:
+            raise DBIerror(msg.tbl_name_str_S % U.my_name(),
+                           dbname=self.dbname)
+        elif table == '':
+            raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
+                           dbname=self.dbname)
+        elif addcol is not None and dropcol is not None:
+            raise DBIerror(msg.alter_mutual_excl, dbname=self.dbname)
+        elif addcol is not None:
+            if addcol.strip() == '':
+                raise DBIerror(msg.alter_addcol_not_empty,
+                               dbname=self.dbname)
+            if any([x in addcol for x in ['"', "'", ';', '=']]):
+                raise DBIerror("Invalid addcol argument")
+            if pos:
+                cmd = ("alter table %s add column %s %s" %
+                       (self.prefix(table), addcol, pos))
+            else:
+                cmd = ("alter table %s add column %s" %
+                       (self.prefix(table), addcol))
+        elif dropcol is not None:
+            if dropcol.strip() == '':
+                raise DBIerror("On alter, dropcol must not be empty",
+                               dbname=self.dbname)
+            if any([x in dropcol for x in ['"', "'", ';', '=']]):
+                raise DBIerror("Invalid dropcol argument")
+            cmd = ("alter table %s drop column %s" %
+                   (self.prefix(table), dropcol))
+        if cmd == '':
+            raise DBIerror("ALTER requires an action")
+
+        try:
+            with self.cursors.cursor('ddl') as c:
+                c.execute(cmd)
+        except mysql_exc.Error as e:
+            self.err_handler(e)
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        """
+        DBImysql: See DBI.close()
+        """
+        # Close the database connection
+        self.cursors.clear()
+        try:
+            if self.dbh is not None:
+                self.dbh.close()
+        # Convert any mysql error into a DBIerror
+        except mysql_exc.Error as e:
+            self.err_handler(e)
+
+    # -------------------------------------------------------------------------
+    def create(self, table='', fields=[]):
+        """
+        DBImysql: See DBI.create()
+        """
+        # Handle bad arguments
+        if type(fields) != list:
+            raise DBIerror(msg.fields_list_S % U.my_name(),
+                           dbname=self.dbname)
+        elif fields == []:
+            raise DBIerror(msg.fields_notmt_S % U.my_name(),
+                           dbname=self.dbname)
+        if type(table) != str:
+            raise DBIerror(msg.tbl_name_str_S % U.my_name(),
+                           dbname=self.dbname)
+        elif table == '':
+            raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
+                           dbname=self.dbname)
+
+        # Construct and run the create statement
+        mysql_f = [x.replace('autoincrement', 'auto_increment')
+                   for x in fields]
+        try:
+            cmd = ("create table %s(" % self.prefix(table) +
+                   ", ".join(mysql_f) +
+                   ") engine = innodb")
+            with self.cursors.cursor('ddl') as c:
+                c.execute(cmd)
+
+        # Convert any db specific error into a DBIerror
+        except mysql_exc.Error as e:
+            self.err_handler(e)
+
+    # -------------------------------------------------------------------------
+    def cursor(self):
+        """
+        DBImysql: get a cursor
+        """
+        try:
+            rval = self.dbh.cursor()
+            return rval
+        except mysql_exc.Error as e:
+            self.err_handler(e)
+
+    # -------------------------------------------------------------------------
+    def delete(self, table='', where='', data=()):
+        """
+        DBImysql: delete records
+        """
+        cmd = self.delete_cmd(U.my_name(), table, where, data)
+
+        # Run the statement
+        try:
+            start = time.time()
+            with self.cursors.cursor('write') as c:
+                if '%s' in cmd:
+                    c.execute(cmd, data)
+                else:
+                    c.execute(cmd)
+                self.log_slow(cmd, len(data), c.rowcount, start)
+        # Translate any db specific errors to DBIerror
+        except mysql_exc.Error as e:
+            self.err_handler(e)
+
+    # -------------------------------------------------------------------------
+    def delete_sql(self, caller, table, where):
+        """
+        DBImysql: Check the arguments for delete() (apart from the data, see
+        where_data()) and build the delete statement
+        """
+        # Handle invalid arguments
+        if type(table) != str:
+            raise DBIerror(msg.tbl_name_str_S % caller,
+                           dbname=self.dbname)
+        elif table == '':
+            raise DBIerror(msg.tbl_name_notmt_S % caller,
+                           dbname=self.dbname)
+        elif type(where) != str:
+            raise DBIerror(msg.where_str_S % caller,
+                           dbname=self.dbname)
+
+        cmd = "delete from %s" % self.prefix(table)
+        if where != '':
+            cmd += " where %s" % where.replace('?', '%s')
+        return cmd
+
+    # -------------------------------------------------------------------------
+    def describe(self, table=''):
+        """
+        DBImysql: Return a table description
+        """
+        try:
+            cmd = """select column_name, ordinal_position, data_type
+                         from information_schema.columns
+                         where table_name = %s"""
+            with self.cursors.cursor('catalog') as c:
+                c.execute(cmd, (self.prefix(table),))
+                r = c.fetchall()
+        except mysql_exc.Error as e:
+            self.err_handler(e)
+
+        if 0 == len(r):
+            raise DBIerror(msg.no_such_table_S % self.prefix(table))
+
+        return r
+
+    # -------------------------------------------------------------------------
+    def drop(self, table=''):
+        """
+        DBImysql: Drop a mysql table
+        """
+        # Handle bad arguments
+        if type(table) != str:
+            raise DBIerror(msg.tbl_name_str_S % U.my_name(),
+                           dbname=self.dbname)
+        elif table == '':
+            raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
+                           dbname=self.dbname)
+
+        # Construct and run the drop statement
+        try:
+            with warnings.catch_warnings():
+                warnings.filterwarnings("ignore",
+                                        "Unknown table '.*'")
+                cmd = ("drop table %s" % self.prefix(table))
+                with self.cursors.cursor('ddl') as c:
+                    c.execute(cmd)
+
+        # Convert any db specific error into a DBIerror
+        except mysql_exc.Error as e:
+            self.err_handler(e)
+
+    # -------------------------------------------------------------------------
+    def insert(self, table='', ignore=False, fields=[], data=[],
+               bulk=None, chunk_rows=None, chunk_bytes=None):
+        """
+        DBImysql: Insert into a mysql database. By default, the rows go to
+        executemany(). In bulk mode (*bulk* True, or the bulk_insert option
+        set for the connection), the rows are sent in chunks, each as a
+        single multi-row 'insert ... values (...), (...), ...' statement.
+        A chunk holds at most *chunk_rows* rows (default insert_chunk_rows)
+        and about *chunk_bytes* bytes of values (default
+        insert_chunk_bytes), which should stay well under the server's
+        max_allowed_packet.
+        """
+        cmd, row_ph = self.insert_cmd(U.my_name(), table, fields, ignore)
+        data = self.data_rows(data, U.my_name(), msg.data_list_notmt)
+
+        if bulk is None:
+            bulk = self.bulk_insert
+        if chunk_rows is None:
+            chunk_rows = self.insert_chunk_rows
+        if chunk_bytes is None:
+            chunk_bytes = self.insert_chunk_bytes
+        if type(chunk_rows) != int or chunk_rows <= 0:
+            raise DBIerror(msg.chunk_int_S % 'chunk_rows',
+                           dbname=self.dbname)
+        elif type(chunk_bytes) != int or chunk_bytes <= 0:
+            raise DBIerror(msg.chunk_int_S % 'chunk_bytes',
+                           dbname=self.dbname)
+
+        # Run the insert statement
+        try:
+            start = time.time()
+            count = 0
+            with self.cursors.cursor('write') as c, \
+                    warnings.catch_warnings():
+                if ignore:
+                    warnings.filterwarnings("ignore",
+                                            "Duplicate entry .*")
+                if bulk:
+                    for chunk in self.row_chunks(data,
+                                                 chunk_rows,
+                                                 chunk_bytes):
+                        self.insert_chunk(c, cmd, row_ph, fields, chunk)
+                        count += c.rowcount
+                else:
+                    for chunk in self.data_batches(data):
+                        c.executemany(cmd + row_ph, chunk)
+                        count += c.rowcount
+            self.log_slow(cmd + row_ph, len(fields), count, start)
+        # Translate sqlite specific exception into a DBIerror
+        except mysql_exc.Error as e:
+            self.err_handler(e)
+
+    # -------------------------------------------------------------------------
+    def insert_sql(self, caller, table, fields, ignore):
+        """
+        DBImysql: Check the arguments for insert() (apart from the data) and
+        build the insert statement. It comes in two parts: the statement up
+        through 'values' and the placeholder group for one row, since bulk
+        mode repeats the group for each row in a chunk.
+        """
+        # Handle any bad arguments
+        if type(table) != str:
+            raise DBIerror(msg.tbl_name_str_S % caller,
+                           dbname=self.dbname)
+        elif table == '':
+            raise DBIerror(msg.tbl_name_notmt_S % caller,
+                           dbname=self.dbname)
+        elif type(fields) != list:
+            raise DBIerror(msg.fields_list_S % caller,
+                           dbname=self.dbname)
+        elif fields == []:
+            raise DBIerror(msg.fields_notmt, dbname=self.dbname)
+        elif type(ignore) != bool:
+            raise DBIerror(msg.insert_ignore_bool, dbname=self.dbname)
+
+        cmd = ("insert %s" % ("ignore " if ignore else "") +
+               "into %s(" % self.prefix(table) +
+               ",".join(fields) +
+               ") values ")
+        row_ph = "(" + ",".join(["%s" for x in fields]) + ")"
+        return cmd, row_ph
+
+    # -------------------------------------------------------------------------
+    def insert_chunk(self, c, cmd, row_ph, fields, chunk):
+        """
+        DBImysql: Send the rows in *chunk* as one multi-row insert. *cmd*
+        is the statement up through 'values' and *row_ph* is the
+        placeholder group for one row.
+        """
+        params = []
+        for row in chunk:
+            if len(row) != len(fields):
+                raise DBIerror(msg.row_len_SS % (len(fields), str(row)),
+                               dbname=self.dbname)
+            params.extend(row)
+        c.execute(cmd + ",".join([row_ph] * len(chunk)), params)
+
+    # -------------------------------------------------------------------------
+    def select(self,
+               table='',
+               fields=[],
+               where='',
+               data=(),
+               groupby='',
+               orderby='',
+               limit=None,
+               offset=None,
+               unbuffered=None,
+               row_format=None,
+               columnar=False):
+        """
+        DBImysql: Select from a mysql database. Unbuffered, the rows are
+        still all returned, but they're only held once in client memory
+        rather than twice.
+        """
+        cmd = self.select_cmd(U.my_name(), table=table, fields=fields,
+                              where=where, data=data, groupby=groupby,
+                              orderby=orderby, limit=limit,
+                              offset=offset)
+        rv = self.retry(mysql_exc.Error,
+                        self.do_select,
+                        cmd,
+                        data,
+                        self.unbuffered_default(unbuffered),
+                        self.row_format_default(row_format, columnar))
+        return rv
+
+    # -------------------------------------------------------------------------
+    def select_sql(self, caller, table, fields, where, groupby, orderby,
+                   limit, offset):
+        """
+        DBImysql: Check the arguments for select() or select_iter() (apart
+        from the data, see where_data()) and build the select statement they
+        describe. See DBI_abstract.select_cmd().
+        """
+        # Handle invalid arguments
+        if type(table) != str:
+            raise DBIerror(msg.tbl_name_str_S % caller,
+                           dbname=self.dbname)
+        elif table == '':
+            raise DBIerror(msg.tbl_name_notmt_S % caller,
+                           dbname=self.dbname)
+        elif type(fields) != list:
+            raise DBIerror(msg.fields_list_S % caller,
+                           dbname=self.dbname)
+        elif fields == []:
+            raise DBIerror("Wildcard selects are not supported." +
+                           " Please supply a list of fields.",
+                           dbname=self.dbname)
+        elif type(where) != str:
+            raise DBIerror(msg.where_str_S % caller,
+                           dbname=self.dbname)
+        elif type(groupby) != str:
+            raise DBIerror(msg.select_gb_str, dbname=self.dbname)
+        elif type(orderby) != str:
+            raise DBIerror(msg.select_nso,
+                           dbname=self.dbname)
+        elif limit is not None and type(limit) not in [int, float]:
+            raise DBIerror(msg.select_l_nint)
+        elif offset is not None and type(offset) not in [int, long]:
+            raise DBIerror(msg.select_o_nint)
+
+        # Build the select statement
+        cmd = "select "
+        cmd += ",".join(fields)
+        cmd += " from %s" % self.prefix(table)
+        if where != '':
+            cmd += " where %s" % where.replace('?', '%s')
+        if groupby != '':
+            cmd += " group by %s" % groupby
+        if orderby != '':
+            cmd += " order by %s" % orderby
+        if limit is not None or offset is not None:
+            # mysql has no offset without a limit, so we use the biggest one
+            cmd += " limit %d, %d" % (offset or 0,
+                                      18446744073709551615 if limit is None
+                                      else int(limit))
+        return cmd
+
+    # -------------------------------------------------------------------------
+    def select_iter(self,
+                    table='',
+                    fields=[],
+                    where='',
+                    data=(),
+                    groupby='',
+                    orderby='',
+                    limit=None,
+                    offset=None,
+                    batch=None,
+                    unbuffered=None,
+                    row_format=None,
+                    columnar=False):
+        """
+        DBImysql: See DBI.select_iter()
+        """
+        cmd = self.select_cmd(U.my_name(), table=table, fields=fields,
+                              where=where, data=data, groupby=groupby,
+                              orderby=orderby, limit=limit,
+                              offset=offset)
+        batch = self.batch_size(batch)
+        row_format = self.row_format_default(row_format, columnar)
+
+        # Getting the select started can be retried. Once rows are flowing
+        # to the caller, it's too late for that.
+        start = time.time()
+        c = self.retry(mysql_exc.Error,
+                       self.do_execute,
+                       cmd,
+                       data,
+                       self.unbuffered_default(unbuffered))
+        return self.fetch_batches(c, batch, mysql_exc.Error, cmd,
+                                  len(data), start, row_format)
+
+    # -------------------------------------------------------------------------
+    def unbuffered_default(self, unbuffered):
+        """
+        DBImysql: Resolve the *unbuffered* argument to select() or
+        select_iter(), where None means the connection's default
+        """
+        if unbuffered is None:
+            return self.unbuffered
+        elif type(unbuffered) != bool:
+            raise DBIerror(msg.invalid_opt_SS % ('unbuffered',
+                                                 unbuffered),
+                           dbname=self.dbname)
+        return unbuffered
+
+    # -------------------------------------------------------------------------
+    def close_cursor(self, cursor):
+        """
+        DBImysql: See DBI_abstract.close_cursor(). The server won't take
+        another statement on the connection until an unbuffered result
+        has been read to the end, so whatever the caller didn't want is
+        read and thrown away. If that fails, the connection is no good.
+        """
+        if isinstance(cursor, mysql.cursors.SSCursor):
+            try:
+                while cursor.fetchmany(self.fetchsize):
+                    pass
+            except mysql_exc.Error:
+                self.lose_connection()
+        cursor.close()
+
+    # -------------------------------------------------------------------------
+    def do_execute(self, cmd, data=None, unbuffered=False):
+        """
+        Start *cmd* running and return the cursor holding its result. This
+        is isolated so it can run under retry(). An unbuffered (server
+        side) cursor leaves the result on the server until it's fetched.
+        """
+        if unbuffered:
+            c = self.dbh.cursor(mysql.cursors.SSCursor)
+        else:
+            c = self.dbh.cursor()
+        try:
+            if '%s' in cmd:
+                c.execute(cmd, data)
+            else:
+                c.execute(cmd)
+        except:
+            c.close()
+            raise
+        return c
+
+    # -------------------------------------------------------------------------
+    def do_select(self, cmd, data=None, unbuffered=False, row_format='tuple'):
+        """
+        Routine select has set everything up. These are the calls that
+        might throw an exception that we want to run under retry(), so they
+        need to be isolated in this routine.
+
+        The cursor isn't borrowed from the cursor cache: MySQLdb's cursor
+        holds on to the rows it fetched, so a cached one would keep the
+        whole result in memory until the next select.
+        """
+        start = time.time()
+        c = self.do_execute(cmd, data, unbuffered)
+        try:
+            rval = c.fetchall()
+            count = len(rval)
+            if row_format != 'tuple':
+                rval = self.format_rows(rval, self.column_names(c),
+                                        row_format)
+        finally:
+            c.close()
+        self.log_slow(cmd, len(data or ()), count, start)
+        return rval
+
+    # -------------------------------------------------------------------------
+    def table_exists(self, table=''):
+        """
+        DBImysql: Check whether a table exists in a mysql database
+        """
+        try:
+            with self.cursors.cursor('catalog') as dbc, \
+                    warnings.catch_warnings():
+                warnings.filterwarnings("ignore",
+                                        "Can't read dir of .*")
+                dbc.execute("""
+                            select table_name
+                            from information_schema.tables
+                            where table_name=%s
+                            """, (self.prefix(table),))
+                rows = dbc.fetchall()
+            if 0 == len(rows):
+                return False
+            elif 1 == len(rows):
+                return True
+            else:
+                raise DBIerror(msg.more_than_one_ss %
+                               ('information_schema.tables', table))
+        except mysql_exc.Error as e:
+            self.err_handler(e)
+
+    # -------------------------------------------------------------------------
+    def table_list(self):
+        """
+        DBImysql: See DBI.table_list()
+        """
+        try:
+            with self.cursors.cursor('catalog') as dbc, \
+                    warnings.catch_warnings():
+                warnings.filterwarnings("ignore",
+                                        "Can't read dir of .*")
+                dbc.execute("""
+                            select table_name
+                            from information_schema.tables
+                            where table_name like %s
+                            """, (self.prefix('%'),))
+                rows = dbc.fetchall()
+            return [x[0] for x in rows]
+        except mysql_exc.Error as e:
+            raise DBIerror(''.join(e.args), dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def update(self, table='', where='', fields=[], data=[]):
+        """
+        DBImysql: See DBI.update()
+        """
+        cmd = self.update_cmd(U.my_name(), table, where, fields)
+        data = self.data_rows(data, U.my_name(), msg.data_notmt)
+
+        # Run the update statement
+        try:
+            start = time.time()
+            count = 0
+            with self.cursors.cursor('write') as c:
+                for chunk in self.data_batches(data):
+                    c.executemany(cmd, chunk)
+                    count += c.rowcount
+            self.log_slow(cmd, cmd.count('%s'), count, start)
+        # Translate database-specific exceptions into DBIerrors
+        except mysql_exc.Error as e:
+            self.err_handler(e)
+
+    # -------------------------------------------------------------------------
+    def update_sql(self, caller, table, where, fields):
+        """
+        DBImysql: Check the arguments for update() (apart from the data) and
+        build the update statement
+        """
+        # Handle invalid arguments
+        if type(table) != str:
+            raise DBIerror(msg.tbl_name_str_S % caller,
+                           dbname=self.dbname)
         elif table == '':
-            raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
+            raise DBIerror(msg.tbl_name_notmt_S % caller,
                            dbname=self.dbname)
         elif type(where) != str:
-            raise DBIerror(msg.where_str_S % U.my_name(),
+            raise DBIerror(msg.where_str_S % caller,
                            dbname=self.dbname)
         elif type(fields) != list:
-            raise DBIerror(msg.fields_list_S % U.my_name(),
+            raise DBIerror(msg.fields_list_S % caller,
                            dbname=self.dbname)
         elif fields == []:
-            raise DBIerror(msg.fields_notmt_S % U.my_name(),
-                           dbname=self.dbname)
-        elif type(data) != list:
-            raise DBIerror(msg.data_list_S % U.my_name(),
-                           dbname=self.dbname)
-        elif data == []:
-            raise DBIerror(msg.data_notmt,
+            raise DBIerror(msg.fields_notmt_S % caller,
                            dbname=self.dbname)
         elif '"?"' in where or "'?'" in where:
             raise DBIerror(msg.param_noquote)
 
-        # Build and run the update statement
-        try:
-            cmd = "update %s" % self.prefix(table)
-            cmd += " set %s" % ",".join(["%s=?" % x for x in fields])
-            if where != '':
-                cmd += " where %s" % where
+        cmd = "update %s" % self.prefix(table)
+        cmd += " set %s" % ",".join(["%s=" % x + "%s" for x in fields])
+        if where != '':
+            cmd += " where %s" % where.replace('?', '%s')
+        return cmd
 
-            c = self.dbh.cursor()
-            c.executemany(cmd, data)
-            c.close()
-        # Translate database-specific exceptions into DBIerrors
-        except sqlite3.Error as e:
-            raise DBIerror(''.join(e.args),
+    # -------------------------------------------------------------------------
+    def bulk_delete(self, table='', keys=[], data=[]):
+        """
+        DBImysql: See DBI.bulk_delete(). This is a multi-table delete
+        joining the staging table.
+        """
+        data, rest = self.upsert_args(U.my_name(), table, keys, keys,
+                                      data)
+        tname = self.prefix(table)
+        cmd = ("delete %s from %s join %s s on %s" %
+               (tname, tname, self.stage_table,
+                self.bulk_match(tname, keys)))
+        self.bulk_apply(table, keys, keys, data, cmd)
+
+    # -------------------------------------------------------------------------
+    def bulk_update(self, table='', fields=[], keys=[], data=[]):
+        """
+        DBImysql: See DBI.bulk_update(). This is an update joining the
+        staging table.
+        """
+        data, upd = self.upsert_args(U.my_name(), table, fields, keys,
+                                     data)
+        if not upd:
+            raise DBIerror(msg.update_keys_only_S % U.my_name(),
                            dbname=self.dbname)
+        tname = self.prefix(table)
+        cmd = ("update %s join %s s on %s set " %
+               (tname, self.stage_table, self.bulk_match(tname, keys)) +
+               ",".join(["%s.%s=s.%s" % (tname, f, f) for f in upd]))
+        self.bulk_apply(table, fields, keys, data, cmd)
+
+    # -------------------------------------------------------------------------
+    def upsert(self, table='', fields=[], keys=[], data=[]):
+        """
+        DBImysql: See DBI.upsert(). This is 'insert ... on duplicate key
+        update'. Mysql decides what is a duplicate from the table's
+        primary and unique keys, so *keys* only determines which fields
+        are left alone when a row is updated. MySQLdb's executemany()
+        sends each batch as a single multi-row statement.
+        """
+        data, upd = self.upsert_args(U.my_name(), table, fields, keys,
+                                     data)
+
+        try:
+            # With nothing but keys to set, a key set to its current value
+            # makes the update a no-op. (key=values(key) would not be -- the
+            # duplicate may have been found on some other unique key.)
+            if upd:
+                dup = ",".join(["%s=values(%s)" % (x, x) for x in upd])
+            else:
+                dup = "%s=%s" % (keys[0], keys[0])
+            cmd = ("insert into %s(" % self.prefix(table) +
+                   ",".join(fields) +
+                   ") values (" +
+                   ",".join(["%s" for x in fields]) +
+                   ") on duplicate key update " + dup)
+            start = time.time()
+            count = 0
+            with self.cursors.cursor('write') as c:
+                for chunk in self.data_batches(data):
+                    c.executemany(cmd, chunk)
+                    count += c.rowcount
+            self.log_slow(cmd, len(fields), count, start)
+        # Translate database-specific exceptions into DBIerrors
+        except mysql_exc.Error as e:
+            self.err_handler(e)
+
 
+# -----------------------------------------------------------------------------
+class DBIdb2(DBI_abstract):
+    native_rows = 'dict'        # fetch_assoc() is what we've always used
+    db_error = Exception        # ibm_db raises plain Exceptions
+    max_params = 1000           # well inside the statement size limit
 
-if mysql_available:
     # -------------------------------------------------------------------------
-    class DBImysql(DBI_abstract):
-        # ---------------------------------------------------------------------
-        @classmethod
-        def arginfo(cls):
-            """
-            Set required and optional arguments for mysql db connections
-            """
-            return {'req': ['dbname', 'tbl_prefix',
-                            'hostname', 'username', 'password'],
-                    'opt': [('timeout', 3600)]}
+    @classmethod
+    def arginfo(self):
+        """
+        Set required and optional arguments for db2 connections
+        """
+        return {'req': ['dbname', 'tbl_prefix', 'hostname', 'port',
+                        'username', 'password'],
+                'opt': [('timeout', 3600),
+                        ('fetchsize', 1000),
+                        ('stmt_cache_size', 50),
+                        ('retry_cap', 60.0)] +
+                DBI_abstract.retry_opt +
+                DBI_abstract.common_opt}
 
-        # ---------------------------------------------------------------------
-        def __init__(self, *args, **kwargs):
-            """
-            DBImysql: See DBI.__init__()
-            """
-            self.validate_args(self.arginfo(), kwargs, self.__class__)
+    # -------------------------------------------------------------------------
+    def __init__(self, *args, **kwargs):
+        """
+        DBIdb2: See DBI.__init__()
+        """
+        self.validate_args(self.arginfo(), kwargs, self.__class__)
+        load_driver('db2')
 
-            if self.tbl_prefix != '':
-                self.tbl_prefix = self.tbl_prefix.rstrip('_') + '_'
+        if self.tbl_prefix != '':
+            self.tbl_prefix = self.tbl_prefix.rstrip('.') + '.'
+        self.catalog = CatalogCache(self.catalog_ttl)
+        self.commands = CommandCache(self.cmd_cache_size)
+        self.retry_setup()
+        self.stmt_cache = StatementCache(self.stmt_cache_size,
+                                         release=self.free_stmt)
+
+        # The first connection is made the same way as a reconnection. With
+        # lazy, that waits for the first operation.
+        self.dbh = None
+        self.lost = True
+        if not self.lazy:
+            self.reconnect()
 
-            self.dbh = self.retry(mysql_exc.Error,
-                                  mysql.connect,
-                                  host=self.hostname,
-                                  user=self.username,
-                                  passwd=base64.b64decode(self.password),
-                                  db=self.dbname)
-            self.dbh.autocommit(True)
+    # -------------------------------------------------------------------------
+    def connect(self):
+        """
+        DBIdb2: Open a connection with the arguments we were built with
+        """
+        cfobj = cfg.add_config()
+        U.env_update(cfobj)
+        dbn = cfobj.get(cfobj.db_section(), self.dbname)
+        cxnstr = ("database=%s;" % dbn +
+                  "hostname=%s;" % self.hostname +
+                  "port=%s;" % self.port +
+                  "uid=%s;" % self.username +
+                  "pwd=%s;" % base64.b64decode(self.password))
+        self.dbh = db2.connect(cxnstr, "", "")
 
-        # ---------------------------------------------------------------------
-        def __repr__(self):
-            """
-            DBImysql: See DBI.__repr__()
-            """
-            rv = "DBImysql(dbname='%s')" % self.dbname
-            return rv
+    # -------------------------------------------------------------------------
+    def disconnect(self):
+        """
+        DBIdb2: Let go of a lost connection. Statements prepared on it are
+        no good any more. The connection is gone, so we don't care if
+        closing it fails.
+        """
+        self.stmt_cache.clear()
+        try:
+            if self.dbh is not None:
+                db2.close(self.dbh)
+        except Exception:
+            pass
 
-        # ---------------------------------------------------------------------
-        def err_handler(self, err):
-            """
-            DBImysql: Error handler. If this returns, it should be called in a
-            loop to retry operations that are having transient failures.
-            """
-            if isinstance(err, mysql_exc.ProgrammingError):
+    # -------------------------------------------------------------------------
+    def lost_connection(self, err):
+        """
+        DBIdb2: Return True if *err* says the connection is gone
+        """
+        return 'A communication error has been detected' in str(err)
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+        """
+        DBIdb2: See DBI.__repr__()
+        """
+        rv = "DBIdb2(dbname='%s')" % self.dbname
+        return rv
+
+    # -------------------------------------------------------------------------
+    def ping(self):
+        """
+        DBIdb2: Return True if the connection is usable
+        """
+        try:
+            return bool(db2.active(self.dbh))
+        except Exception:
+            return False
+
+    # -------------------------------------------------------------------------
+    def err_handler(self, err=None, message='', retry=False):
+        """
+        DBIdb2: error handler can accept a string or an exception object.
+        If it returns, the error is transient and the operation may be
+        retried (*retry* says the caller will do that) once the retry
+        policy has waited a while. A lost connection is dropped so the
+        retry starts on a new one.
+        """
+        if err is None:
+            raise DBIerror(message, dbname=self.dbname)
+        elif isinstance(err, DBIerror):
+            raise err
+        elif isinstance(err, ibm_db_dbi.Error):
+            raise DBIerror("%d: %s" % err.args, dbname=self.dbname)
+        elif self.lost_connection(err):
+            self.lose_connection()
+            if not retry:
                 raise DBIerror(str(err), dbname=self.dbname)
-            elif 1 < len(err.args) and err.args[0] in [1047, 2003]:
-                print("RETRY")
-                if not hasattr(self, 'sleeptime'):
-                    self.sleeptime = 0.1
-                time.sleep(self.sleeptime)
-                self.sleeptime = min(2*self.sleeptime, 10.0)
+            cfg.log('Riding out DB2 outage -- will reconnect and retry')
+        else:
+            raise DBIerror(str(err), dbname=self.dbname)
+
+    # -------------------------------------------------------------------------
+    def __recognized_exception__(self, exc):
+        """
+        DBIdb2: Return True if exc is recognized as a DB2 error. Otherwise
+        False.
+        """
+        try:
+            q = self.db2_exc_list
+        except AttributeError:
+            self.db2_exc_list = [msg.param_bound,
+                                 "SQLSTATE=",
+                                 "[IBM][CLI Driver][DB2"]
+        rval = False
+        for x in self.db2_exc_list:
+            if x in str(exc):
+                rval = True
+                break
+        return rval
+
+    # -------------------------------------------------------------------------
+    def alter(self, table='', addcol=None, dropcol=None, pos=None):
+        """
+        DBIdb2: See DBI.alter()
+        """
+        raise DBIerror(msg.db2_unsupported_S % "ALTER")
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        """
+        DBIdb2: See DBI.close()
+        """
+        # Close the database connection
+        try:
+            self.stmt_cache.clear()
+            if self.dbh is not None:
+                db2.close(self.dbh)
+        # Convert any db2 error into a DBIerror
+        except Exception as e:
+            self.err_handler(err=e)
+
+    # -------------------------------------------------------------------------
+    def create(self, table='', fields=[]):
+        """
+        DBIdb2: See DBI.create()
+        """
+        raise DBIerror(msg.db2_unsupported_S % "CREATE")
+
+    # -------------------------------------------------------------------------
+    def cursor(self):
+        """
+        DBIdb2: See DBI.cursor()
+        """
+        try:
+            rval = self.dbh.cursor()
+            return rval
+        except ibm_db_dbi.Error as e:
+            raise DBIerror(''.join(e.args), dbname=self.dbname)
+        except Exception as e:
+            if self.__recognized_exception__(e):
+                errmsg = str(e) + "\nSQL: '" + cmd + "'"
+                raise DBIerror(errmsg, dbname=self.dbname)
             else:
-                raise DBIerror("%d: %s" % err.args, dbname=self.dbname)
+                raise
 
-        # ---------------------------------------------------------------------
-        def alter(self, table='', addcol=None, dropcol=None, pos=None):
-            """
-            DBImysql: Alter the table as indicated.
-            """
-            cmd = ''
-            if type(table) != str:
-                raise DBIerror(msg.tbl_name_str_S % U.my_name(),
-                               dbname=self.dbname)
-            elif table == '':
-                raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
-                               dbname=self.dbname)
-            elif addcol is not None and dropcol is not None:
-                raise DBIerror(msg.alter_mutual_excl, dbname=self.dbname)
-            elif addcol is not None:
-                if addcol.strip() == '':
-                    raise DBIerror(msg.alter_addcol_not_empty,
-                                   dbname=self.dbname)
-                if any([x in addcol for x in ['"', "'", ';', '=']]):
-                    raise DBIerror("Invalid addcol argument")
-                if pos:
-                    cmd = ("alter table %s add column %s %s" %
-                           (self.prefix(table), addcol, pos))
-                else:
-                    cmd = ("alter table %s add column %s" %
-                           (self.prefix(table), addcol))
-            elif dropcol is not None:
-                if dropcol.strip() == '':
-                    raise DBIerror("On alter, dropcol must not be empty",
-                                   dbname=self.dbname)
-                if any([x in dropcol for x in ['"', "'", ';', '=']]):
-                    raise DBIerror("Invalid dropcol argument")
-                cmd = ("alter table %s drop column %s" %
-                       (self.prefix(table), dropcol))
-            if cmd == '':
-                raise DBIerror("ALTER requires an action")
+    # -------------------------------------------------------------------------
+    def bulk_delete(self, **kwargs):
+        """
+        DBIdb2: See DBI.bulk_delete()
+        """
+        raise DBIerror(msg.db2_unsupported_S % "BULK DELETE")
 
-            try:
-                c = self.dbh.cursor()
-                c.execute(cmd)
-            except mysql_exc.Error as e:
-                self.err_handler(e)
+    # -------------------------------------------------------------------------
+    def bulk_update(self, **kwargs):
+        """
+        DBIdb2: See DBI.bulk_update()
+        """
+        raise DBIerror(msg.db2_unsupported_S % "BULK UPDATE")
 
-        # ---------------------------------------------------------------------
-        def close(self):
-            """
-            DBImysql: See DBI.close()
-            """
-            # Close the database connection
-            try:
-                self.dbh.close()
-            # Convert any mysql error into a DBIerror
-            except mysql_exc.Error as e:
-                self.err_handler(e)
+    # -------------------------------------------------------------------------
+    def delete(self, **kwargs):
+        """
+        DBIdb2: See DBI.delete()
+        """
+        raise DBIerror(msg.db2_unsupported_S % "DELETE")
 
-        # ---------------------------------------------------------------------
-        def create(self, table='', fields=[]):
-            """
-            DBImysql: See DBI.create()
-            """
-            # Handle bad arguments
-            if type(fields) != list:
-                raise DBIerror(msg.fields_list_S % U.my_name(),
-                               dbname=self.dbname)
-            elif fields == []:
-                raise DBIerror(msg.fields_notmt_S % U.my_name(),
-                               dbname=self.dbname)
-            if type(table) != str:
-                raise DBIerror(msg.tbl_name_str_S % U.my_name(),
-                               dbname=self.dbname)
-            elif table == '':
-                raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
-                               dbname=self.dbname)
+    # -------------------------------------------------------------------------
+    def describe(self, **kwargs):
+        """
+        DBIdb2: Return a table description
+        """
+        raise DBIerror(msg.db2_unsupported_S % "DESCRIBE")
 
-            # Construct and run the create statement
-            mysql_f = [x.replace('autoincrement', 'auto_increment')
-                       for x in fields]
-            try:
-                cmd = ("create table %s(" % self.prefix(table) +
-                       ", ".join(mysql_f) +
-                       ") engine = innodb")
-                c = self.dbh.cursor()
-                c.execute(cmd)
+    # -------------------------------------------------------------------------
+    def drop(self, table=''):
+        """
+        DBIdb2:
+        """
+        raise DBIerror(msg.db2_unsupported_S % "DROP")
 
-            # Convert any db specific error into a DBIerror
-            except mysql_exc.Error as e:
-                self.err_handler(e)
+    # -------------------------------------------------------------------------
+    def insert(self, table='', fields=[], data=[]):
+        """
+        DBIdb2: Insert not supported for DB2
+        """
+        raise DBIerror(msg.db2_unsupported_S % "INSERT")
 
-        # ---------------------------------------------------------------------
-        def cursor(self):
-            """
-            DBImysql: get a cursor
-            """
-            try:
-                rval = self.dbh.cursor()
-                return rval
-            except mysql_exc.Error as e:
-                self.err_handler(e)
+    # -------------------------------------------------------------------------
+    def select(self,
+               table='',
+               fields=[],
+               where='',
+               data=(),
+               groupby='',
+               orderby='',
+               limit=None,
+               offset=None,
+               unbuffered=None,
+               row_format=None,
+               columnar=False):
+        """
+        DBIdb2: Select from a DB2 database. *unbuffered* is for mysql and
+        ignored here.
+        """
+        cmd = self.select_cmd(U.my_name(), table=table, fields=fields,
+                              where=where, data=data, groupby=groupby,
+                              orderby=orderby, limit=limit,
+                              offset=offset)
+        row_format = self.row_format_default(row_format, columnar)
 
-        # ---------------------------------------------------------------------
-        def delete(self, table='', where='', data=()):
-            """
-            DBImysql: delete records
-            """
-            # Handle invalid arguments
-            if type(table) != str:
-                raise DBIerror(msg.tbl_name_str_S % U.my_name(),
-                               dbname=self.dbname)
-            elif table == '':
-                raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
-                               dbname=self.dbname)
-            elif type(where) != str:
-                raise DBIerror(msg.where_str_S % U.my_name(),
-                               dbname=self.dbname)
-            elif type(data) != tuple:
-                raise DBIerror(msg.data_tuple_S % U.my_name(),
-                               dbname=self.dbname)
-            elif '?' not in where and data != ():
-                raise DBIerror(msg.data_ignored, dbname=self.dbname)
-            elif '?' in where and data == ():
-                raise DBIerror(msg.crit_incomplete,
-                               dbname=self.dbname)
+        # Selects don't change anything, so if the connection is lost,
+        # they can be run again on a new one
+        return self.retry(Exception, self.do_select, cmd, data, row_format)
+
+    # -------------------------------------------------------------------------
+    def do_select(self, cmd, data, row_format='dict'):
+        """
+        DBIdb2: Run select statement *cmd* and return its rows in
+        *row_format*. Errors other than a lost connection are turned into
+        DBIerrors here, with the SQL attached, so retry() won't try again.
+        """
+        # The crawler issues the same few statements over and over, so we
+        # hang on to the prepared statements and just execute them again.
+        try:
+            rval = []
+            start = time.time()
+            stmt = self.stmt_cache.get(cmd, self.prepare)
+            args = [stmt]
+            if '?' in cmd:
+                args.append(data)
+            r = db2.execute(*args)
+            fetch = self.fetcher(row_format)
+            x = fetch(stmt)
+            while (x):
+                rval.append(x)
+                x = fetch(stmt)
+            count = len(rval)
+            if row_format in ('named', 'columns'):
+                rval = self.format_rows(rval, self.column_names(stmt),
+                                        row_format)
+
+            # close the cursor but keep the statement prepared
+            db2.free_result(stmt)
+            self.log_slow(cmd, len(data), count, start)
+            return rval
+
+        # Translate any db2 errors to DBIerror
+        except ibm_db_dbi.Error as e:
+            self.stmt_cache.discard(cmd)
+            errmsg = str(e) + "\nSQL: '" + cmd + "'"
+            raise DBIerror(errmsg, dbname=self.dbname)
+        except Exception as e:
+            self.stmt_cache.discard(cmd)
+            if self.lost_connection(e):
+                raise
+            elif self.__recognized_exception__(e):
+                errmsg = str(e) + "\nSQL: '" + cmd + "'"
+                raise DBIerror(errmsg, dbname=self.dbname)
+            else:
+                raise
+
+    # -------------------------------------------------------------------------
+    def fetcher(self, row_format):
+        """
+        DBIdb2: Return the ibm_db routine that fetches rows for *row_format*.
+        fetch_tuple() rows are a fraction of the size of fetch_assoc() dicts
+        and quicker to build; named rows and columns are made from them.
+        """
+        if row_format == 'dict':
+            return db2.fetch_assoc
+        return db2.fetch_tuple
+
+    # -------------------------------------------------------------------------
+    def column_names(self, stmt):
+        """
+        DBIdb2: Return the names of the columns in *stmt*'s result
+        """
+        return [db2.field_name(stmt, idx)
+                for idx in range(db2.num_fields(stmt))]
+
+    # -------------------------------------------------------------------------
+    def prepare(self, cmd):
+        """
+        DBIdb2: Prepare *cmd* on our connection. This is what the
+        statement cache calls when it doesn't already have *cmd*.
+        """
+        return db2.prepare(self.dbh, cmd)
+
+    # -------------------------------------------------------------------------
+    def free_stmt(self, stmt):
+        """
+        DBIdb2: Free a statement the cache is done with. If the connection
+        is gone, so is the statement, so errors here don't matter.
+        """
+        try:
+            db2.free_stmt(stmt)
+        except Exception:
+            pass
+
+    # -------------------------------------------------------------------------
+    def select_sql(self, caller, table, fields, where, groupby, orderby,
+                   limit, offset):
+        """
+        DBIdb2: Check the arguments for select() or select_iter() (apart
+        from the data, see where_data()) and build the select statement they
+        describe. See DBI_abstract.select_cmd().
+        """
+        # Handle invalid arguments
+        if type(table) != str and type(table) != list:
+            raise DBIerror("On %s(), table name must be " % caller +
+                           "a string or a list",
+                           dbname=self.dbname)
+        elif table == '' or table == []:
+            raise DBIerror(msg.tbl_name_notmt_S % caller,
+                           dbname=self.dbname)
+        elif type(fields) != list:
+            raise DBIerror(msg.fields_list_S % caller,
+                           dbname=self.dbname)
+        elif fields == []:
+            raise DBIerror("Wildcard selects are not supported." +
+                           " Please supply a list of fields.",
+                           dbname=self.dbname)
+        elif type(where) != str:
+            raise DBIerror(msg.where_str_S % caller,
+                           dbname=self.dbname)
+        elif type(groupby) != str:
+            raise DBIerror(msg.select_gb_str, dbname=self.dbname)
+        elif type(orderby) != str:
+            raise DBIerror(msg.select_nso,
+                           dbname=self.dbname)
+        elif limit is not None and type(limit) not in [int, float]:
+            raise DBIerror(msg.select_l_nint)
+        elif offset is not None and type(offset) not in [int, long]:
+            raise DBIerror(msg.select_o_nint)
+
+        # Build the select statement
+        cmd = "select "
+        cmd += ",".join(fields)
+
+        if type(table) == str:
+            cmd += " from %s" % self.prefix(table)
+        elif type(table) == list:
+            cmd += " from %s" % ",".join([self.prefix(x)
+                                          for x in table])
+
+        if where != '':
+            cmd += " where %s" % where
+        if groupby != '':
+            cmd += " group by %s" % groupby
+        if orderby != '':
+            cmd += " order by %s" % orderby
+        if offset is not None:
+            cmd += " offset %d rows" % offset
+        if limit is not None:
+            cmd += " fetch first %d rows only" % int(limit)
+        return cmd
+
+    # -------------------------------------------------------------------------
+    def select_iter(self,
+                    table='',
+                    fields=[],
+                    where='',
+                    data=(),
+                    groupby='',
+                    orderby='',
+                    limit=None,
+                    offset=None,
+                    batch=None,
+                    unbuffered=None,
+                    row_format=None,
+                    columnar=False):
+        """
+        DBIdb2: See DBI.select_iter(). The CLI driver does its own block
+        fetching and ibm_db has nothing like fetchmany(), so *batch* only
+        sets how many rows go into each set of columns when *columnar* is
+        True. Rows are fetched as the caller asks for them, so *unbuffered*
+        makes no difference.
+        """
+        cmd = self.select_cmd(U.my_name(), table=table, fields=fields,
+                              where=where, data=data, groupby=groupby,
+                              orderby=orderby, limit=limit,
+                              offset=offset)
+        batch = self.batch_size(batch)
+        row_format = self.row_format_default(row_format, columnar)
+
+        # Getting the select started can be retried. Once rows are flowing
+        # to the caller, it's too late for that.
+        start = time.time()
+        stmt = self.retry(Exception, self.start_stmt, cmd, data)
+        return self.fetch_stmt(stmt, cmd, len(data), start, row_format,
+                               batch)
+
+    # -------------------------------------------------------------------------
+    def start_stmt(self, cmd, data):
+        """
+        DBIdb2: Prepare and execute *cmd* and return the statement, ready
+        for fetching. Like do_select(), errors other than a lost connection
+        become DBIerrors here.
+        """
+        try:
+            stmt = db2.prepare(self.dbh, cmd)
+            args = [stmt]
+            if '?' in cmd:
+                args.append(data)
+            db2.execute(*args)
+            return stmt
+        except ibm_db_dbi.Error as e:
+            errmsg = str(e) + "\nSQL: '" + cmd + "'"
+            raise DBIerror(errmsg, dbname=self.dbname)
+        except Exception as e:
+            if self.lost_connection(e):
+                raise
+            elif self.__recognized_exception__(e):
+                errmsg = str(e) + "\nSQL: '" + cmd + "'"
+                raise DBIerror(errmsg, dbname=self.dbname)
+            else:
+                raise
+
+    # -------------------------------------------------------------------------
+    def fetch_stmt(self, stmt, cmd, params, start, row_format='dict',
+                   batch=None):
+        """
+        DBIdb2: Generate the rows of executed statement *stmt* in
+        *row_format*, or for 'columns', the columns of each *batch* rows.
+        The statement is freed when the rows run out or the consumer closes
+        the generator. *cmd*, *params*, and *start* are for log_slow().
+        """
+        count = 0
+        try:
+            fetch = self.fetcher(row_format)
+            if row_format == 'columns':
+                names = self.column_names(stmt)
+                rows = iter(lambda: fetch(stmt), False)
+                block = list(itertools.islice(rows, batch))
+                while block:
+                    count += len(block)
+                    yield columnar(block, names)
+                    block = list(itertools.islice(rows, batch))
+                return
+            if row_format == 'named':
+                make = row_class(self.column_names(stmt))._make
+            x = fetch(stmt)
+            while x:
+                count += 1
+                yield make(x) if row_format == 'named' else x
+                x = fetch(stmt)
+        except Exception as e:
+            if self.__recognized_exception__(e):
+                errmsg = str(e) + "\nSQL: '" + cmd + "'"
+                raise DBIerror(errmsg, dbname=self.dbname)
+            else:
+                raise
+        finally:
+            db2.free_stmt(stmt)
+            self.log_slow(cmd, params, count, start)
 
-            # Build and run the statement
-            try:
-                cmd = "delete from %s" % self.prefix(table)
-                if where != '':
-                    cmd += " where %s" % where.replace('?', '%s')
+    # -------------------------------------------------------------------------
+    def table_exists(self, table=''):
+        """
+        DBIdb2: Check whether a table exists in a db2 database
+        """
+        try:
+            pfx = self.tbl_prefix.upper().strip('.')
+            rows = self.select(table="@syscat.tables",
+                               fields=['tabname'],
+                               where=("tabschema = '%s'" % pfx +
+                                      " and tabname = '%s'" %
+                                      table.upper()))
+            if 0 == len(rows):
+                return False
+            elif 1 == len(rows):
+                return True
+            else:
+                raise DBIerror(msg.more_than_one_ss %
+                               ('@syscat.tables', table))
+        except ibm_db_dbi.Error as e:
+            raise DBIerror(''.join(e.args), dbname=self.dbname)
+        except Exception as e:
+            if self.__recognized_exception__(e):
+                errmsg = str(e) + "\nSQL: '" + cmd + "'"
+                raise DBIerror(errmsg, dbname=self.dbname)
+            else:
+                raise
 
-                c = self.dbh.cursor()
-                if '%s' in cmd:
-                    c.execute(cmd, data)
-                else:
-                    c.execute(cmd)
+    # -------------------------------------------------------------------------
+    def table_list(self):
+        """
+        DBIdb2: See DBI.table_list()
+        """
+        try:
+            rows = self.select(table="@syscat.tables",
+                               fields=['tabname'],
+                               where="tabschema = 'HPSS' and " +
+                               "tabname like %")
+            return rows
+        except ibm_db_dbi.Error as e:
+            raise DBIerror(''.join(e.args), dbname=self.dbname)
+        except Exception as e:
+            if self.__recognized_exception__(e):
+                errmsg = str(e) + "\nSQL: '" + cmd + "'"
+                raise DBIerror(errmsg, dbname=self.dbname)
+            else:
+                raise
 
-                c.close()
-            # Translate any db specific errors to DBIerror
-            except mysql_exc.Error as e:
-                self.err_handler(e)
+    # -------------------------------------------------------------------------
+    def transaction(self, savepoint=True):
+        """
+        DBIdb2: See DBI.transaction()
+        """
+        raise DBIerror(msg.db2_unsupported_S % "TRANSACTION")
 
-        # ---------------------------------------------------------------------
-        def describe(self, table=''):
-            """
-            DBImysql: Return a table description
-            """
-            try:
-                cmd = """select column_name, ordinal_position, data_type
-                             from information_schema.columns
-                             where table_name = %s"""
-                c = self.dbh.cursor()
-                c.execute(cmd, (self.prefix(table),))
-                r = c.fetchall()
-            except mysql_exc.Error as e:
-                self.err_handler(e)
+    # -------------------------------------------------------------------------
+    def update(self, table='', where='', fields=[], data=[]):
+        """
+        DBIdb2: See DBI.update()
+        """
+        raise DBIerror(msg.db2_unsupported_S % "UPDATE")
 
-            if 0 == len(r):
-                raise DBIerror(msg.no_such_table_S % self.prefix(table))
+    # -------------------------------------------------------------------------
+    def upsert(self, table='', fields=[], keys=[], data=[]):
+        """
+        DBIdb2: See DBI.upsert(). Like insert and update, this is not
+        supported for DB2, which we only read from.
+        """
+        raise DBIerror(msg.db2_unsupported_S % "UPSERT")
 
-            return r
+    # -------------------------------------------------------------------------
+    def binary_param(self, value):
+        """
+        DBIdb2: See DBI_abstract.binary_param()
+        """
+        return ibm_db_dbi.Binary(value)
 
-        # ---------------------------------------------------------------------
-        def drop(self, table=''):
-            """
-            DBImysql: Drop a mysql table
-            """
-            # Handle bad arguments
-            if type(table) != str:
-                raise DBIerror(msg.tbl_name_str_S % U.my_name(),
-                               dbname=self.dbname)
-            elif table == '':
-                raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
-                               dbname=self.dbname)
+    # -------------------------------------------------------------------------
+    @classmethod
+    def hexstr(cls, bfid):
+        """
+        DBIdb2: Convert a raw bitfile id into a hexadecimal string as
+        presented by DB2.
+        """
+        rval = "x'" + DBIdb2.hexstr_uq(bfid) + "'"
+        return rval
 
-            # Construct and run the drop statement
-            try:
-                with warnings.catch_warnings():
-                    warnings.filterwarnings("ignore",
-                                            "Unknown table '.*'")
-                    cmd = ("drop table %s" % self.prefix(table))
-                    c = self.dbh.cursor()
-                    c.execute(cmd)
+    @classmethod
+    # -------------------------------------------------------------------------
+    def hexstr_uq(cls, bfid):
+        """
+        DBIdb2: Convert a raw bitfile id into an unquoted hexadecimal
+        string as presented by DB2.
+        """
+        return binascii.hexlify(bfid).upper()
 
-            # Convert any db specific error into a DBIerror
-            except mysql_exc.Error as e:
-                self.err_handler(e)
+    @classmethod
+    # -------------------------------------------------------------------------
+    def hexstr_list(cls, bfids):
+        """
+        DBIdb2: Convert a sequence of raw bitfile ids into a list of
+        quoted hexadecimal strings, as hexstr() would.
+        """
+        return ["x'%s'" % h for h in cls.hexstr_uq_list(bfids)]
 
-        # ---------------------------------------------------------------------
-        def insert(self, table='', ignore=False, fields=[], data=[]):
-            """
-            DBImysql: Insert into a mysql database
-            """
-            # Handle any bad arguments
-            if type(table) != str:
-                raise DBIerror(msg.tbl_name_str_S % U.my_name(),
-                               dbname=self.dbname)
-            elif table == '':
-                raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
-                               dbname=self.dbname)
-            elif type(fields) != list:
-                raise DBIerror(msg.fields_list_S % U.my_name(),
-                               dbname=self.dbname)
-            elif fields == []:
-                raise DBIerror(msg.fields_notmt, dbname=self.dbname)
-            elif type(data) != list:
-                raise DBIerror(msg.data_list_S % U.my_name(),
-                               dbname=self.dbname)
-            elif data == []:
-                raise DBIerror(msg.data_list_notmt,
-                               dbname=self.dbname)
-            elif type(ignore) != bool:
-                raise DBIerror(msg.insert_ignore_bool, dbname=self.dbname)
+    @classmethod
+    # -------------------------------------------------------------------------
+    def hexstr_uq_list(cls, bfids):
+        """
+        DBIdb2: Convert a sequence of raw bitfile ids into a list of
+        unquoted hexadecimal strings, as hexstr_uq() would
+        """
+        return [binascii.hexlify(b).upper() for b in bfids]
 
-            # Construct and run the insert statement
-            try:
-                cmd = ("insert %s" % ("ignore " if ignore else "") +
-                       "into %s(" % self.prefix(table) +
-                       ",".join(fields) +
-                       ") values (" +
-                       ",".join(["%s" for x in fields]) +
-                       ")")
-                c = self.dbh.cursor()
-                if ignore:
-                    with warnings.catch_warnings():
-                        warnings.filterwarnings("ignore",
-                                                "Duplicate entry .*")
-                        c.executemany(cmd, data)
-                else:
-                    c.executemany(cmd, data)
-                c.close()
-            # Translate sqlite specific exception into a DBIerror
-            except mysql_exc.Error as e:
-                self.err_handler(e)
-
-        # ---------------------------------------------------------------------
-        def select(self,
-                   table='',
-                   fields=[],
-                   where='',
-                   data=(),
-                   groupby='',
-                   orderby='',
-                   limit=None):
-            """
-            DBImysql: Select from a mysql database.
-            """
-            # Handle invalid arguments
-            if type(table) != str:
-                raise DBIerror(msg.tbl_name_str_S % U.my_name(),
-                               dbname=self.dbname)
-            elif table == '':
-                raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
-                               dbname=self.dbname)
-            elif type(fields) != list:
-                raise DBIerror(msg.fields_list_S % U.my_name(),
-                               dbname=self.dbname)
-            elif fields == []:
-                raise DBIerror("Wildcard selects are not supported." +
-                               " Please supply a list of fields.",
-                               dbname=self.dbname)
-            elif type(where) != str:
-                raise DBIerror(msg.where_str_S % U.my_name(),
-                               dbname=self.dbname)
-            elif type(data) != tuple:
-                raise DBIerror(msg.data_tuple_S % U.my_name(),
-                               dbname=self.dbname)
-            elif type(groupby) != str:
-                raise DBIerror(msg.select_gb_str, dbname=self.dbname)
-            elif type(orderby) != str:
-                raise DBIerror(msg.select_nso,
-                               dbname=self.dbname)
-            elif '?' not in where and data != ():
-                raise DBIerror(msg.data_ignored,
-                               dbname=self.dbname)
-            elif limit is not None and type(limit) not in [int, float]:
-                raise DBIerror(msg.select_l_nint)
+    @classmethod
+    # -------------------------------------------------------------------------
+    def hexval(cls, bfid_str):
+        """
+        DBIdb2: Convert a quoted or unquoted hexadecimal string as
+        presented by DB2 into a hex value.
+        """
+        bfid_low = bfid_str.lower()
+        if bfid_low.startswith("x'"):
+            rval = binascii.unhexlify(bfid_low.strip("x'"))
+        elif not bfid_str.strip(string.hexdigits):
+            rval = binascii.unhexlify(bfid_str)
+        elif (bfid_low.startswith("x") and
+              not bfid_low[1:].strip(string.hexdigits)):
+            rval = binascii.unhexlify(bfid_low[1:])
+        else:
+            rval = bfid_str
 
-            # Build and run the select statement
-            cmd = "select "
-            cmd += ",".join(fields)
-            cmd += " from %s" % self.prefix(table)
-            if where != '':
-                cmd += " where %s" % where.replace('?', '%s')
-            if groupby != '':
-                cmd += " group by %s" % groupby
-            if orderby != '':
-                cmd += " order by %s" % orderby
-            if limit is not None:
-                cmd += " limit 0, %d" % int(limit)
-
-            rv = self.retry(mysql_exc.Error,
-                            self.do_select,
-                            cmd,
-                            data)
-            return rv
+        return rval
 
-        # ---------------------------------------------------------------------
-        def do_select(self, cmd, data=None):
-            """
-            Routine select has set everything up. These are the calls that
-            might throw an exception that we want to run under retry(), so they
-            need to be isolated in this routine.
-            """
-            c = self.dbh.cursor()
-            # if data:
-            if '%s' in cmd:
-                c.execute(cmd, data)
-            else:
-                c.execute(cmd)
-            rval = c.fetchall()
-            c.close()
-            return rval
+    @classmethod
+    # -------------------------------------------------------------------------
+    def hexval_list(cls, bfid_strs):
+        """
+        DBIdb2: Convert a sequence of hexadecimal strings, in any of the
+        forms hexval() takes, into a list of raw values. The quotes come
+        off, the digits are run through unhexlify together, and the result
+        is cut back apart. If some string isn't one hexval() would convert,
+        we fall back to converting them one at a time.
+        """
+        digits = [x[2:-1] if x[:2] in ("x'", "X'") else
+                  x[1:] if x[:1] in ('x', 'X') else x
+                  for x in bfid_strs]
+        try:
+            if any([len(x) % 2 for x in digits]):
+                raise TypeError("odd-length string")
+            raw = binascii.unhexlify("".join(digits))
+        except TypeError:
+            return [cls.hexval(x) for x in bfid_strs]
+        rval = []
+        pos = 0
+        for x in digits:
+            end = pos + len(x) // 2
+            rval.append(raw[pos:end])
+            pos = end
+        return rval
 
-        # ---------------------------------------------------------------------
-        def table_exists(self, table=''):
-            """
-            DBImysql: Check whether a table exists in a mysql database
-            """
-            try:
-                dbc = self.dbh.cursor()
-                with warnings.catch_warnings():
-                    warnings.filterwarnings("ignore",
-                                            "Can't read dir of .*")
-                    dbc.execute("""
-                                select table_name
-                                from information_schema.tables
-                                where table_name=%s
-                                """, (self.prefix(table),))
-                rows = dbc.fetchall()
-                dbc.close()
-                if 0 == len(rows):
-                    return False
-                elif 1 == len(rows):
-                    return True
-                else:
-                    raise DBIerror(msg.more_than_one_ss %
-                                   ('information_schema.tables', table))
-            except mysql_exc.Error as e:
-                self.err_handler(e)
 
-        # ---------------------------------------------------------------------
-        def table_list(self):
-            """
-            DBImysql: See DBI.table_list()
-            """
-            try:
-                dbc = self.dbh.cursor()
-                with warnings.catch_warnings():
-                    warnings.filterwarnings("ignore",
-                                            "Can't read dir of .*")
-                    dbc.execute("""
-                                select table_name
-                                from information_schema.tables
-                                where table_name like %s
-                                """, (self.prefix('%'),))
-                rows = dbc.fetchall()
-                dbc.close()
-                return [x[0] for x in rows]
-            except mysql_exc.Error as e:
-                raise DBIerror(''.join(e.args), dbname=self.dbname)
+# -----------------------------------------------------------------------------
+def load_driver(dbtype):
+    """
+    Import the driver modules for *dbtype* ('mysql' or 'db2') if that hasn't
+    been done yet. If the driver isn't installed, raise a DBIerror.
+    """
+    global db2, ibm_db_dbi, mysql, mysql_exc
+    try:
+        if dbtype == 'mysql' and mysql is None:
+            import _mysql_exceptions as mysql_exc
+            import MySQLdb as mysql
+        elif dbtype == 'db2' and db2 is None:
+            import ibm_db_dbi
+            import ibm_db as db2
+    except ImportError as e:
+        raise DBIerror(msg.driver_missing_SS % (dbtype, e))
 
-        # ---------------------------------------------------------------------
-        def update(self, table='', where='', fields=[], data=[]):
-            """
-            DBImysql: See DBI.update()
-            """
-            # Handle invalid arguments
-            if type(table) != str:
-                raise DBIerror(msg.tbl_name_str_S % U.my_name(),
-                               dbname=self.dbname)
-            elif table == '':
-                raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
-                               dbname=self.dbname)
-            elif type(where) != str:
-                raise DBIerror(msg.where_str_S % U.my_name(),
-                               dbname=self.dbname)
-            elif type(fields) != list:
-                raise DBIerror(msg.fields_list_S % U.my_name(),
-                               dbname=self.dbname)
-            elif fields == []:
-                raise DBIerror(msg.fields_notmt_S % U.my_name(),
-                               dbname=self.dbname)
-            elif type(data) != list:
-                raise DBIerror(msg.data_list_S % U.my_name(),
-                               dbname=self.dbname)
-            elif data == []:
-                raise DBIerror(msg.data_notmt,
-                               dbname=self.dbname)
-            elif '"?"' in where or "'?'" in where:
-                raise DBIerror(msg.param_noquote)
 
-            # Build and run the update statement
-            try:
-                cmd = "update %s" % self.prefix(table)
-                cmd += " set %s" % ",".join(["%s=" % x + "%s" for x in fields])
-                if where != '':
-                    cmd += " where %s" % where.replace('?', '%s')
-
-                c = self.dbh.cursor()
-                c.executemany(cmd, data)
-                c.close()
-            # Translate database-specific exceptions into DBIerrors
-            except mysql_exc.Error as e:
-                self.err_handler(e)
-
-
-if db2_available:
-    # -----------------------------------------------------------------------------
-    class DBIdb2(DBI_abstract):
-        # -------------------------------------------------------------------------
-        @classmethod
-        def arginfo(self):
-            """
-            Set required and optional arguments for db2 connections
-            """
-            return {'req': ['dbname', 'tbl_prefix', 'hostname', 'port',
-                            'username', 'password'],
-                    'opt': [('timeout', 3600)]}
+# -----------------------------------------------------------------------------
+def partition_results(dbargs, scanargs, ranges, reducer, processes):
+    """
+    Run partition_worker() on each of *ranges* in a pool of *processes*
+    processes and generate what the workers send back: rows if there is no
+    *reducer*, otherwise (partition index, result) pairs. If a worker fails,
+    raise a DBIerror. If the consumer stops early, the pool is shut down.
+    """
+    manager = multiprocessing.Manager()
+    pool = multiprocessing.Pool(processes)
+    try:
+        queue = manager.Queue(4 * processes)
+        for idx, rng in enumerate(ranges):
+            pool.apply_async(partition_worker,
+                             (dbargs, scanargs, idx, rng, reducer, queue))
+        pool.close()
+
+        running = len(ranges)
+        while running:
+            what, idx, payload = queue.get()
+            if what == 'rows':
+                for row in payload:
+                    yield row
+            elif what == 'result':
+                yield (idx, payload)
+            elif what == 'error':
+                raise DBIerror(msg.partition_failed_SS % (idx, payload),
+                               dbname=dbargs['dbname'])
+            else:
+                running -= 1
+        pool.join()
+    finally:
+        pool.terminate()
+        manager.shutdown()
 
-        # -------------------------------------------------------------------------
-        def __init__(self, *args, **kwargs):
-            """
-            DBIdb2: See DBI.__init__()
-            """
-            self.validate_args(self.arginfo(), kwargs, self.__class__)
-
-            if self.tbl_prefix != '':
-                self.tbl_prefix = self.tbl_prefix.rstrip('.') + '.'
-
-            cfobj = cfg.add_config()
-            U.env_update(cfobj)
-            dbn = cfobj.get(cfobj.db_section(), self.dbname)
-            cxnstr = ("database=%s;" % dbn +
-                      "hostname=%s;" % self.hostname +
-                      "port=%s;" % self.port +
-                      "uid=%s;" % self.username +
-                      "pwd=%s;" % base64.b64decode(self.password))
-            self.dbh = self.retry(Exception,
-                                  db2.connect,
-                                  cxnstr,
-                                  "",
-                                  "")
-
-        # ---------------------------------------------------------------------
-        def __repr__(self):
-            """
-            DBIdb2: See DBI.__repr__()
-            """
-            rv = "DBIdb2(dbname='%s')" % self.dbname
-            return rv
 
-        # ---------------------------------------------------------------------
-        def err_handler(self, err=None, message=''):
-            """
-            DBIdb2: error handler can accept a string or an exception object
-            """
-            if err is None:
-                raise DBIerror(message, dbname=self.dbname)
-            elif isinstance(err, ibm_db_dbi.Error):
-                raise DBIerror("%d: %s" % err.args, dbname=self.dbname)
-            elif 'A communication error has been detected' in str(err):
-                if not hasattr(self, 'sleeptime'):
-                    self.sleeptime = 0.1
-                cfg.log('Riding out DB2 outage -- sleeping %f seconds'
-                        % self.sleeptime)
-                time.sleep(self.sleeptime)
-                self.sleeptime = min(2*self.sleeptime, 60.0)
+# -----------------------------------------------------------------------------
+def partition_worker(dbargs, scanargs, idx, rng, reducer, queue):
+    """
+    Scan the partition of the table between the keys in *rng* on a new
+    connection built from *dbargs*. Put the rows on *queue* a batch at a time,
+    or if there's a *reducer*, put what it makes of them. Then say we're done.
+    Errors are sent back as strings, since the parent can't count on being
+    able to unpickle an exception.
+    """
+    try:
+        db = DBI(**dbargs)
+        low, high = rng
+        where = scanargs['where']
+        data = scanargs['data']
+        if high is not None:
+            upto = "%s <= ?" % scanargs['key']
+            if scanargs['binary']:
+                data = tuple(data) + (db._dbobj.binary_param(
+                    binascii.unhexlify(high)),)
             else:
-                raise DBIerror(str(err), dbname=self.dbname)
-
-        # ---------------------------------------------------------------------
-        def __recognized_exception__(self, exc):
-            """
-            DBIdb2: Return True if exc is recognized as a DB2 error. Otherwise
-            False.
-            """
-            try:
-                q = self.db2_exc_list
-            except AttributeError:
-                self.db2_exc_list = [msg.param_bound,
-                                     "SQLSTATE=",
-                                     "[IBM][CLI Driver][DB2"]
-            rval = False
-            for x in self.db2_exc_list:
-                if x in str(exc):
-                    rval = True
-                    break
-            return rval
+                data = tuple(data) + (high,)
+            where = "(%s) and %s" % (where, upto) if where else upto
+        rows = db.scan(**dict(scanargs, where=where, data=data, start=low))
 
-        # ---------------------------------------------------------------------
-        def alter(self, table='', addcol=None, dropcol=None, pos=None):
-            """
-            DBIdb2: See DBI.alter()
-            """
-            raise DBIerror(msg.db2_unsupported_S % "ALTER")
+        if reducer is not None:
+            queue.put(('result', idx, reducer(iter(rows))))
+        else:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if scanargs['batch'] <= len(batch):
+                    queue.put(('rows', idx, batch))
+                    batch = []
+            if batch:
+                queue.put(('rows', idx, batch))
+        db.close()
+    except Exception as e:
+        queue.put(('error', idx, str(e)))
+    queue.put(('done', idx, None))
 
-        # ---------------------------------------------------------------------
-        def close(self):
-            """
-            DBIdb2: See DBI.close()
-            """
-            # Close the database connection
-            try:
-                db2.close(self.dbh)
-            # Convert any db2 error into a DBIerror
-            except Exception as e:
-                self.err_handler(err=e)
 
-        # ---------------------------------------------------------------------
-        def create(self, table='', fields=[]):
-            """
-            DBIdb2: See DBI.create()
-            """
-            raise DBIerror(msg.db2_unsupported_S % "CREATE")
+# -----------------------------------------------------------------------------
+def pooled_results(pool, query, chunks, threads):
+    """
+    Run query(db, chunk) for each of *chunks* in *threads* threads, each with
+    a connection from *pool*, and generate the rows that come back. An
+    exception in a worker is raised here. If the consumer stops early, the
+    workers stop after the chunk they're on.
+    """
+    lock = threading.Lock()
+    stop = threading.Event()
+    results = Queue.Queue(2 * threads)
 
-        # ---------------------------------------------------------------------
-        def cursor(self):
-            """
-            DBIdb2: See DBI.cursor()
-            """
-            try:
-                rval = self.dbh.cursor()
-                return rval
-            except ibm_db_dbi.Error as e:
-                raise DBIerror(''.join(e.args), dbname=self.dbname)
-            except Exception as e:
-                if self.__recognized_exception__(e):
-                    errmsg = str(e) + "\nSQL: '" + cmd + "'"
-                    raise DBIerror(errmsg, dbname=self.dbname)
-                else:
-                    raise
+    def worker():
+        """
+        Take chunks until they run out (or we're told to stop) and queue up
+        the rows for each one
+        """
+        try:
+            with pool.connection() as db:
+                while not stop.is_set():
+                    with lock:
+                        keys = next(chunks, None)
+                    if keys is None:
+                        break
+                    results.put(('rows', query(db, keys)))
+        except Exception:
+            results.put(('error', sys.exc_info()))
+        results.put(('done', None))
+
+    for idx in range(threads):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+
+    running = threads
+    try:
+        while running:
+            what, payload = results.get()
+            if what == 'rows':
+                for row in payload:
+                    yield row
+            elif what == 'error':
+                raise payload[0], payload[1], payload[2]
+            else:
+                running -= 1
+    finally:
+        stop.set()
+        while running:
+            if results.get()[0] == 'done':
+                running -= 1
 
-        # ---------------------------------------------------------------------
-        def delete(self, **kwargs):
-            """
-            DBIdb2: See DBI.delete()
-            """
-            raise DBIerror(msg.db2_unsupported_S % "DELETE")
 
-        # ---------------------------------------------------------------------
-        def describe(self, **kwargs):
-            """
-            DBIdb2: Return a table description
-            """
-            raise DBIerror(msg.db2_unsupported_S % "DESCRIBE")
+# -----------------------------------------------------------------------------
+def column_array(values):
+    """
+    Pack the *values* of one column into the most compact array that holds
+    them: integers in 64 bit ints, numbers with any floats among them in
+    doubles. Those are numpy arrays if numpy is installed, otherwise
+    array.arrays. Anything else (strings, NULLs, decimals, integers too big
+    for 64 bits) goes in a numpy object array, or without numpy, a list.
+    """
+    global numpy
+    if numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+
+    types = set(map(type, values))
+    if types <= set([int, long]):
+        code = 'l'
+    elif types <= set([int, long, float]):
+        code = 'd'
+    else:
+        code = None
+
+    if numpy:
+        try:
+            return numpy.array(values, dtype={'l': numpy.int64,
+                                              'd': numpy.float64,
+                                              None: object}[code])
+        except OverflowError:
+            return numpy.array(values, dtype=object)
+    if code is not None:
+        try:
+            return array.array(code, values)
+        except OverflowError:
+            pass
+    return list(values)
 
-        # ---------------------------------------------------------------------
-        def drop(self, table=''):
-            """
-            DBIdb2:
-            """
-            raise DBIerror(msg.db2_unsupported_S % "DROP")
 
-        # ---------------------------------------------------------------------
-        def insert(self, table='', fields=[], data=[]):
-            """
-            DBIdb2: Insert not supported for DB2
-            """
-            raise DBIerror(msg.db2_unsupported_S % "INSERT")
-
-        # ---------------------------------------------------------------------
-        def select(self,
-                   table='',
-                   fields=[],
-                   where='',
-                   data=(),
-                   groupby='',
-                   orderby='',
-                   limit=None):
-            """
-            DBIdb2: Select from a DB2 database.
-            """
-            # Handle invalid arguments
-            if type(table) != str and type(table) != list:
-                raise DBIerror("On select(), table name must be " +
-                               "a string or a list",
-                               dbname=self.dbname)
-            elif table == '' or table == []:
-                raise DBIerror(msg.tbl_name_notmt_S % U.my_name(),
-                               dbname=self.dbname)
-            elif type(fields) != list:
-                raise DBIerror(msg.fields_list_S % U.my_name(),
-                               dbname=self.dbname)
-            elif fields == []:
-                raise DBIerror("Wildcard selects are not supported." +
-                               " Please supply a list of fields.",
-                               dbname=self.dbname)
-            elif type(where) != str:
-                raise DBIerror(msg.where_str_S % U.my_name(),
-                               dbname=self.dbname)
-            elif type(data) != tuple:
-                raise DBIerror(msg.data_tuple_S % U.my_name(),
-                               dbname=self.dbname)
-            elif type(groupby) != str:
-                raise DBIerror(msg.select_gb_str, dbname=self.dbname)
-            elif type(orderby) != str:
-                raise DBIerror(msg.select_nso,
-                               dbname=self.dbname)
-            elif '?' not in where and data != ():
-                raise DBIerror(msg.data_ignored,
-                               dbname=self.dbname)
-            elif limit is not None and type(limit) not in [int, float]:
-                raise DBIerror(msg.select_l_nint)
+# -----------------------------------------------------------------------------
+def columnar(rows, names):
+    """
+    Turn *rows* into columns: return a named row (see row_class()) for the
+    column *names* holding one array per column (see column_array())
+    """
+    columns = zip(*rows) if rows else [()] * len(names)
+    return row_class(names)._make(map(column_array, columns))
 
-            # Build and run the select statement
-            try:
-                cmd = "select "
-                cmd += ",".join(fields)
-
-                if type(table) == str:
-                    cmd += " from %s" % self.prefix(table)
-                elif type(table) == list:
-                    cmd += " from %s" % ",".join([self.prefix(x)
-                                                  for x in table])
-
-                if where != '':
-                    cmd += " where %s" % where
-                if groupby != '':
-                    cmd += " group by %s" % groupby
-                if orderby != '':
-                    cmd += " order by %s" % orderby
-                if limit is not None:
-                    cmd += " fetch first %d rows only" % int(limit)
-
-                rval = []
-                stmt = db2.prepare(self.dbh, cmd)
-                args = [stmt]
-                if '?' in cmd:
-                    args.append(data)
-                r = db2.execute(*args)
-                x = db2.fetch_assoc(stmt)
-                while (x):
-                    rval.append(x)
-                    x = db2.fetch_assoc(stmt)
 
-                return rval
+# -----------------------------------------------------------------------------
+def make_row(columns, values):
+    """
+    Make a named row for *columns* holding *values*. This is how named rows
+    are unpickled (see row_class()).
+    """
+    return row_class(columns)._make(values)
 
-            # Translate any db2 errors to DBIerror
-            except ibm_db_dbi.Error as e:
-                errmsg = str(e) + "\nSQL: '" + cmd + "'"
-                raise DBIerror(errmsg, dbname=self.dbname)
-            except Exception as e:
-                if self.__recognized_exception__(e):
-                    errmsg = str(e) + "\nSQL: '" + cmd + "'"
-                    raise DBIerror(errmsg, dbname=self.dbname)
-                else:
-                    raise
 
-        # ---------------------------------------------------------------------
-        def table_exists(self, table=''):
-            """
-            DBIdb2: Check whether a table exists in a db2 database
-            """
-            try:
-                pfx = self.tbl_prefix.upper().strip('.')
-                rows = self.select(table="@syscat.tables",
-                                   fields=['tabname'],
-                                   where=("tabschema = '%s'" % pfx +
-                                          " and tabname = '%s'" %
-                                          table.upper()))
-                if 0 == len(rows):
-                    return False
-                elif 1 == len(rows):
-                    return True
-                else:
-                    raise DBIerror(msg.more_than_one_ss %
-                                   ('@syscat.tables', table))
-            except ibm_db_dbi.Error as e:
-                raise DBIerror(''.join(e.args), dbname=self.dbname)
-            except Exception as e:
-                if self.__recognized_exception__(e):
-                    errmsg = str(e) + "\nSQL: '" + cmd + "'"
-                    raise DBIerror(errmsg, dbname=self.dbname)
-                else:
-                    raise
+# -----------------------------------------------------------------------------
+def reduce_row(row):
+    """
+    Pickle a named row as a call to make_row(). The row classes are made on
+    the fly, so pickle can't find them by name.
+    """
+    return (make_row, (row._columns, tuple(row)))
 
-        # -------------------------------------------------------------------------
-        def table_list(self):
-            """
-            DBIdb2: See DBI.table_list()
-            """
-            try:
-                rows = self.select(table="@syscat.tables",
-                                   fields=['tabname'],
-                                   where="tabschema = 'HPSS' and " +
-                                   "tabname like %")
-                return rows
-            except ibm_db_dbi.Error as e:
-                raise DBIerror(''.join(e.args), dbname=self.dbname)
-            except Exception as e:
-                if self.__recognized_exception__(e):
-                    errmsg = str(e) + "\nSQL: '" + cmd + "'"
-                    raise DBIerror(errmsg, dbname=self.dbname)
-                else:
-                    raise
 
-        # ---------------------------------------------------------------------
-        def update(self, table='', where='', fields=[], data=[]):
-            """
-            DBIdb2: See DBI.update()
-            """
-            raise DBIerror(msg.db2_unsupported_S % "UPDATE")
+# -----------------------------------------------------------------------------
+def row_class(columns):
+    """
+    Return the named row class for *columns*, making it the first time. A
+    named row is a namedtuple: as small as a tuple, with the values also
+    reachable as attributes. Names that can't be attributes (like
+    'count(*)') or repeat an earlier one are replaced by positional names
+    (_0, _1, ...).
+    """
+    columns = tuple(columns)
+    rval = row_classes.get(columns)
+    if rval is None:
+        base = collections.namedtuple('Row', columns, rename=True)
+        rval = type('Row', (base,), {'__slots__': (),
+                                     '_columns': columns,
+                                     '__reduce__': reduce_row})
+        row_classes[columns] = rval
+    return rval
 
-        # ---------------------------------------------------------------------
-        @classmethod
-        def hexstr(cls, bfid):
-            """
-            DBIdb2: Convert a raw bitfile id into a hexadecimal string as
-            presented by DB2.
-            """
-            rval = "x'" + DBIdb2.hexstr_uq(bfid) + "'"
-            return rval
 
-        @classmethod
-        # ---------------------------------------------------------------------
-        def hexstr_uq(cls, bfid):
-            """
-            DBIdb2: Convert a raw bitfile id into an unquoted hexadecimal
-            string as presented by DB2.
-            """
-            rval = "".join(["%02x" % ord(c) for c in list(bfid)])
-            return rval.upper()
+# -----------------------------------------------------------------------------
+def value_chunks(values, size):
+    """
+    Generate lists of up to *size* items from the iterable *values*
+    """
+    values = iter(values)
+    while True:
+        chunk = list(itertools.islice(values, size))
+        if not chunk:
+            return
+        yield chunk
 
-        @classmethod
-        # ---------------------------------------------------------------------
-        def hexval(cls, bfid_str):
-            """
-            DBIdb2: Convert a quoted or unquoted hexadecimal string as
-            presented by DB2 into a hex value.
-            """
-            bfid_low = bfid_str.lower()
-            if bfid_low.startswith("x'"):
-                rval = bfid_low.strip("x'").decode("hex")
-            elif all(c in string.hexdigits for c in bfid_str):
-                rval = bfid_str.decode("hex")
-            elif (bfid_low.startswith("x") and
-                  all(c in string.hexdigits for c in bfid_low[1:])):
-                rval = bfid_low[1:].decode("hex")
-            else:
-                rval = bfid_str
 
-            return rval
+# -----------------------------------------------------------------------------
+def slow_logger(logpath, maxbytes, backups):
+    """
+    Return the logger for the slow query log at *logpath*, setting it up the
+    first time it's asked for. Like the main log, the file is rotated when it
+    reaches *maxbytes* and old files are moved to hpss_log_archive next to it,
+    *backups* at most.
+    """
+    if not hasattr(slow_logger, '_loggers'):
+        slow_logger._loggers = {}
+    if logpath not in slow_logger._loggers:
+        rval = logging.Logger('hpssic_slow_query', level=logging.INFO)
+        fh = U.ArchiveLogfileHandler(logpath,
+                                     maxBytes=maxbytes,
+                                     backupCount=backups,
+                                     archdir=U.pathjoin(U.dirname(logpath),
+                                                        'hpss_log_archive'))
+        strfmt = "%" + "(asctime)s [%s] " % U.hostname() + '%' + "(message)s"
+        fh.setFormatter(logging.Formatter(strfmt,
+                                          datefmt="%Y.%m%d %H:%M:%S"))
+        rval.addHandler(fh)
+        slow_logger._loggers[logpath] = rval
+    return slow_logger._loggers[logpath]
 
 
 # -----------------------------------------------------------------------------
@@ -10,8 +10,18 @@ bad_bindings_mysql = ("not enough arguments for format string")
 
 bad_bindings_sqlite = ("Incorrect number of bindings supplied")
 
+batch_int = ("batch must be a positive int")
+
+breaker_open_S = ("Database unavailable, not retrying for now: %s")
+
 cfg_missing_parm_S = ("%s required on call to DBI()")
 
+chunk_int = ("chunk must be a positive int")
+
+chunk_int_S = ("On insert(), %s must be a positive int")
+
+column_notmt_S = ("On %s(), column must not be empty")
+
 compkey_dup_mysql_msg = ("1062: Duplicate entry")
 
 compkey_dup_sqlite_msg = ("columns prefix, suffix are not unique")
@@ -51,6 +61,8 @@ data_tuple_S = ("On %s(), data must be a tuple")
 
 disk_io_err = ("disk I/O error")
 
+driver_missing_SS = ("The %s database driver could not be loaded: %s")
+
 duplcol_mysql = ("Duplicate column name 'size'")
 
 duplcol_sqlite = ("duplicate column name: size")
@@ -69,10 +81,18 @@ invalid_attr_rgx = ("Attribute '.*' is not valid for .*")
 
 invalid_attr_SS = ("Attribute '%s' is not valid for %s")
 
+invalid_opt_SS = ("Invalid value for option '%s': '%s'")
+
 invalid_time_unit_S = ("invalid time unit '%s'")
 
 invalid_time_mag_S = ("invalid time magnitude '%s'")
 
+keys_fields_S = ("On %s(), every key must be one of the fields")
+
+keys_list_S = ("On %s(), keys must be a list")
+
+keys_notmt_S = ("On %s(), keys must not be empty")
+
 missing_arg_S = ("A %s or cfg object and section name is required")
 
 missing_db_section = ("No database section present")
@@ -102,16 +122,41 @@ param_bound_rgx = ("\d+ %s \d+ required" % param_bound)
 
 param_noquote = ("Parameter placeholders should not be quoted")
 
+partition_failed_SS = ("Partition %d of the scan failed: %s")
+
+partitions_int = ("partitions must be a positive int")
+
+pool_checkin = ("Cannot check in a connection that is not checked out " +
+                "of this pool")
+
+pool_closed = ("Cannot check out a connection from a closed pool")
+
+pool_size_SS = ("Pool sizes must satisfy 0 <= pool_min <= pool_max and " +
+                "1 <= pool_max (pool_min=%s, pool_max=%s)")
+
+pool_timeout_S = ("No pooled connection came free within %s seconds")
+
+retry_deadline_SS = ("Gave up retrying after %s seconds: %s")
+
+row_len_SS = ("Expected %d values per row, got %s")
+
+scan_key_S = ("On scan(), key must be a field name and one of fields: %s")
+
 section_required = ("A section name is required")
 
 select_gb_str = ("On select(), groupby clause must be a string")
 
+select_in_data_SS = ("On select_in(), data holds %d parameters, leaving no " +
+                     "room for values under the limit of %d per statement")
+
 select_l_nint = ("On select(), limit must be an int")
 
 select_nld = ("On select(), data must be a tuple")
 
 select_nso = ("On select(), orderby clause must be a string")
 
+select_o_nint = ("On select(), offset must be an int")
+
 where_str_S = ("On %s(), where clause must be a string")
 
 table_already_mysql = ("1050: Table 'test_create_already' already exists")
@@ -139,7 +184,11 @@ unrecognized_arg_S = ("Unrecognized argument to %s. " +
 
 unsupp_dropcol_sqlite = ("SQLite does not support dropping columns")
 
+update_keys_only_S = ("On %s(), there must be fields that are not keys")
+
 valid_dbtype = ("dbtype must be 'sqlite', 'mysql', or 'db2'")
 
+values_list_S = ("On %s(), values must be a list or other iterable")
+
 wildcard_selects = ("Wildcard selects are not supported. " +
                     "Please supply a list of fields.")
@@ -0,0 +1,234 @@
+"""
+Timing benchmarks for hx.dbi. These are not tests -- run them by hand:
+
+    python tests/bench_dbi.py [columns] [commands] [cursors] [rows] [startup]
+"""
+import hx.dbi
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# -----------------------------------------------------------------------------
+def best_of(count, func, *args):
+    """
+    Call *func* *count* times and return the shortest time it took
+    """
+    rval = None
+    for idx in range(count):
+        start = time.time()
+        func(*args)
+        elapsed = time.time() - start
+        if rval is None or elapsed < rval:
+            rval = elapsed
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def repeat(ops, func, args, kwargs):
+    """
+    Call *func(*args, **kwargs)* *ops* times
+    """
+    for idx in range(ops):
+        func(*args, **kwargs)
+
+
+# -----------------------------------------------------------------------------
+def python_c(stmt):
+    """
+    Run *stmt* in a fresh python from the top of the tree
+    """
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.check_call([sys.executable, "-c", stmt], cwd=here)
+
+
+# -----------------------------------------------------------------------------
+def bench_commands(count=5, ops=20000):
+    """
+    Time checking the arguments and building the statement for selects,
+    inserts, updates, and deletes on sqlite with the command cache off and
+    on, then the same calls end to end
+    """
+    dbname = tempfile.mktemp(suffix=".db")
+    for size in [0, 500]:
+        db = hx.dbi.DBI(dbtype='sqlite', dbname=dbname, tbl_prefix='bench',
+                        cmd_cache_size=size)
+        if not db.table_exists(table='cmds'):
+            db.create(table='cmds', fields=['id integer primary key',
+                                            'name text', 'size int'])
+            db.insert(table='cmds', fields=['id', 'name', 'size'],
+                      data=[(0, 'zero', 0)])
+        dbo = db._dbobj
+        steps = [('select_cmd', dbo.select_cmd,
+                  ('select', 'cmds', ['name', 'size'], 'id = ?', (0,))),
+                 ('insert_cmd', dbo.insert_cmd,
+                  ('insert', 'cmds', ['name', 'size'], False)),
+                 ('update_cmd', dbo.update_cmd,
+                  ('update', 'cmds', 'id = ?', ['size'])),
+                 ('delete_cmd', dbo.delete_cmd,
+                  ('delete', 'cmds', 'id = ?', (-1,)))]
+        for name, func, args in steps:
+            elapsed = best_of(count, repeat, ops, func, args, {})
+            print("cmd_cache_size=%-3d %-10s %6.2f us" %
+                  (size, name, elapsed * 1e6 / ops))
+
+        calls = [('select', db.select,
+                  dict(table='cmds', fields=['name', 'size'],
+                       where='id = ?', data=(0,))),
+                 ('insert', db.insert,
+                  dict(table='cmds', fields=['name', 'size'],
+                       data=[('x', 1)])),
+                 ('update', db.update,
+                  dict(table='cmds', fields=['size'], where='id = ?',
+                       data=[(1, 0)])),
+                 ('delete', db.delete,
+                  dict(table='cmds', where='id = ?', data=(-1,)))]
+        with db.transaction():
+            for name, func, kwargs in calls:
+                elapsed = best_of(count, repeat, ops // 4, func, (), kwargs)
+                print("cmd_cache_size=%-3d %-10s %6.2f us" %
+                      (size, "db." + name, elapsed * 4e6 / ops))
+        db.close()
+    os.unlink(dbname)
+
+
+# -----------------------------------------------------------------------------
+def bench_columns(count=5, nrows=200000):
+    """
+    Time selecting *nrows* rows of two numeric columns from sqlite and
+    summing one of them, as rows and with columnar=True, and compare what
+    the result takes in memory
+    """
+    dbname = tempfile.mktemp(suffix=".db")
+    db = hx.dbi.DBI(dbtype='sqlite', dbname=dbname, tbl_prefix='bench')
+    db.create(table='cols', fields=['id integer primary key', 'size int'])
+    db.insert(table='cols', fields=['id', 'size'],
+              data=[(x, x * 3) for x in range(nrows)])
+    kwargs = dict(table='cols', fields=['id', 'size'])
+
+    def by_rows():
+        """
+        Select rows and sum the sizes
+        """
+        return sum(row[1] for row in db.select(**kwargs))
+
+    def by_columns():
+        """
+        Select columns and sum the sizes
+        """
+        return sum(db.select(columnar=True, **kwargs).size)
+
+    rows = db.select(**kwargs)
+    cols = db.select(columnar=True, **kwargs)
+    sizes = [sys.getsizeof(rows) +
+             sum(sys.getsizeof(x) + sys.getsizeof(x[0]) + sys.getsizeof(x[1])
+                 for x in rows),
+             sum(sys.getsizeof(x) for x in cols)]
+    for (name, func), size in zip([('rows', by_rows),
+                                   ('columnar', by_columns)], sizes):
+        elapsed = best_of(count, func)
+        print("%-8s select+sum %8.4f s  result %6.1f MB" %
+              (name, elapsed, size / 1e6))
+    db.close()
+    os.unlink(dbname)
+
+
+# -----------------------------------------------------------------------------
+def bench_cursors(count=5, ops=100000):
+    """
+    Time making and closing a sqlite cursor for each statement against
+    borrowing one from a CursorCache. sqlite's cursors are cheap C objects,
+    so this is the floor a cache has to beat; MySQLdb's cursors are built in
+    python and cost more.
+    """
+    dbh = sqlite3.connect(":memory:")
+    cache = hx.dbi.CursorCache(dbh.cursor)
+
+    def per_call():
+        """
+        Make and close a cursor *ops* times
+        """
+        for idx in range(ops):
+            c = dbh.cursor()
+            c.close()
+
+    def cached():
+        """
+        Borrow a cursor from the cache *ops* times
+        """
+        for idx in range(ops):
+            with cache.cursor('select'):
+                pass
+
+    for name, func in [('cursor per call', per_call), ('cached', cached)]:
+        elapsed = best_of(count, func)
+        print("%-16s %8.4f s (%.2f us each)" %
+              (name, elapsed, elapsed * 1e6 / ops))
+    cache.clear()
+    dbh.close()
+
+
+# -----------------------------------------------------------------------------
+def bench_rows(count=5, nrows=50000):
+    """
+    Time selecting *nrows* rows from sqlite as tuples, named rows, and dicts,
+    and show how much memory one row of each takes
+    """
+    dbname = tempfile.mktemp(suffix=".db")
+    db = hx.dbi.DBI(dbtype='sqlite', dbname=dbname, tbl_prefix='bench')
+    db.create(table='rows', fields=['id integer primary key', 'name text',
+                                    'size int', 'weight double'])
+    db.insert(table='rows', fields=['id', 'name', 'size', 'weight'],
+              data=[(x, 'name%d' % x, x * 3, x / 7.0) for x in range(nrows)])
+    kwargs = dict(table='rows', fields=['id', 'name', 'size', 'weight'])
+    for fmt in ['tuple', 'named', 'dict']:
+        kwargs['row_format'] = fmt
+        elapsed = best_of(count, repeat, 1, db.select, (), kwargs)
+        row = db.select(limit=1, **kwargs)[0]
+        print("%-6s %8.4f s (%.2f us/row) %4d bytes/row" %
+              (fmt, elapsed, elapsed * 1e6 / nrows, sys.getsizeof(row)))
+    db.close()
+    os.unlink(dbname)
+
+
+# -----------------------------------------------------------------------------
+def bench_startup(count=10):
+    """
+    Time importing hx.dbi, importing the database drivers it no longer loads
+    up front, and creating sqlite DBIs with and without lazy=True
+    """
+    print("import hx.dbi:            %8.4f s" %
+          best_of(count, python_c, "import hx.dbi"))
+    for driver in ["MySQLdb, _mysql_exceptions", "ibm_db, ibm_db_dbi"]:
+        try:
+            __import__(driver.split(",")[0])
+        except ImportError:
+            print("import %-18s (not installed)" % driver.split(",")[0])
+            continue
+        print("import %-18s %8.4f s saved when not used" %
+              (driver.split(",")[0],
+               best_of(count, python_c, "import " + driver)))
+
+    dbname = tempfile.mktemp(suffix=".db")
+    args = {'dbtype': 'sqlite', 'dbname': dbname, 'tbl_prefix': 'bench'}
+    hx.dbi.DBI(**args).close()
+    for lazy in [False, True]:
+        elapsed = best_of(count * 10,
+                          lambda: hx.dbi.DBI(lazy=lazy, **args).close())
+        print("DBI(lazy=%-5s) sqlite:   %8.6f s" % (lazy, elapsed))
+    os.unlink(dbname)
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    benchmarks = {'columns': bench_columns,
+                  'commands': bench_commands,
+                  'cursors': bench_cursors,
+                  'rows': bench_rows,
+                  'startup': bench_startup}
+    for name in sys.argv[1:] or sorted(benchmarks):
+        print("--- %s" % name)
+        benchmarks[name]()
@@ -38,15 +38,29 @@ import hx.testhelp
 import hx.util
 import os
 import pdb
+import pickle
 import pytest
 import random
+import re
 import sqlite3
 import socket
+import subprocess
 import sys
+import threading
+import time
 import traceback as tb
 import warnings
 
 
+# -----------------------------------------------------------------------------
+def count_rows(rows):
+    """
+    Reducer for scan_partitions() tests. It has to be at module level so it
+    can be pickled over to the worker processes.
+    """
+    return len(list(rows))
+
+
 # -----------------------------------------------------------------------------
 def make_db2_tcfg(**kw):
     """
@@ -301,9 +315,14 @@ class DBI_in_Base(object):
         self.dbgfunc()
         a = self.DBI()
         dirl = [q for q in dir(a) if not q.startswith('_')]
-        xattr_req = ['alter', 'close', 'create', 'dbname', 'delete',
-                     'describe', 'drop', 'closed', 'insert', 'select',
-                     'table_exists', 'table_list', 'update', 'cursor']
+        xattr_req = ['alter', 'bulk_delete', 'bulk_update', 'close',
+                     'create', 'dbname', 'delete',
+                     'describe', 'drop', 'closed', 'insert', 'partitions',
+                     'scan', 'scan_partitions', 'select', 'select_in',
+                     'select_iter',
+                     'table_exists', 'table_list',
+                     'stats', 'transaction', 'update', 'upsert',
+                     'cursor']
         xattr_allowed = ['alter']
 
         for attr in dirl:
@@ -723,6 +742,17 @@ class DBI_in_Base(object):
         self.expected(3, len(rows[0]))
         self.expected(list(exp), list(rows))
 
+    # -------------------------------------------------------------------------
+    def test_stats_off(self):
+        """
+        DBI_in_Base: Without instrument=True, stats() should return an empty
+        dict
+        """
+        self.dbgfunc()
+        db = self.DBI()
+        self.expected({}, db.stats())
+        db.close()
+
     # -------------------------------------------------------------------------
     def test_table_exists_yes(self):
         """
@@ -996,6 +1026,180 @@ class DBI_out_Base(object):
                              addcol="size")
         db.close()
 
+    # -------------------------------------------------------------------------
+    def test_bulk_delete(self):
+        """
+        DBI_out_Base: bulk_delete() should delete the rows whose keys are
+        listed, and only those, whether there is one key or several
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.setup_select(tname)
+        db.bulk_delete(table=tname, keys=['size'],
+                       data=[(17,), (92,), (1000,)])
+        rows = db.select(table=tname, fields=self.nk_fnames)
+        self.expected(sorted([x for x in self.testdata
+                              if x[1] not in [17, 92]]),
+                      sorted(rows))
+
+        db.bulk_delete(table=tname, keys=['name', 'size'],
+                       data=iter([('zumpy', 45), ('frodo', 55)]))
+        rows = db.select(table=tname, fields=self.nk_fnames)
+        self.expected(sorted([('frodo', 23, 212.5), ('zumpy', 55, 90.6758)]),
+                      sorted(rows))
+        self.assertFalse(db.table_exists(table='hx_stage'),
+                         "The staging table should be gone")
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_bulk_rollback(self):
+        """
+        DBI_out_Base: bulk_update() and bulk_delete() inside a caller's
+        transaction() should not commit it. When the transaction is rolled
+        back, the writes made before them should be undone too.
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.setup_select(tname)
+        try:
+            with db.transaction():
+                db.insert(table=tname, fields=self.nk_fnames,
+                          data=[('bilbo', 111, 37.5)])
+                db.bulk_update(table=tname, fields=['size', 'weight'],
+                               keys=['size'], data=[(17, 1.5)])
+                db.bulk_delete(table=tname, keys=['size'], data=[(92,)])
+                raise hx.util.HXerror("abandon ship")
+        except hx.util.HXerror as e:
+            self.expected("abandon ship", e.value)
+        rows = db.select(table=tname, fields=self.nk_fnames)
+        self.expected(sorted(self.testdata), sorted(rows))
+        self.assertFalse(db.table_exists(table='hx_stage'),
+                         "The staging table should be gone")
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_bulk_update(self):
+        """
+        DBI_out_Base: bulk_update() should set the fields that are not keys
+        on the rows matching the keys and leave the rest alone
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.setup_select(tname)
+        db.bulk_update(table=tname, fields=['size', 'name', 'weight'],
+                       keys=['size'],
+                       data=[(17, 'bilbo', 1.5),
+                             (45, 'sam', 2.5),
+                             (1000, 'nobody', 3.5)])
+        rows = db.select(table=tname, fields=self.nk_fnames)
+        self.expected(sorted([('bilbo', 17, 1.5),
+                              ('zippo', 92, 12341.23),
+                              ('sam', 45, 2.5),
+                              ('frodo', 23, 212.5),
+                              ('zumpy', 55, 90.6758)]),
+                      sorted(rows))
+
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.update_keys_only_S % 'bulk_update',
+                             db.bulk_update,
+                             table=tname,
+                             fields=['size'],
+                             keys=['size'],
+                             data=[(17,)])
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.keys_fields_S % 'bulk_update',
+                             db.bulk_update,
+                             table=tname,
+                             fields=['size', 'weight'],
+                             keys=['name'],
+                             data=[(17, 1.0)])
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_catalog_cache(self):
+        """
+        DBI_out_Base: Catalog answers should be cached until our own create()
+        or drop() changes the catalog or the answer expires. Tables created by
+        another connection show up once the cached answer has expired.
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        self.reset_db(tname)
+        db = self.DBI()
+        other = self.DBI()
+        self.assertFalse(db.table_exists(table=tname),
+                         "Expected %s not to exist yet" % tname)
+        db.create(table=tname, fields=self.fdef)
+        self.assertTrue(db.table_exists(table=tname),
+                        "Expected create() to empty the catalog cache")
+        hits = db._dbobj.catalog.stats()['hits']
+        self.expected(db.describe(table=tname), db.describe(table=tname))
+        self.expected(hits + 1, db._dbobj.catalog.stats()['hits'])
+
+        db._dbobj.catalog.ttl = 0.2
+        db._dbobj.catalog.clear()
+        db.table_exists(table=tname)
+        other.drop(table=tname)
+        self.assertTrue(db.table_exists(table=tname),
+                        "Expected the cached answer before it expires")
+        time.sleep(0.3)
+        self.assertFalse(db.table_exists(table=tname),
+                         "Expected a fresh answer after expiry")
+        other.close()
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_cmd_cache(self):
+        """
+        DBI_out_Base: A repeated select, insert, update, or delete should get
+        its statement from the command cache. Arguments equal to cached ones
+        but of the wrong type should still be rejected, and the data should
+        be checked on every call.
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.setup_select(tname)
+        cmds = db._dbobj.commands
+        for idx in range(3):
+            db.select(table=tname, fields=self.nk_fnames,
+                      where="name = ?", data=('frodo',))
+            db.update(table=tname, fields=['size'], where="name = ?",
+                      data=[(idx, 'frodo')])
+            db.delete(table=tname, where="name = ?", data=('zumpy',))
+        hits = cmds.stats()['hits']
+        self.assertTrue(6 <= hits, "Expected cache hits: %s" % cmds.stats())
+
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.tbl_name_str_S % 'select',
+                             db.select,
+                             table=unicode(tname),
+                             fields=self.nk_fnames,
+                             where="name = ?",
+                             data=('frodo',))
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.fields_list_S % 'select',
+                             db.select,
+                             table=tname,
+                             fields=tuple(self.nk_fnames),
+                             where="name = ?",
+                             data=('frodo',))
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.data_tuple_S % 'select',
+                             db.select,
+                             table=tname,
+                             fields=self.nk_fnames,
+                             where="name = ?",
+                             data=['frodo'])
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.crit_incomplete,
+                             db.delete,
+                             table=tname,
+                             where="name = ?")
+        self.expected([(2, ), (2, )],
+                      db.select(table=tname, fields=['size'],
+                                where="name = ?", data=('frodo',)))
+        db.close()
+
     # -------------------------------------------------------------------------
     def test_closed_create(self):
         """
@@ -1494,6 +1698,53 @@ class DBI_out_Base(object):
                                      ('aardvark', 'buffalo', 78)])
         db.close()
 
+    # -------------------------------------------------------------------------
+    def test_insert_bulk(self):
+        """
+        DBI_out_Base: A bulk insert split into several chunks should put all
+        the data in the table, and with ignore=True, duplicates should be
+        skipped without a warning
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        self.reset_db(tname)
+        fdef = ['id integer primary key', 'name text', 'size int']
+        fnames = [x.split()[0] for x in fdef]
+        testdata = [(x, hx.util.rstring(), x * 3) for x in range(1, 24)]
+
+        db = self.DBI()
+        db.create(table=tname, fields=fdef)
+        db.insert(table=tname, fields=fnames, data=testdata[:20],
+                  bulk=True, chunk_rows=7, chunk_bytes=200)
+        with warnings.catch_warnings(record=True) as wlist:
+            db.insert(table=tname, fields=fnames, data=testdata[15:],
+                      ignore=True, bulk=True, chunk_rows=3)
+            w = hx.util.pop0(wlist)
+            self.assertEqual(None, w, "Unexpected warning: %s" % w)
+        rows = db.select(table=tname, fields=fnames, orderby='id')
+        self.expected(testdata, list(rows))
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_insert_chunks(self):
+        """
+        DBI_out_Base: row_chunks() should respect both the row count and the
+        byte budget, giving an oversize row a chunk of its own
+        """
+        self.dbgfunc()
+        db = self.DBI()
+        data = [(1, 'a'), (2, 'b'), (3, 'c'), (4, 'x' * 50), (5, 'e')]
+        chunks = list(db._dbobj.row_chunks(data, 2, 1000))
+        self.expected([data[0:2], data[2:4], data[4:]], chunks)
+        chunks = list(db._dbobj.row_chunks(data, 10, 35))
+        self.expected([data[0:3], data[3:4], data[4:]], chunks)
+        udata = [(1, u'caf\xe9'), (2, u'\u2603' * 8), (3, u'na\xefve')]
+        chunks = list(db._dbobj.row_chunks(udata, 10, 30))
+        self.expected([udata[0:1], udata[1:2], udata[2:]], chunks)
+        self.expected(24, db._dbobj.value_bytes(u'\u2603' * 8))
+        self.expected(7, db._dbobj.value_bytes("it's\n"))
+        db.close()
+
     # -------------------------------------------------------------------------
     def test_insert_mtd(self):
         """
@@ -1574,6 +1825,45 @@ class DBI_out_Base(object):
                              data=[(1, 2)])
         db.close()
 
+    # -------------------------------------------------------------------------
+    def test_insert_gen(self):
+        """
+        DBI_out_Base: insert() should take its data from a generator, including
+        one returned by select_iter() on another table
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        copy = tname + '_copy'
+        self.reset_db(copy)
+        db = self.setup_select(tname)
+        db.create(table=copy, fields=self.fdef)
+        db.insert(table=copy, fields=self.nk_fnames,
+                  data=db.select_iter(table=tname, fields=self.nk_fnames,
+                                      batch=2))
+        db.insert(table=copy, fields=self.nk_fnames,
+                  data=(('gen%d' % x, x, x * 1.5) for x in range(5)))
+        exp = list(self.testdata) + [('gen%d' % x, x, x * 1.5)
+                                     for x in range(5)]
+        rows = db.select(table=copy, fields=self.nk_fnames, orderby='rowid')
+        self.expected(exp, list(rows))
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_insert_mtg(self):
+        """
+        DBI_out_Base: Calling insert with an empty generator should get the
+        same exception as an empty list
+        """
+        self.dbgfunc()
+        db = self.DBI()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.data_list_notmt,
+                             db.insert,
+                             table='mtg',
+                             fields=['froo', 'pizzazz'],
+                             data=(x for x in []))
+        db.close()
+
     # -------------------------------------------------------------------------
     def test_insert_nld(self):
         """
@@ -1700,1687 +1990,3545 @@ class DBI_out_Base(object):
         self.expected(8, len(rows))
 
     # -------------------------------------------------------------------------
-    def test_table_list(self):
+    def test_partitions(self):
         """
-        DBI_out_Base: table_list() should return the list of tables available
-        in the database
+        DBI_out_Base: partitions() should return key ranges that fit end to
+        end and split the rows evenly
         """
         self.dbgfunc()
-        cf = hx.cfg.add_config(filename="mysql.cfg", close=True)
-        sect = cf.db_section()
-        db = hx.dbi.DBI(cfg=cf, section=sect, tbl_prefix='test')
-        pre = db.table_list()
-        count = random.randint(4, 9)
-        rn = [hx.util.rstring(8, 12) for x in range(count)]
-        for rname in rn:
-            db.create(table=rname, fields=self.fdef)
-
-        post = db.table_list()
-
-        tnl = ['test_' + x for x in rn]
-        added = [x for x in post if x not in pre]
-        self.expected(sorted(tnl), sorted(added))
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.setup_select(tname)
+        keys = [x[0] for x in db.select(table=tname, fields=['rowid'],
+                                        orderby='rowid')]
+        ranges = db.partitions(table=tname, key='rowid', count=3)
+        self.expected(3, len(ranges))
+        self.expected(None, ranges[0][0])
+        self.expected(None, ranges[-1][1])
+        for (lo, hi), (nlo, nhi) in zip(ranges, ranges[1:]):
+            self.expected(hi, nlo)
+        sizes = [len([k for k in keys
+                      if (lo is None or lo < k) and (hi is None or k <= hi)])
+                 for lo, hi in ranges]
+        self.expected(len(keys), sum(sizes))
+        self.assertTrue(max(sizes) - min(sizes) <= 1,
+                        "Uneven partitions: %s" % sizes)
+
+        # One count and a probe per boundary, without reading the rows
+        idb = hx.dbi.DBI(cfg=self.cf, section=self.section,
+                         dbname=self.dbname(), instrument=True)
+        self.expected(ranges, idb.partitions(table=tname, key='rowid',
+                                             count=3))
+        stats = idb.stats()
+        self.expected(3, stats['select'][tname]['calls'])
+        self.expected(3, stats['select'][tname]['rows_out'])
+        self.assertFalse('select_iter' in stats,
+                         "Unexpected select_iter in %s" % stats.keys())
+        idb.close()
 
-        for rname in rn:
-            db.drop(table=rname)
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.partitions_int,
+                             db.partitions,
+                             table=tname,
+                             key='rowid',
+                             count=0)
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_update_f(self):
+    def test_select_offset(self):
         """
-        DBI_out_Base: Calling update() specifying fields should update the
-        fields requested
+        DBI_out_Base: select with *offset* should skip that many rows, with or
+        without a limit. An offset that is not an int should get an exception.
         """
         self.dbgfunc()
         tname = hx.util.my_name().replace('test_', '')
-        udata = [('frodo', 23, 199.7),
-                 ('zippo', 14, 201.3),
-                 ('zumpy', 47, 202.1)]
-
-        self.reset_db(tname)
-        db = self.DBI()
-        db.create(table=tname, fields=self.fdef)
-        db.insert(table=tname, fields=self.nk_fnames, data=self.testdata)
-        db.update(table=tname,
-                  fields=['size'],
-                  data=[(x[1], x[0]) for x in udata],
-                  where='name = ?')
-        r = db.select(table=tname, fields=self.nk_fnames)
-
-        for idx, tup in enumerate(udata):
-            exp = (udata[idx][0], udata[idx][1], self.testdata[idx][2])
-            self.assertTrue(exp in r,
-                            "Expected %s in %s but didn't find it" %
-                            (str(exp), hx.util.line_quote(r)))
+        db = self.setup_select(tname)
+        exp = db.select(table=tname, fields=self.nk_fnames, orderby='name')
+        rows = db.select(table=tname, fields=self.nk_fnames, orderby='name',
+                         limit=2, offset=1)
+        self.expected(list(exp[1:3]), list(rows))
+        rows = db.select(table=tname, fields=self.nk_fnames, orderby='name',
+                         offset=2)
+        self.expected(list(exp[2:]), list(rows))
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.select_o_nint,
+                             db.select,
+                             table=tname,
+                             fields=self.nk_fnames,
+                             offset=1.5)
         db.close()
 
     # -------------------------------------------------------------------------
-    def test_update_qp(self):
+    def test_scan(self):
         """
-        DBI_out_Base: Calling update() specifying fields should update the
-        fields requested. However, placeholders should not be quoted.
+        DBI_out_Base: scan() should generate every row in key order, a page at
+        a time, honoring where
         """
         self.dbgfunc()
         tname = hx.util.my_name().replace('test_', '')
-        udata = [('frodo', 23, 199.7),
-                 ('zippo', 14, 201.3),
-                 ('zumpy', 47, 202.1)]
-
-        self.reset_db(tname)
-        db = self.DBI()
-        db.create(table=tname, fields=self.fdef)
-        db.insert(table=tname, fields=self.nk_fnames, data=self.testdata)
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.param_noquote,
-                             db.update,
-                             table=tname,
-                             fields=['size'],
-                             data=[(x[1], x[0]) for x in udata],
-                             where='name = "?"')
+        db = self.setup_select(tname)
+        exp = db.select(table=tname, fields=self.fnames, orderby='rowid')
+        scan = db.scan(table=tname, key='rowid', fields=self.fnames, batch=2)
+        self.expected(list(exp), list(scan))
+        self.expected(3, scan.pages)
+        self.expected(exp[-1][0], scan.position)
+
+        rows = db.scan(table=tname, key='rowid', fields=self.fnames,
+                       batch=2, where='size < ?', data=(50,))
+        self.expected([x for x in exp if x[2] < 50], list(rows))
         db.close()
 
     # -------------------------------------------------------------------------
-    def test_update_mtd(self):
+    def test_scan_binary(self):
         """
-        DBI_out_Base: Calling update() with an empty data list should get an
-        exception
+        DBI_out_Base: scan() with binary=True should page through a binary
+        key in order, keeping its position as a hex string, with the same
+        statement for every page after the first
         """
         self.dbgfunc()
         tname = hx.util.my_name().replace('test_', '')
+        self.reset_db(tname)
         db = self.DBI()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.data_notmt,
-                             db.update,
-                             table=tname,
-                             fields=self.fnames,
-                             data=[])
+        db.create(table=tname, fields=['bfid varbinary(16)', 'size int'])
+        keys = ['\x00\x01', '\x00\xff', '\x01', '\x7f\x00', '\x80',
+                '\xfe\x10', '\xff']
+        db.insert(table=tname, fields=['bfid', 'size'],
+                  data=[(db._dbobj.binary_param(k), n)
+                        for n, k in enumerate(reversed(keys))])
+        scan = db.scan(table=tname, key='bfid', fields=['bfid', 'size'],
+                       batch=2, binary=True)
+        cached = len(db._dbobj.commands)
+        self.expected(keys, [str(x[0]) for x in scan])
+        self.expected(4, scan.pages)
+        self.expected('FF', scan.position)
+        self.expected(cached + 2, len(db._dbobj.commands))
+
+        rest = db.scan(table=tname, key='bfid', fields=['bfid', 'size'],
+                       batch=2, binary=True, start='7F00')
+        self.expected(keys[4:], [str(x[0]) for x in rest])
         db.close()
 
     # -------------------------------------------------------------------------
-    def test_update_mtf(self):
+    def test_scan_key(self):
         """
-        DBI_out_Base: Calling update() with an empty field list should get an
-        exception
+        DBI_out_Base: scan() with a key that is not one of the fields should
+        get an exception
         """
         self.dbgfunc()
-        tname = hx.util.my_name().replace('test_', '')
         db = self.DBI()
         self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.fields_notmt_S % "update",
-                             db.update,
-                             table=tname,
-                             fields=[],
-                             data=self.testdata)
+                             hx.msg.scan_key_S % 'rowid',
+                             db.scan,
+                             table='scan_key',
+                             key='rowid',
+                             fields=self.nk_fnames)
         db.close()
 
     # -------------------------------------------------------------------------
-    def test_update_mtt(self):
+    def test_scan_partitions(self):
         """
-        DBI_out_Base: Calling update() with an empty table name should get an
-        exception
+        DBI_out_Base: scan_partitions() should bring back every row once,
+        whether the rows are streamed back or reduced in the workers
         """
         self.dbgfunc()
         tname = hx.util.my_name().replace('test_', '')
-        db = self.DBI()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.tbl_name_notmt_S % "update",
-                             db.update,
-                             table='',
-                             fields=self.fnames,
-                             data=self.testdata)
+        db = self.setup_select(tname)
+        exp = db.select(table=tname, fields=self.fnames, orderby='rowid')
+        rows = db.scan_partitions(table=tname, key='rowid',
+                                  fields=self.fnames, partitions=3, batch=2)
+        self.expected(sorted(exp), sorted(rows))
+
+        counts = db.scan_partitions(table=tname, key='rowid',
+                                    fields=self.fnames,
+                                    partitions=[(None, exp[1][0]),
+                                                (exp[1][0], None)],
+                                    reducer=count_rows)
+        self.expected([2, len(exp) - 2], counts)
+
+        rows = db.scan_partitions(table=tname, key='rowid',
+                                  fields=self.fnames, partitions=2,
+                                  where='size < ?', data=(50,))
+        self.expected(sorted([x for x in exp if x[2] < 50]), sorted(rows))
         db.close()
 
     # -------------------------------------------------------------------------
-    def test_update_mtw(self):
+    def test_scan_resume(self):
         """
-        DBI_out_Base: Calling update() with an empty where arg should update
-        all the rows
+        DBI_out_Base: A scan started from a saved position should pick up
+        with the row after it
         """
         self.dbgfunc()
         tname = hx.util.my_name().replace('test_', '')
-        udata = [('frodo', 23, 199.7),
-                 ('zippo', 14, 201.3),
-                 ('zumpy', 47, 202.1)]
-
-        self.reset_db(tname)
-        db = self.DBI()
-        db.create(table=tname, fields=self.fdef)
-        db.insert(table=tname, fields=self.nk_fnames, data=self.testdata)
-        db.update(table=tname,
-                  fields=['size'],
-                  data=[(43,)],
-                  where='')
-        r = db.select(table=tname, fields=self.nk_fnames)
-
-        for idx, tup in enumerate(udata):
-            exp = (udata[idx][0], 43, self.testdata[idx][2])
-            self.assertTrue(exp in r,
-                            "Expected %s in %s but didn't find it" %
-                            (str(exp), hx.util.line_quote(r)))
+        db = self.setup_select(tname)
+        exp = db.select(table=tname, fields=self.fnames, orderby='rowid')
+        scan = db.scan(table=tname, key='rowid', fields=self.fnames,
+                       batch=2)
+        rows = []
+        for row in scan:
+            rows.append(row)
+            if len(rows) == 3:
+                break
+        saved = scan.position
+
+        rest = db.scan(table=tname, key='rowid', fields=self.fnames,
+                       batch=2, start=saved)
+        self.expected(list(exp), rows + list(rest))
         db.close()
 
     # -------------------------------------------------------------------------
-    def test_update_nlf(self):
+    def test_select_columnar_stats(self):
         """
-        DBI_out_Base: Calling update() with a non-list as the fields argument
-        should get an exception
+        DBI_out_Base: An instrumented DBI should count the rows of a columnar
+        select, not its columns or batches
         """
         self.dbgfunc()
         tname = hx.util.my_name().replace('test_', '')
-        db = self.DBI()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.fields_list_S % "update",
-                             db.update,
-                             table=tname,
-                             fields=17,
-                             data=self.testdata)
+        self.setup_select(tname).close()
+        db = hx.dbi.DBI(cfg=self.cf, section=self.section,
+                        dbname=self.dbname(), instrument=True)
+        kw = dict(table=tname, fields=self.nk_fnames, columnar=True)
+        db.select(**kw)
+        db.select(where="size < 0", **kw)
+        blocks = list(db.select_iter(batch=2, **kw))
+        stats = db.stats()
+        self.expected(len(self.testdata), stats['select'][tname]['rows_out'])
+        self.expected(3, len(blocks))
+        self.expected(len(self.testdata),
+                      stats['select_iter'][tname]['rows_out'])
         db.close()
 
     # -------------------------------------------------------------------------
-    def test_update_nld(self):
+    def test_select_columnar(self):
         """
-        DBI_out_Base: Calling update() with a non-list data argument should get
-        an exception
+        DBI_out_Base: With columnar=True, select() should return one array
+        per field, numbers packed in 8 byte items, and select_iter() the
+        columns of each batch. Values that can't be packed should still
+        come back.
         """
         self.dbgfunc()
         tname = hx.util.my_name().replace('test_', '')
-        db = self.DBI()
+        db = self.setup_select(tname)
+        kw = dict(table=tname, fields=self.nk_fnames, orderby='rowid')
+        rows = db.select(**kw)
+        cols = db.select(columnar=True, **kw)
+        self.expected(zip(*rows), [tuple(x) for x in cols])
+        self.expected([x[1] for x in rows], list(cols.size))
+        self.expected(8, cols.size.itemsize)
+        self.expected(8, cols.weight.itemsize)
+
+        blocks = list(db.select_iter(columnar=True, batch=2, **kw))
+        self.expected(3, len(blocks))
+        self.expected(list(cols.name), sum([list(x.name) for x in blocks],
+                                           []))
+        self.expected([x[2] for x in rows],
+                      sum([list(x.weight) for x in blocks], []))
+
+        none = db.select(columnar=True, where="size < 0", **kw)
+        self.expected([0, 0, 0], map(len, none))
         self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.data_list_S % "update",
-                             db.update,
-                             table=tname,
-                             fields=self.fnames,
-                             data='notalist')
+                             hx.msg.invalid_opt_SS % ('columnar', 'yes'),
+                             db.select,
+                             columnar='yes',
+                             **kw)
         db.close()
 
+        for values in [(1, None), (2 ** 70, 1), ('a', 'b')]:
+            self.expected(list(values), list(hx.dbi.column_array(values)))
+        self.expected([1.0, 2.5], list(hx.dbi.column_array((1, 2.5))))
+
     # -------------------------------------------------------------------------
-    def test_update_nonesuch(self):
+    def test_select_in(self):
         """
-        DBI_out_Base: Calling update() on a table that does not exist should
-        get an exception
+        DBI_out_Base: select_in() should get the rows matching any of the
+        values, a chunk at a time, honoring where
         """
         self.dbgfunc()
-        db = self.DBI()
-        self.assertRaisesRegex(hx.dbi.DBIerror,
-                               hx.msg.no_such_table_upd_rgx,
-                               db.update,
-                               table="nonesuch",
-                               fields=self.fnames[1:],
-                               data=self.testdata)
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.setup_select(tname)
+        sizes = [17, 92, 45, 23, 1000]
+        rows = db.select_in(table=tname, fields=self.nk_fnames,
+                            column='size', values=iter(sizes), chunk=2)
+        self.expected(sorted([x for x in self.testdata if x[1] in sizes]),
+                      sorted(rows))
+
+        rows = db.select_in(table=tname, fields=self.nk_fnames,
+                            column='size', values=sizes, chunk=2,
+                            where='name = ?', data=('frodo',))
+        self.expected(sorted([x for x in self.testdata
+                              if x[0] == 'frodo' and x[1] in sizes]),
+                      sorted(rows))
+        self.expected([], list(db.select_in(table=tname, column='size',
+                                            values=[])))
         db.close()
 
     # -------------------------------------------------------------------------
-    def test_update_nst(self):
+    def test_select_in_args(self):
         """
-        DBI_out_Base: Calling update() with a non-string table argument should
-        get an exception
+        DBI_out_Base: select_in() should reject a missing column, values that
+        are not a list, a chunk that is not a positive int, and where data
+        that leaves no room in the statement for any values
         """
         self.dbgfunc()
-        tname = hx.util.my_name().replace('test_', '')
         db = self.DBI()
         self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.tbl_name_str_S % "update",
-                             db.update,
-                             table=38,
-                             fields=self.fnames,
-                             data=self.testdata)
+                             hx.msg.column_notmt_S % 'select_in',
+                             db.select_in,
+                             table='select_in_args',
+                             values=[1, 2])
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.values_list_S % 'select_in',
+                             db.select_in,
+                             table='select_in_args',
+                             column='size',
+                             values='17')
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.chunk_int,
+                             db.select_in,
+                             table='select_in_args',
+                             column='size',
+                             values=[1, 2],
+                             chunk=0)
+        nparams = db._dbobj.max_params
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.select_in_data_SS % (nparams, nparams),
+                             db.select_in,
+                             table='select_in_args',
+                             column='size',
+                             values=[1, 2],
+                             where=" and ".join(["size <> ?"] * nparams),
+                             data=(0,) * nparams)
         db.close()
 
     # -------------------------------------------------------------------------
-    def test_update_nsw(self):
+    def test_select_in_pool(self):
         """
-        DBI_out_Base: Calling update() with a non-string where argument should
-        get an exception
+        DBI_out_Base: select_in() with a pool should run the chunks on pooled
+        connections and get the same rows as without one
         """
         self.dbgfunc()
         tname = hx.util.my_name().replace('test_', '')
-        db = self.DBI()
+        db = self.setup_select(tname)
+        pool = hx.dbi.DBIpool(cfg=self.cf, section=self.section,
+                              dbname=self.dbname(), pool_max=3)
+        sizes = [17, 92, 45, 23, 55, 1000]
+        rows = db.select_in(table=tname, fields=self.nk_fnames,
+                            column='size', values=sizes, chunk=1, pool=pool)
+        self.expected(sorted(self.testdata), sorted(rows))
+        self.expected(0, len(pool.in_use))
+
         self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.where_str_S % "update",
-                             db.update,
-                             table=tname,
-                             fields=self.fnames,
-                             data=self.testdata,
-                             where=[])
+                             hx.msg.wildcard_selects,
+                             list,
+                             db.select_in(table=tname, column='size',
+                                          values=sizes, chunk=1, pool=pool))
+        pool.close()
         db.close()
 
     # -------------------------------------------------------------------------
-    def test_update_w(self):
+    def test_select_iter(self):
         """
-        DBI_out_Base: Calling update() specifying where should update only the
-        rows requested
+        DBI_out_Base: select_iter() should generate the same rows select()
+        returns, no matter how small the batches are
         """
         self.dbgfunc()
         tname = hx.util.my_name().replace('test_', '')
-        udata = [('frodo', 23, 199.7),
-                 ('zippo', 14, 201.3),
-                 ('zumpy', 47, 202.1)]
-
-        self.reset_db(tname)
-        db = self.DBI()
-        db.create(table=tname, fields=self.fdef)
-        db.insert(table=tname, fields=self.nk_fnames, data=self.testdata)
-        db.update(table=tname,
-                  fields=['size', 'weight'],
-                  data=[(udata[2][1:])],
-                  where="name = 'zumpy'")
-        r = db.select(table=tname, fields=self.nk_fnames)
-
-        explist = self.testdata[0:2] + udata[2:]
-        for exp in explist:
-            self.assertTrue(exp in r,
-                            "Expected %s in %s but didn't find it" %
-                            (str(exp), hx.util.line_quote(r)))
+        db = self.setup_select(tname)
+        exp = db.select(table=tname, fields=self.nk_fnames, orderby='size')
+        rows = db.select_iter(table=tname, fields=self.nk_fnames,
+                              orderby='size', batch=2)
+        self.expected(list(exp), list(rows))
         db.close()
 
     # -------------------------------------------------------------------------
-    def delete_setup(self):
+    def test_select_iter_batch(self):
         """
-        DBI_out_Base: Set up for a delete test
+        DBI_out_Base: select_iter() with a batch that is not a positive int
+        should get an exception
         """
         self.dbgfunc()
-        flist = ['id integer primary key', 'name text', 'age int']
-        testdata = {'tabname': 'test_table',
-                    'flist': flist,
-                    'ifields': [x.split()[0] for x in flist],
-                    'rows': [(1, 'bob', 32),
-                             (2, 'sam', 17),
-                             (3, 'sally', 25),
-                             (4, 'meg', 19),
-                             (5, 'gertrude', 95)]}
-        self.reset_db(testdata['tabname'])
-        db = self.DBI()
-        db.create(table=testdata['tabname'],
-                  fields=testdata['flist'])
-        db.insert(table=testdata['tabname'],
-                  fields=testdata['ifields'],
-                  data=testdata['rows'])
-        return (db, testdata)
-
-
-# -----------------------------------------------------------------------------
-class DBImysqlTest(DBI_in_Base, DBI_out_Base, DBITestRoot):
-    dbtype = 'mysql'
-    pass
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.setup_select(tname)
+        for batch in [0, -3, 'ten', 2.5]:
+            self.assertRaisesMsg(hx.dbi.DBIerror,
+                                 hx.msg.batch_int,
+                                 db.select_iter,
+                                 table=tname,
+                                 fields=self.nk_fnames,
+                                 batch=batch)
+        db.close()
 
     # -------------------------------------------------------------------------
-    @classmethod
-    def setUpClass(cls):
+    def test_select_iter_close(self):
         """
-        DBImysqlTest:
+        DBI_out_Base: If the caller stops early and closes the iterator, the
+        cursor should be released so the table can be dropped
         """
-        cls.drop_test_tables()
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.setup_select(tname)
+        rows = db.select_iter(table=tname, fields=self.nk_fnames, batch=1)
+        self.expected(3, len(next(rows)))
+        rows.close()
+        self.assertRaises(StopIteration, next, rows)
+        db.drop(table=tname)
+        self.expected(False, db.table_exists(table=tname))
+        db.close()
 
     # -------------------------------------------------------------------------
-    @classmethod
-    def tearDownClass(cls):
+    def test_select_iter_nst(self):
         """
-        DBImysqlTest:
+        DBI_out_Base: Calling select_iter() with a non-string table name
+        should get an exception before any rows are requested
         """
-        cls.drop_test_tables()
+        self.dbgfunc()
+        db = self.DBI()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.tbl_name_str_S % "select_iter",
+                             db.select_iter,
+                             table=47,
+                             fields=self.nk_fnames)
+        db.close()
 
     # -------------------------------------------------------------------------
-    @classmethod
-    def drop_test_tables(cls):
+    def test_select_row_format(self):
         """
-        DBImysqlTest: Drop tables like 'test_%'
+        DBI_out_Base: select() and select_iter() should return the same rows
+        as tuples, named rows, or dicts, per call or by default from the
+        connection's row_format option. Named rows should pickle.
         """
-        cf = hx.cfg.add_config(filename="mysql.cfg", close=True)
-        sect = cf.db_section()
-        db = hx.dbi.DBI(cfg=cf, section=sect, tbl_prefix="test")
-        tl = db.table_list()
-        for tname in tl:
-            if db.table_exists(table=tname):
-                db.drop(table=tname)
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.setup_select(tname)
+        fields = ['name', 'size', 'count(*)']
+        kw = dict(table=tname, fields=fields, groupby='name, size',
+                  orderby='size')
+        exp = db.select(**kw)
+        self.expected(tuple, type(exp[0]))
+        self.expected(exp, db.select(row_format='tuple', **kw))
+
+        for select in [db.select, db.select_iter]:
+            rows = list(select(row_format='named', **kw))
+            self.expected(exp, rows)
+            self.expected(('frodo', 17), (rows[0].name, rows[0].size))
+            self.expected(1, rows[0]._2)
+            rows = list(select(row_format='dict', **kw))
+            self.expected([dict(zip(fields, x)) for x in exp], rows)
+
+        row = db.select(row_format='named', **kw)[0]
+        self.expected(row, pickle.loads(pickle.dumps(row)))
+        self.expected(type(row), type(pickle.loads(pickle.dumps(row))))
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.invalid_opt_SS % ('row_format', 'list'),
+                             db.select,
+                             row_format='list',
+                             **kw)
+        db.close()
+
+        db = hx.dbi.DBI(cfg=self.cf, section=self.section,
+                        dbname=self.dbname(), row_format='dict')
+        self.expected(dict(zip(fields, exp[0])), db.select(**kw)[0])
+        self.expected(exp, db.select(row_format='tuple', **kw))
         db.close()
 
     # -------------------------------------------------------------------------
-    def test_alter_add_after(self):
+    def test_select_unbuffered(self):
         """
-        DBImysqlTest: Calling alter() to add a column with valid syntax should
-        add the new column, honoring the *pos* argument.
+        DBI_out_Base: Unbuffered selects should get the same rows as buffered
+        ones. An unbuffered iterator closed early should leave the connection
+        ready for the next statement.
         """
         self.dbgfunc()
         tname = hx.util.my_name().replace('test_', '')
-        # create test table
-        db = self.DBI()
-        db.create(table=tname, fields=self.fdef)
-
-        # add column at specified location
-        db.alter(table=tname, addcol='comment text', pos='after name')
-
-        # verify new column and its location
-        c = db.describe(table=tname)
+        db = self.setup_select(tname)
+        exp = db.select(table=tname, fields=self.nk_fnames, orderby='rowid')
+        self.expected(exp, db.select(table=tname, fields=self.nk_fnames,
+                                     orderby='rowid', unbuffered=True))
+        rows = db.select_iter(table=tname, fields=self.nk_fnames,
+                              orderby='rowid', batch=2, unbuffered=True)
+        self.expected(exp, list(rows))
+
+        rows = db.select_iter(table=tname, fields=self.nk_fnames,
+                              orderby='rowid', batch=1, unbuffered=True)
+        self.expected(exp[0], next(rows))
+        rows.close()
+        self.expected(exp, db.select(table=tname, fields=self.nk_fnames,
+                                     orderby='rowid'))
         db.close()
 
-        exp = ('comment', 3L, 'text')
-        self.assertTrue(exp in c,
-                        "Expected '%s' in '%s'" % (exp, c))
-
     # -------------------------------------------------------------------------
-    def test_alter_add_first(self):
+    def test_slow_query(self):
         """
-        DBImysqlTest: Calling alter() to add a column with valid syntax should
-        add the new column, honoring the *pos* argument
+        DBI_out_Base: Statements taking at least slow_query_time should be
+        written to the slow query log with their parameter and row counts.
+        Faster ones should not.
         """
         self.dbgfunc()
         tname = hx.util.my_name().replace('test_', '')
-        # create test table
-        db = self.DBI()
+        self.reset_db(tname)
+        logpath = self.tmpdir('slow_query.log')
+        db = hx.dbi.DBI(cfg=self.cf, section=self.section,
+                        dbname=self.dbname(), slow_query_time=0.000001,
+                        slow_query_log=logpath)
         db.create(table=tname, fields=self.fdef)
-
-        # add column at specified location
-        db.alter(table=tname, addcol='comment text', pos='first')
-
-        # verify new column and its location
-        c = db.describe(table=tname)
+        db.insert(table=tname, fields=self.nk_fnames, data=self.testdata)
+        db.select(table=tname, fields=['name'], where='size < ?',
+                  data=(50,))
+        db._dbobj.slow_query_time = 3600.0
+        db.delete(table=tname, where='size < ?', data=(50,))
         db.close()
 
-        exp = ('comment', 1L, 'text')
-        self.assertTrue(exp in c,
-                        "Expected '%s' in '%s'" % (exp, c))
+        text = hx.util.contents(logpath)
+        self.assertTrue(re.search("slow query .*: [.0-9]+ seconds, 3 params, "
+                                  "%d rows: insert into" %
+                                  len(self.testdata), text),
+                        "Expected the insert in %s" % text)
+        self.assertTrue(re.search("1 params, 3 rows: select name", text),
+                        "Expected the select in %s" % text)
+        self.assertFalse("delete" in text,
+                         "Did not expect the delete in %s" % text)
 
     # -------------------------------------------------------------------------
-    def test_alter_add_mt_pos(self):
+    def test_stats(self):
         """
-        DBImysqlTest: Calling alter() to add a column with an empty pos
-        argument should add the new column at the end of the row
+        DBI_out_Base: An instrumented DBI should count calls, errors, and rows
+        in and out for each operation and table
         """
         self.dbgfunc()
         tname = hx.util.my_name().replace('test_', '')
-        # create test table
-        db = self.DBI()
+        self.reset_db(tname)
+        db = hx.dbi.DBI(cfg=self.cf, section=self.section,
+                        dbname=self.dbname(), instrument=True)
         db.create(table=tname, fields=self.fdef)
-
-        # add column at specified location
-        db.alter(table=tname, addcol='comment text', pos='')
-
-        # verify new column and its location
-        c = db.describe(table=tname)
+        db.insert(table=tname, fields=self.nk_fnames, data=self.testdata)
+        db.insert(table=tname, fields=self.nk_fnames,
+                  data=(x for x in self.testdata[:2]))
+        db.select(table=tname, fields=self.nk_fnames)
+        rows = list(db.select_iter(table=tname, fields=self.nk_fnames,
+                                   batch=2))
+        self.assertRaises(hx.dbi.DBIerror, db.select, table=tname,
+                          fields=['nonesuch'])
+
+        stats = db.stats()
+        self.expected(1, stats['create'][tname]['calls'])
+        self.expected(2, stats['insert'][tname]['calls'])
+        self.expected(len(self.testdata) + 2,
+                      stats['insert'][tname]['rows_in'])
+        self.expected(2, stats['select'][tname]['calls'])
+        self.expected(1, stats['select'][tname]['errors'])
+        self.expected(len(rows), stats['select'][tname]['rows_out'])
+        self.expected(len(rows), stats['select_iter'][tname]['rows_out'])
+        sel = stats['select'][tname]
+        self.expected(2, sum(sel['hist']))
+        self.assertTrue(sel['p50'] <= sel['p99'],
+                        "Expected p50 <= p99 in %s" % sel)
         db.close()
 
-        exp = ('comment', 5L, 'text')
-        self.assertTrue(exp in c,
-                        "Expected '%s' in '%s'" % (exp, c))
-
     # -------------------------------------------------------------------------
-    def test_alter_drop_ok(self):
+    def test_table_list(self):
         """
-        DBImysqlTest: Calling alter() to drop a column with valid syntax should
-        drop the column
+        DBI_out_Base: table_list() should return the list of tables available
+        in the database
         """
         self.dbgfunc()
-        tname = hx.util.my_name().replace('test_', '')
-        # create test table
-        db = self.DBI()
-        db.create(table=tname, fields=self.fdef)
+        cf = hx.cfg.add_config(filename="mysql.cfg", close=True)
+        sect = cf.db_section()
+        db = hx.dbi.DBI(cfg=cf, section=sect, tbl_prefix='test')
+        pre = db.table_list()
+        count = random.randint(4, 9)
+        rn = [hx.util.rstring(8, 12) for x in range(count)]
+        for rname in rn:
+            db.create(table=rname, fields=self.fdef)
 
-        # add column at specified location
-        db.alter(table=tname, dropcol='size')
+        post = db.table_list()
 
-        # verify new column and its location
-        c = db.describe(table=tname)
-        db.close()
+        tnl = ['test_' + x for x in rn]
+        added = [x for x in post if x not in pre]
+        self.expected(sorted(tnl), sorted(added))
 
-        exp = ('size', 4L, 'int')
-        self.assertFalse(exp in c,
-                         "Not expecting '%s' in '%s'" % (exp, c))
+        for rname in rn:
+            db.drop(table=rname)
 
     # -------------------------------------------------------------------------
-    def test_ctor_bad_attrs_mysql(self):
+    def test_transaction_commit(self):
         """
-        DBImysqlTest: Attempt to create an object with an invalid attribute
-        should get an exception
+        DBI_out_Base: Writes inside transaction() should not be visible to
+        other connections until the block finishes, and then they should be
         """
         self.dbgfunc()
-        self.assertRaisesRegex(hx.dbi.DBIerror,
-                               hx.msg.invalid_attr_rgx,
-                               hx.dbi.DBI,
-                               cfg=self.cf,
-                               section=self.section,
-                               badattr='frooble')
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.setup_select(tname)
+        other = self.DBI()
+        with db.transaction():
+            db.insert(table=tname, fields=self.nk_fnames,
+                      data=[('bilbo', 111, 37.5)])
+            db.delete(table=tname, where="name = 'zippo'")
+            self.expected(len(self.testdata),
+                          len(other.select(table=tname,
+                                           fields=self.nk_fnames)))
+        rows = other.select(table=tname, fields=self.nk_fnames)
+        self.expected(len(self.testdata), len(rows))
+        self.assertTrue(('bilbo', 111, 37.5) in rows,
+                        "Expected committed row missing from %s" % rows)
+        other.close()
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_dbname_none(self):
+    def test_transaction_rollback(self):
         """
-        DBImysqlTest: The DBImysql ctor requires 'dbname' and 'tbl_prefix' as
-        keyword arguments
+        DBI_out_Base: An exception inside transaction() should roll back the
+        writes made in the block and propagate to the caller
         """
         self.dbgfunc()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.missing_arg_S % 'dbname',
-                             hx.dbi.DBImysql,
-                             tbl_prefix='xyzzy')
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.setup_select(tname)
+        try:
+            with db.transaction():
+                db.insert(table=tname, fields=self.nk_fnames,
+                          data=[('bilbo', 111, 37.5)])
+                raise hx.util.HXerror("abandon ship")
+        except hx.util.HXerror as e:
+            self.expected("abandon ship", e.value)
+        rows = db.select(table=tname, fields=self.nk_fnames)
+        self.expected(sorted(self.testdata), sorted(rows))
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_no_hostname(self):
+    def test_transaction_savepoint(self):
         """
-        DBImysqlTest: Called with a non-sqlite dbtype, dbname, and tbl_prefix
-        but no hostname (or cfg containing one), the DBI ctor should throw an
-        exception
+        DBI_out_Base: An exception in a nested transaction() should only roll
+        back to the savepoint. With savepoint=False, the inner block is part of
+        the outer transaction.
         """
         self.dbgfunc()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.missing_arg_S % "hostname",
-                             hx.dbi.DBI,
-                             dbtype='mysql',
-                             dbname=self.dbname('mysql'),
-                             tbl_prefix='test')
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.setup_select(tname)
+        with db.transaction():
+            db.insert(table=tname, fields=self.nk_fnames,
+                      data=[('bilbo', 111, 37.5)])
+            try:
+                with db.transaction():
+                    db.insert(table=tname, fields=self.nk_fnames,
+                              data=[('gollum', 222, 1.5)])
+                    raise hx.util.HXerror("precious")
+            except hx.util.HXerror:
+                pass
+            with db.transaction(savepoint=False):
+                db.insert(table=tname, fields=self.nk_fnames,
+                          data=[('samwise', 333, 80.25)])
+        rows = db.select(table=tname, fields=['name'])
+        names = [x[0] for x in rows]
+        self.assertTrue('bilbo' in names, "Expected bilbo in %s" % names)
+        self.assertTrue('samwise' in names, "Expected samwise in %s" % names)
+        self.assertFalse('gollum' in names, "Unexpected gollum in %s" % names)
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_no_password(self):
+    def test_update_f(self):
         """
-        DBImysqlTest: Called with a non-sqlite dbtype, dbname, and tbl_prefix
-        but no password (or cfg containing one), the DBI ctor should throw an
-        exception
+        DBI_out_Base: Calling update() specifying fields should update the
+        fields requested
         """
         self.dbgfunc()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.missing_arg_S % "password",
-                             hx.dbi.DBI,
-                             dbtype='mysql',
-                             dbname=self.dbname('mysql'),
-                             tbl_prefix='test',
-                             hostname='something.meaningless.org',
-                             username='somebody')
+        tname = hx.util.my_name().replace('test_', '')
+        udata = [('frodo', 23, 199.7),
+                 ('zippo', 14, 201.3),
+                 ('zumpy', 47, 202.1)]
+
+        self.reset_db(tname)
+        db = self.DBI()
+        db.create(table=tname, fields=self.fdef)
+        db.insert(table=tname, fields=self.nk_fnames, data=self.testdata)
+        db.update(table=tname,
+                  fields=['size'],
+                  data=[(x[1], x[0]) for x in udata],
+                  where='name = ?')
+        r = db.select(table=tname, fields=self.nk_fnames)
+
+        for idx, tup in enumerate(udata):
+            exp = (udata[idx][0], udata[idx][1], self.testdata[idx][2])
+            self.assertTrue(exp in r,
+                            "Expected %s in %s but didn't find it" %
+                            (str(exp), hx.util.line_quote(r)))
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_no_username(self):
+    def test_update_gen(self):
         """
-        DBImysqlTest: Called with a non-sqlite dbtype, dbname, and tbl_prefix
-        but no username (or cfg containing one), the DBI ctor should throw an
-        exception
+        DBI_out_Base: Calling update() with a generator for data should update
+        the same rows a list would
         """
         self.dbgfunc()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.missing_arg_S % "username",
-                             hx.dbi.DBI,
-                             dbtype='mysql',
-                             dbname=self.dbname('mysql'),
-                             tbl_prefix='test',
-                             hostname='something.meaningless.org')
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.setup_select(tname)
+        db.update(table=tname,
+                  fields=['weight'],
+                  data=((x[1] * 10.0, x[1]) for x in self.testdata),
+                  where='size = ?')
+        rows = db.select(table=tname, fields=self.nk_fnames)
+        for tup in self.testdata:
+            exp = (tup[0], tup[1], tup[1] * 10.0)
+            self.assertTrue(exp in rows,
+                            "Expected %s in %s but didn't find it" %
+                            (str(exp), hx.util.line_quote(rows)))
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_alter_table_ok(self):
+    def test_update_qp(self):
         """
-        DBImysqlTest: test alter_table
-         > adding a column should be successful,
-         > dropping a column should be successful,
-         > passing both addcol and dropcol in the same invocation should raise
-           an exception
+        DBI_out_Base: Calling update() specifying fields should update the
+        fields requested. However, placeholders should not be quoted.
         """
         self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        udata = [('frodo', 23, 199.7),
+                 ('zippo', 14, 201.3),
+                 ('zumpy', 47, 202.1)]
 
-        tname = hx.util.my_name()
+        self.reset_db(tname)
         db = self.DBI()
         db.create(table=tname, fields=self.fdef)
-        db.alter(table=tname,
-                 addcol="missing int",
-                 pos="first")
-        # self.expected("Successful", rv)
-        z = db.describe(table=tname)
-        self.assertTrue(any(['missing' in x for x in z]),
-                        "Expected field 'missing' in %s" % repr(z))
-
-        db.alter(table=tname, dropcol="missing")
-
-        z = db.describe(table=tname)
-        self.assertFalse(any(['missing' in x for x in z]),
-                         "Field 'missing' should not appear in %s" % repr(z))
-
+        db.insert(table=tname, fields=self.nk_fnames, data=self.testdata)
         self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.alter_mutual_excl,
-                             db.alter,
+                             hx.msg.param_noquote,
+                             db.update,
                              table=tname,
-                             addcol="missing int",
-                             dropcol="missing")
+                             fields=['size'],
+                             data=[(x[1], x[0]) for x in udata],
+                             where='name = "?"')
         db.close()
 
     # -------------------------------------------------------------------------
-    def test_repr(self):
+    def test_update_mtd(self):
         """
-        DBImysqlTest: Test repr on a mysql database object, both open and
-        closed
+        DBI_out_Base: Calling update() with an empty data list should get an
+        exception
         """
         self.dbgfunc()
-        xcf = hx.cfg.config()
-        xcf.read('mysql.cfg')
-        section = xcf.db_section()
-        exp = "DBImysql(dbname='%s')" % xcf.get(section, 'dbname')
-        a = self.DBI()
-        self.expected(exp, repr(a))
-        a.close()
-        exp = "[closed]" + exp
-        self.expected(exp, repr(a))
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.DBI()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.data_notmt,
+                             db.update,
+                             table=tname,
+                             fields=self.fnames,
+                             data=[])
+        db.close()
 
     # -------------------------------------------------------------------------
-    def reset_db(self, name=''):
+    def test_update_mtf(self):
         """
-        DBImysqlTest: If the named table exists, drop it. If *name* is empty,
-        return without doing anything.
+        DBI_out_Base: Calling update() with an empty field list should get an
+        exception
         """
-        if name == '':
-            return
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
         db = self.DBI()
-        if db.table_exists(table=name):
-            db.drop(table=name)
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.fields_notmt_S % "update",
+                             db.update,
+                             table=tname,
+                             fields=[],
+                             data=self.testdata)
         db.close()
 
-
-# -----------------------------------------------------------------------------
-class DBIsqliteTest(DBI_in_Base, DBI_out_Base, DBITestRoot):
-    dbtype = 'sqlite'
-
     # -------------------------------------------------------------------------
-    def test_alter_add_after(self):
+    def test_update_mtt(self):
         """
-        DBIsqliteTest: Calling alter() to add a column with valid syntax should
-        add column at end. Argument *pos* is ignored.
+        DBI_out_Base: Calling update() with an empty table name should get an
+        exception
         """
         self.dbgfunc()
         tname = hx.util.my_name().replace('test_', '')
-        # create test table
         db = self.DBI()
-        db.create(table=tname, fields=self.fdef)
-
-        # add column at specified location
-        db.alter(table=tname, addcol='comment text', pos='after name')
-
-        # verify new column and its location
-        c = db.describe(table=tname)
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.tbl_name_notmt_S % "update",
+                             db.update,
+                             table='',
+                             fields=self.fnames,
+                             data=self.testdata)
         db.close()
-        exp = (4, 'comment', 'text', 0, None, 0)
-        self.assertTrue(exp in c,
-                        "Expected '%s' in '%s'" % (exp, c))
 
     # -------------------------------------------------------------------------
-    def test_alter_add_first(self):
+    def test_update_mtw(self):
         """
-        DBIsqliteTest: Calling alter() to add a column with valid syntax should
-        add column at end. Argument *pos* is ignored.
+        DBI_out_Base: Calling update() with an empty where arg should update
+        all the rows
         """
         self.dbgfunc()
         tname = hx.util.my_name().replace('test_', '')
-        # create test table
+        udata = [('frodo', 23, 199.7),
+                 ('zippo', 14, 201.3),
+                 ('zumpy', 47, 202.1)]
+
+        self.reset_db(tname)
         db = self.DBI()
         db.create(table=tname, fields=self.fdef)
+        db.insert(table=tname, fields=self.nk_fnames, data=self.testdata)
+        db.update(table=tname,
+                  fields=['size'],
+                  data=[(43,)],
+                  where='')
+        r = db.select(table=tname, fields=self.nk_fnames)
 
-        # add column at specified location
-        db.alter(table=tname, addcol='comment text', pos='first')
-
-        # verify new column and its location
-        c = db.describe(table=tname)
+        for idx, tup in enumerate(udata):
+            exp = (udata[idx][0], 43, self.testdata[idx][2])
+            self.assertTrue(exp in r,
+                            "Expected %s in %s but didn't find it" %
+                            (str(exp), hx.util.line_quote(r)))
         db.close()
-        exp = (4, 'comment', 'text', 0, None, 0)
-        self.assertTrue(exp in c,
-                        "Expected '%s' in '%s'" % (exp, c))
 
     # -------------------------------------------------------------------------
-    def test_alter_add_mt_pos(self):
+    def test_update_nlf(self):
         """
-        DBIsqliteTest: Calling alter() to add a column with an empty pos
-        argument should ignore pos arg and add column at end.
+        DBI_out_Base: Calling update() with a non-list as the fields argument
+        should get an exception
         """
         self.dbgfunc()
         tname = hx.util.my_name().replace('test_', '')
-        # create test table
         db = self.DBI()
-        db.create(table=tname, fields=self.fdef)
-
-        # add column at specified location
-        db.alter(table=tname, addcol='comment text', pos='')
-
-        # verify new column and its location
-        c = db.describe(table=tname)
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.fields_list_S % "update",
+                             db.update,
+                             table=tname,
+                             fields=17,
+                             data=self.testdata)
         db.close()
-        exp = (4, 'comment', 'text', 0, None, 0)
-        self.assertTrue(exp in c,
-                        "Expected '%s' in '%s'" % (exp, c))
 
     # -------------------------------------------------------------------------
-    def test_alter_drop_ok(self):
+    def test_update_nld(self):
         """
-        DBIsqliteTest: Calling alter() to drop a column with valid syntax
-        should get an unsupported exception since sqlite does not support this
-        operation.
+        DBI_out_Base: Calling update() with a non-list data argument should get
+        an exception
         """
         self.dbgfunc()
         tname = hx.util.my_name().replace('test_', '')
         db = self.DBI()
-        db.create(table=tname, fields=self.fdef)
         self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.unsupp_dropcol_sqlite,
-                             db.alter,
+                             hx.msg.data_list_S % "update",
+                             db.update,
                              table=tname,
-                             dropcol="size")
+                             fields=self.fnames,
+                             data='notalist')
         db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_bad_attrs_sqlite(self):
+    def test_update_nonesuch(self):
         """
-        DBIsqliteTest: Attempt to create an object with an invalid attribute
-        should get an exception
+        DBI_out_Base: Calling update() on a table that does not exist should
+        get an exception
         """
         self.dbgfunc()
+        db = self.DBI()
         self.assertRaisesRegex(hx.dbi.DBIerror,
-                               hx.msg.invalid_attr_rgx,
-                               hx.dbi.DBI,
-                               cfg=self.cf,
-                               section=self.section,
-                               badattr='frooble')
+                               hx.msg.no_such_table_upd_rgx,
+                               db.update,
+                               table="nonesuch",
+                               fields=self.fnames[1:],
+                               data=self.testdata)
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_bad_dbtype(self):
+    def test_update_nst(self):
         """
-        DBIsqliteTest: If the DBI ctor is called with a dbtype other than one
-        of the known ones, it is expected to throw an exception
+        DBI_out_Base: Calling update() with a non-string table argument should
+        get an exception
         """
         self.dbgfunc()
-        self.assertRaisesRegex(hx.dbi.DBIerror,
-                               hx.msg.valid_dbtype,
-                               hx.dbi.DBI,
-                               dbtype='Informix',
-                               dbname='foobar',
-                               tbl_prefix='test',
-                               hostname='aardvark',
-                               username='somebody',
-                               password=base64.b64encode('bogus'))
-
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.DBI()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.tbl_name_str_S % "update",
+                             db.update,
+                             table=38,
+                             fields=self.fnames,
+                             data=self.testdata)
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_update_nsw(self):
+        """
+        DBI_out_Base: Calling update() with a non-string where argument should
+        get an exception
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.DBI()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.where_str_S % "update",
+                             db.update,
+                             table=tname,
+                             fields=self.fnames,
+                             data=self.testdata,
+                             where=[])
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_update_w(self):
+        """
+        DBI_out_Base: Calling update() specifying where should update only the
+        rows requested
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        udata = [('frodo', 23, 199.7),
+                 ('zippo', 14, 201.3),
+                 ('zumpy', 47, 202.1)]
+
+        self.reset_db(tname)
+        db = self.DBI()
+        db.create(table=tname, fields=self.fdef)
+        db.insert(table=tname, fields=self.nk_fnames, data=self.testdata)
+        db.update(table=tname,
+                  fields=['size', 'weight'],
+                  data=[(udata[2][1:])],
+                  where="name = 'zumpy'")
+        r = db.select(table=tname, fields=self.nk_fnames)
+
+        explist = self.testdata[0:2] + udata[2:]
+        for exp in explist:
+            self.assertTrue(exp in r,
+                            "Expected %s in %s but didn't find it" %
+                            (str(exp), hx.util.line_quote(r)))
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def delete_setup(self):
+        """
+        DBI_out_Base: Set up for a delete test
+        """
+        self.dbgfunc()
+        flist = ['id integer primary key', 'name text', 'age int']
+        testdata = {'tabname': 'test_table',
+                    'flist': flist,
+                    'ifields': [x.split()[0] for x in flist],
+                    'rows': [(1, 'bob', 32),
+                             (2, 'sam', 17),
+                             (3, 'sally', 25),
+                             (4, 'meg', 19),
+                             (5, 'gertrude', 95)]}
+        self.reset_db(testdata['tabname'])
+        db = self.DBI()
+        db.create(table=testdata['tabname'],
+                  fields=testdata['flist'])
+        db.insert(table=testdata['tabname'],
+                  fields=testdata['ifields'],
+                  data=testdata['rows'])
+        return (db, testdata)
+
+    # -------------------------------------------------------------------------
+    def test_upsert(self):
+        """
+        DBI_out_Base: upsert() should insert the rows whose keys are new and
+        update the non-key fields of the rows whose keys are already there
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        self.reset_db(tname)
+        fdef = ['name varchar(32) primary key', 'size int', 'weight double']
+        fnames = [x.split()[0] for x in fdef]
+        db = self.DBI()
+        db.create(table=tname, fields=fdef)
+        db.insert(table=tname, fields=fnames,
+                  data=[('frodo', 17, 108.5), ('zippo', 92, 12341.23)])
+        db.upsert(table=tname, fields=fnames, keys=['name'],
+                  data=(x for x in [('zippo', 93, 10.0),
+                                    ('zumpy', 45, 9.5)]))
+        rows = db.select(table=tname, fields=fnames, orderby='name')
+        self.expected([('frodo', 17, 108.5),
+                       ('zippo', 93, 10.0),
+                       ('zumpy', 45, 9.5)], list(rows))
+        db.upsert(table=tname, fields=['name'], keys=['name'],
+                  data=[('frodo',), ('samwise',)])
+        rows = db.select(table=tname, fields=['name', 'size'],
+                         orderby='name')
+        self.expected([('frodo', 17), ('samwise', None), ('zippo', 93),
+                       ('zumpy', 45)], list(rows))
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_upsert_keys(self):
+        """
+        DBI_out_Base: upsert() with keys that are not a list, empty, or not
+        among the fields should get an exception
+        """
+        self.dbgfunc()
+        db = self.DBI()
+        for keys, exp in [('name', hx.msg.keys_list_S),
+                          ([], hx.msg.keys_notmt_S),
+                          (['size'], hx.msg.keys_fields_S)]:
+            self.assertRaisesMsg(hx.dbi.DBIerror,
+                                 exp % "upsert",
+                                 db.upsert,
+                                 table='upsert_keys',
+                                 fields=['name', 'weight'],
+                                 keys=keys,
+                                 data=[('frodo', 1.5)])
+        db.close()
+
+
+# -----------------------------------------------------------------------------
+class DBImysqlTest(DBI_in_Base, DBI_out_Base, DBITestRoot):
+    dbtype = 'mysql'
+    pass
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def setUpClass(cls):
+        """
+        DBImysqlTest:
+        """
+        cls.drop_test_tables()
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def tearDownClass(cls):
+        """
+        DBImysqlTest:
+        """
+        cls.drop_test_tables()
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def drop_test_tables(cls):
+        """
+        DBImysqlTest: Drop tables like 'test_%'
+        """
+        cf = hx.cfg.add_config(filename="mysql.cfg", close=True)
+        sect = cf.db_section()
+        db = hx.dbi.DBI(cfg=cf, section=sect, tbl_prefix="test")
+        tl = db.table_list()
+        for tname in tl:
+            if db.table_exists(table=tname):
+                db.drop(table=tname)
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_alter_add_after(self):
+        """
+        DBImysqlTest: Calling alter() to add a column with valid syntax should
+        add the new column, honoring the *pos* argument.
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        # create test table
+        db = self.DBI()
+        db.create(table=tname, fields=self.fdef)
+
+        # add column at specified location
+        db.alter(table=tname, addcol='comment text', pos='after name')
+
+        # verify new column and its location
+        c = db.describe(table=tname)
+        db.close()
+
+        exp = ('comment', 3L, 'text')
+        self.assertTrue(exp in c,
+                        "Expected '%s' in '%s'" % (exp, c))
+
+    # -------------------------------------------------------------------------
+    def test_alter_add_first(self):
+        """
+        DBImysqlTest: Calling alter() to add a column with valid syntax should
+        add the new column, honoring the *pos* argument
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        # create test table
+        db = self.DBI()
+        db.create(table=tname, fields=self.fdef)
+
+        # add column at specified location
+        db.alter(table=tname, addcol='comment text', pos='first')
+
+        # verify new column and its location
+        c = db.describe(table=tname)
+        db.close()
+
+        exp = ('comment', 1L, 'text')
+        self.assertTrue(exp in c,
+                        "Expected '%s' in '%s'" % (exp, c))
+
+    # -------------------------------------------------------------------------
+    def test_alter_add_mt_pos(self):
+        """
+        DBImysqlTest: Calling alter() to add a column with an empty pos
+        argument should add the new column at the end of the row
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        # create test table
+        db = self.DBI()
+        db.create(table=tname, fields=self.fdef)
+
+        # add column at specified location
+        db.alter(table=tname, addcol='comment text', pos='')
+
+        # verify new column and its location
+        c = db.describe(table=tname)
+        db.close()
+
+        exp = ('comment', 5L, 'text')
+        self.assertTrue(exp in c,
+                        "Expected '%s' in '%s'" % (exp, c))
+
+    # -------------------------------------------------------------------------
+    def test_alter_drop_ok(self):
+        """
+        DBImysqlTest: Calling alter() to drop a column with valid syntax should
+        drop the column
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        # create test table
+        db = self.DBI()
+        db.create(table=tname, fields=self.fdef)
+
+        # add column at specified location
+        db.alter(table=tname, dropcol='size')
+
+        # verify new column and its location
+        c = db.describe(table=tname)
+        db.close()
+
+        exp = ('size', 4L, 'int')
+        self.assertFalse(exp in c,
+                         "Not expecting '%s' in '%s'" % (exp, c))
+
+    # -------------------------------------------------------------------------
+    def test_ctor_bad_attrs_mysql(self):
+        """
+        DBImysqlTest: Attempt to create an object with an invalid attribute
+        should get an exception
+        """
+        self.dbgfunc()
+        self.assertRaisesRegex(hx.dbi.DBIerror,
+                               hx.msg.invalid_attr_rgx,
+                               hx.dbi.DBI,
+                               cfg=self.cf,
+                               section=self.section,
+                               badattr='frooble')
+
+    # -------------------------------------------------------------------------
+    def test_ctor_dbname_none(self):
+        """
+        DBImysqlTest: The DBImysql ctor requires 'dbname' and 'tbl_prefix' as
+        keyword arguments
+        """
+        self.dbgfunc()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.missing_arg_S % 'dbname',
+                             hx.dbi.DBImysql,
+                             tbl_prefix='xyzzy')
+
+    # -------------------------------------------------------------------------
+    def test_ctor_no_hostname(self):
+        """
+        DBImysqlTest: Called with a non-sqlite dbtype, dbname, and tbl_prefix
+        but no hostname (or cfg containing one), the DBI ctor should throw an
+        exception
+        """
+        self.dbgfunc()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.missing_arg_S % "hostname",
+                             hx.dbi.DBI,
+                             dbtype='mysql',
+                             dbname=self.dbname('mysql'),
+                             tbl_prefix='test')
+
+    # -------------------------------------------------------------------------
+    def test_ctor_no_password(self):
+        """
+        DBImysqlTest: Called with a non-sqlite dbtype, dbname, and tbl_prefix
+        but no password (or cfg containing one), the DBI ctor should throw an
+        exception
+        """
+        self.dbgfunc()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.missing_arg_S % "password",
+                             hx.dbi.DBI,
+                             dbtype='mysql',
+                             dbname=self.dbname('mysql'),
+                             tbl_prefix='test',
+                             hostname='something.meaningless.org',
+                             username='somebody')
+
+    # -------------------------------------------------------------------------
+    def test_ctor_no_username(self):
+        """
+        DBImysqlTest: Called with a non-sqlite dbtype, dbname, and tbl_prefix
+        but no username (or cfg containing one), the DBI ctor should throw an
+        exception
+        """
+        self.dbgfunc()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.missing_arg_S % "username",
+                             hx.dbi.DBI,
+                             dbtype='mysql',
+                             dbname=self.dbname('mysql'),
+                             tbl_prefix='test',
+                             hostname='something.meaningless.org')
+
+    # -------------------------------------------------------------------------
+    def test_cursor_reuse(self):
+        """
+        DBImysqlTest: A run of inserts should reuse one cursor, selects
+        should not keep theirs (or the rows they hold) in the cache, a failed
+        statement should not leave its cursor in the cache, and close()
+        should close the idle cursors
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.setup_select(tname)
+        cursors = db._dbobj.cursors
+        before = cursors.stats()
+        for idx in range(5):
+            db.select(table=tname, fields=self.nk_fnames)
+            db.insert(table=tname, fields=self.nk_fnames,
+                      data=[('name%d' % idx, idx, idx * 1.5)])
+        stats = cursors.stats()
+        self.expected(before['misses'] + 1, stats['misses'])
+        self.expected(before['hits'] + 4, stats['hits'])
+
+        idle = len(cursors)
+        self.assertRaises(hx.dbi.DBIerror, db.select, table='nonesuch',
+                          fields=self.nk_fnames)
+        self.expected(idle, len(cursors))
+        self.assertRaises(hx.dbi.DBIerror, db.insert, table='nonesuch',
+                          fields=self.nk_fnames, data=[('x', 1, 1.0)])
+        self.expected(idle - 1, len(cursors))
+        self.expected(len(self.testdata) + 5,
+                      len(db.select(table=tname, fields=self.nk_fnames)))
+
+        idle = len(cursors)
+        closes = cursors.stats()['closes']
+        db.close()
+        self.expected(0, len(cursors))
+        self.expected(closes + idle, cursors.stats()['closes'])
+
+    # -------------------------------------------------------------------------
+    def test_alter_table_ok(self):
+        """
+        DBImysqlTest: test alter_table
+         > adding a column should be successful,
+         > dropping a column should be successful,
+         > passing both addcol and dropcol in the same invocation should raise
+           an exception
+        """
+        self.dbgfunc()
+
+        tname = hx.util.my_name()
+        db = self.DBI()
+        db.create(table=tname, fields=self.fdef)
+        db.alter(table=tname,
+                 addcol="missing int",
+                 pos="first")
+        # self.expected("Successful", rv)
+        z = db.describe(table=tname)
+        self.assertTrue(any(['missing' in x for x in z]),
+                        "Expected field 'missing' in %s" % repr(z))
+
+        db.alter(table=tname, dropcol="missing")
+
+        z = db.describe(table=tname)
+        self.assertFalse(any(['missing' in x for x in z]),
+                         "Field 'missing' should not appear in %s" % repr(z))
+
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.alter_mutual_excl,
+                             db.alter,
+                             table=tname,
+                             addcol="missing int",
+                             dropcol="missing")
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_upsert_keys_only(self):
+        """
+        DBImysqlTest: When every field is a key, upsert() should leave a row
+        that is already there alone, even when the duplicate is found on a
+        different unique key than the one given
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        self.reset_db(tname)
+        db = self.DBI()
+        db.create(table=tname, fields=['name varchar(32) primary key',
+                                       'tag varchar(32) unique'])
+        db.insert(table=tname, fields=['name', 'tag'],
+                  data=[('frodo', 'ring'), ('samwise', 'rope')])
+        db.upsert(table=tname, fields=['name', 'tag'], keys=['name', 'tag'],
+                  data=[('gollum', 'ring'), ('samwise', 'pan'),
+                        ('bilbo', 'book')])
+        rows = db.select(table=tname, fields=['name', 'tag'],
+                         orderby='name')
+        self.expected([('bilbo', 'book'), ('frodo', 'ring'),
+                       ('samwise', 'rope')], list(rows))
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_reconnect(self):
+        """
+        DBImysqlTest: If the server drops our connection, a select should
+        reconnect and run again rather than failing
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.setup_select(tname)
+        killer = self.DBI()
+        c = killer.cursor()
+        c.execute("kill %d" % db._dbobj.dbh.thread_id())
+        c.close()
+        killer.close()
+        rows = db.select(table=tname, fields=self.nk_fnames)
+        self.expected(len(self.testdata), len(rows))
+        self.expected(1, db._dbobj.reconnects)
+        self.assertFalse(db._dbobj.lost, "Expected a working connection")
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_repr(self):
+        """
+        DBImysqlTest: Test repr on a mysql database object, both open and
+        closed
+        """
+        self.dbgfunc()
+        xcf = hx.cfg.config()
+        xcf.read('mysql.cfg')
+        section = xcf.db_section()
+        exp = "DBImysql(dbname='%s')" % xcf.get(section, 'dbname')
+        a = self.DBI()
+        self.expected(exp, repr(a))
+        a.close()
+        exp = "[closed]" + exp
+        self.expected(exp, repr(a))
+
+    # -------------------------------------------------------------------------
+    def reset_db(self, name=''):
+        """
+        DBImysqlTest: If the named table exists, drop it. If *name* is empty,
+        return without doing anything.
+        """
+        if name == '':
+            return
+        db = self.DBI()
+        if db.table_exists(table=name):
+            db.drop(table=name)
+        db.close()
+
+
+# -----------------------------------------------------------------------------
+class DBIsqliteTest(DBI_in_Base, DBI_out_Base, DBITestRoot):
+    dbtype = 'sqlite'
+
+    # -------------------------------------------------------------------------
+    def test_alter_add_after(self):
+        """
+        DBIsqliteTest: Calling alter() to add a column with valid syntax should
+        add column at end. Argument *pos* is ignored.
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        # create test table
+        db = self.DBI()
+        db.create(table=tname, fields=self.fdef)
+
+        # add column at specified location
+        db.alter(table=tname, addcol='comment text', pos='after name')
+
+        # verify new column and its location
+        c = db.describe(table=tname)
+        db.close()
+        exp = (4, 'comment', 'text', 0, None, 0)
+        self.assertTrue(exp in c,
+                        "Expected '%s' in '%s'" % (exp, c))
+
+    # -------------------------------------------------------------------------
+    def test_alter_add_first(self):
+        """
+        DBIsqliteTest: Calling alter() to add a column with valid syntax should
+        add column at end. Argument *pos* is ignored.
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        # create test table
+        db = self.DBI()
+        db.create(table=tname, fields=self.fdef)
+
+        # add column at specified location
+        db.alter(table=tname, addcol='comment text', pos='first')
+
+        # verify new column and its location
+        c = db.describe(table=tname)
+        db.close()
+        exp = (4, 'comment', 'text', 0, None, 0)
+        self.assertTrue(exp in c,
+                        "Expected '%s' in '%s'" % (exp, c))
+
+    # -------------------------------------------------------------------------
+    def test_alter_add_mt_pos(self):
+        """
+        DBIsqliteTest: Calling alter() to add a column with an empty pos
+        argument should ignore pos arg and add column at end.
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        # create test table
+        db = self.DBI()
+        db.create(table=tname, fields=self.fdef)
+
+        # add column at specified location
+        db.alter(table=tname, addcol='comment text', pos='')
+
+        # verify new column and its location
+        c = db.describe(table=tname)
+        db.close()
+        exp = (4, 'comment', 'text', 0, None, 0)
+        self.assertTrue(exp in c,
+                        "Expected '%s' in '%s'" % (exp, c))
+
+    # -------------------------------------------------------------------------
+    def test_alter_drop_ok(self):
+        """
+        DBIsqliteTest: Calling alter() to drop a column with valid syntax
+        should get an unsupported exception since sqlite does not support this
+        operation.
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.DBI()
+        db.create(table=tname, fields=self.fdef)
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.unsupp_dropcol_sqlite,
+                             db.alter,
+                             table=tname,
+                             dropcol="size")
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_ctor_bad_attrs_sqlite(self):
+        """
+        DBIsqliteTest: Attempt to create an object with an invalid attribute
+        should get an exception
+        """
+        self.dbgfunc()
+        self.assertRaisesRegex(hx.dbi.DBIerror,
+                               hx.msg.invalid_attr_rgx,
+                               hx.dbi.DBI,
+                               cfg=self.cf,
+                               section=self.section,
+                               badattr='frooble')
+
+    # -------------------------------------------------------------------------
+    def test_ctor_bad_dbtype(self):
+        """
+        DBIsqliteTest: If the DBI ctor is called with a dbtype other than one
+        of the known ones, it is expected to throw an exception
+        """
+        self.dbgfunc()
+        self.assertRaisesRegex(hx.dbi.DBIerror,
+                               hx.msg.valid_dbtype,
+                               hx.dbi.DBI,
+                               dbtype='Informix',
+                               dbname='foobar',
+                               tbl_prefix='test',
+                               hostname='aardvark',
+                               username='somebody',
+                               password=base64.b64encode('bogus'))
+
+    # -------------------------------------------------------------------------
+    def test_ctor_cfg_nosection(self):
+        """
+        DBIsqliteTest: If the DBI ctor is called with something other than a
+        config object in argv[0], it is expected to throw an exception
+        """
+        self.dbgfunc()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.section_required,
+                             hx.dbi.DBI,
+                             cfg=self.cf)
+
+    # -------------------------------------------------------------------------
+    def test_ctor_dbn_db(self):
+        """
+        DBIsqliteTest: File dbname exists and is a database file -- we will use
+        it.
+        """
+        self.dbgfunc()
+        # first, we create a database file from scratch
+        hx.util.conditional_rm(self.dbname())
+        tabname = hx.util.my_name()
+        dba = self.DBI()
+        dba.create(table=tabname, fields=['field1 text'])
+        dba.close()
+        self.assertPathPresent(self.dbname())
+        s = os.stat(self.dbname())
+        self.assertNotEqual(0, s.st_size,
+                            "Expected %s to contain some data" % self.dbname())
+
+        # now, when we try to access it, it should be there
+        dbb = self.DBI()
+        self.assertTrue(dbb.table_exists(table=tabname))
+        dbb.close()
+        self.assertPathPresent(self.dbname())
+        s = os.stat(self.dbname())
+        self.assertNotEqual(0, s.st_size,
+                            "Expected %s to contain some data" % self.dbname())
+
+    # -------------------------------------------------------------------------
+    def test_ctor_dbn_dir(self):
+        """
+        DBIsqliteTest: File dbname exists and is a directory -- we throw an
+        exception.
+        """
+        self.dbgfunc()
+        hx.util.conditional_rm(self.dbname())
+        os.mkdir(self.dbname(), 0777)
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.db_open_fail,
+                             hx.dbi.DBI,
+                             cfg=self.cf,
+                             section=self.section,
+                             dbtype=self.dbtype)
+
+    # -------------------------------------------------------------------------
+    def test_ctor_dbn_empty(self):
+        """
+        DBIsqliteTest: File dbname exists and is empty -- we will use it as a
+        database.
+        """
+        self.dbgfunc()
+        hx.util.conditional_rm(self.dbname())
+        hx.util.touch(self.dbname())
+        db = self.DBI()
+        db.create(table='testtab',
+                  fields=['rowid integer primary key autoincrement'])
+        db.close()
+        self.assertPathPresent(self.dbname())
+        s = os.stat(self.dbname())
+        self.assertNotEqual(0, s.st_size,
+                            "Expected %s to contain some data" % self.dbname())
+
+    # -------------------------------------------------------------------------
+    def test_ctor_dbn_fifo(self):
+        """
+        DBIsqliteTest: File dbname exists and is a fifo -- we throw an
+        exception
+        """
+        self.dbgfunc()
+        hx.util.conditional_rm(self.dbname())
+        os.mkfifo(self.dbname())
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.disk_io_err,
+                             hx.dbi.DBI,
+                             cfg=self.cf,
+                             section=self.section,
+                             dbtype=self.dbtype)
+
+    # -------------------------------------------------------------------------
+    def test_ctor_dbname_none(self):
+        """
+        DBIsqliteTest: Called with no dbname, constructor should throw
+        exception
+        """
+        self.dbgfunc()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.missing_arg_S % 'dbname',
+                             hx.dbi.DBI,
+                             dbtype=self.dbtype)
+
+    # -------------------------------------------------------------------------
+    def test_ctor_no_tbl_prefix(self):
+        """
+        DBIsqliteTest: Called with a dbtype and dbname but no tbl_prefix (or
+        cfg containing one), the DBI ctor should throw an exception
+        """
+        self.dbgfunc()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.missing_arg_S % 'tbl_prefix',
+                             hx.dbi.DBI,
+                             dbtype=self.dbtype,
+                             dbname=self.dbname())
+
+    # -------------------------------------------------------------------------
+    def test_ctor_sqlite(self):
+        """
+        DBIsqliteTest: With a config object specifying sqlite as the database
+        type, DBI should instantiate itself with an internal DBIsqlite object.
+
+        Note: this test is about verifying that DBI does the right thing based
+        on the configuration it gets, not anything particular about sqlite.
+        What is being tested here is not instantiating an sqlite database
+        connection per se so much as veryfing that if the configuration says to
+        get us an sqlite database connection, DBI does not hand us back a mysql
+        connection.
+        """
+        self.dbgfunc()
+        a = hx.dbi.DBI(cfg=self.cf, section=self.section)
+        self.assertTrue(hasattr(a, '_dbobj'),
+                        "Expected to find a _dbobj attribute on %s" % a)
+        self.assertTrue(isinstance(a._dbobj, hx.dbi.DBIsqlite),
+                        "Expected %s to be a DBIsqlite object" % a._dbobj)
+
+    # -------------------------------------------------------------------------
+    def test_ctor_dbn_nosuch(self):
+        """
+        DBIsqliteTest: File dbname does not exist -- initializing a db
+        connection to it should create it.
+        """
+        self.dbgfunc()
+        hx.util.conditional_rm(self.dbname())
+        db = self.DBI()
+        db.close()
+        self.assertPathPresent(self.dbname())
+
+    # -------------------------------------------------------------------------
+    def test_ctor_dbn_sock(self):
+        """
+        DBIsqliteTest: File dbname is a socket -- we throw an exception
+        """
+        self.dbgfunc()
+        hx.util.conditional_rm(self.dbname())
+        sockname = self.tmpdir(hx.util.my_name())
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(sockname)
+
+        self.cf.set(self.section, 'dbname', sockname)
+
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.db_open_fail,
+                             hx.dbi.DBI,
+                             cfg=self.cf,
+                             section=self.section,
+                             dbtype=self.dbtype)
+
+    # -------------------------------------------------------------------------
+    def test_ctor_dbn_sym_dir(self):
+        """
+        DBIsqliteTest: File dbname exists is a symlink. We should react to what
+        the symlink points at. If it's a directory, we throw an exception.
+        """
+        self.dbgfunc()
+        # the symlink points at a directory
+        hx.util.conditional_rm(self.dbname() + '_xyz')
+        os.mkdir(self.dbname() + '_xyz', 0777)
+        os.symlink(os.path.basename(self.dbname() + '_xyz'), self.dbname())
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.db_open_fail,
+                             hx.dbi.DBI,
+                             cfg=self.cf,
+                             section=self.section,
+                             dbtype=self.dbtype)
+
+    # -------------------------------------------------------------------------
+    def test_ctor_dbn_sym_empty(self):
+        """
+        DBIsqliteTest: File dbname exists and is a symlink pointing at an empty
+        file. We use it.
+        """
+        self.dbgfunc()
+        # the symlink points at a directory
+        hx.util.conditional_rm(self.dbname())
+        hx.util.conditional_rm(self.dbname() + '_xyz')
+        hx.util.touch(self.dbname() + '_xyz')
+        os.symlink(os.path.basename(self.dbname() + '_xyz'), self.dbname())
+        db = self.DBI()
+        db.create(table='testtab',
+                  fields=['rowid integer primary key autoincrement'])
+        db.close
+
+        self.assertPathPresent(self.dbname() + '_xyz')
+        s = os.stat(self.dbname())
+        self.assertNotEqual(0, s.st_size,
+                            "Expected %s to contain some data" % self.dbname())
+
+    # -------------------------------------------------------------------------
+    def test_ctor_dbn_sym_nosuch(self):
+        """
+        DBIsqliteTest: File dbname exists and is a symlink pointing at a
+        non-existent file. We create it.
+        """
+        self.dbgfunc()
+        # the symlink points at a non-existent file
+        hx.util.conditional_rm(self.dbname())
+        hx.util.conditional_rm(self.dbname() + '_xyz')
+        os.symlink(os.path.basename(self.dbname() + '_xyz'), self.dbname())
+        db = self.DBI()
+        db.create(table='testtab',
+                  fields=['rowid integer primary key autoincrement'])
+        db.close
+
+        self.assertPathPresent(self.dbname() + '_xyz')
+        s = os.stat(self.dbname())
+        self.assertNotEqual(0, s.st_size,
+                            "Expected %s to contain some data" % self.dbname())
+
+    # -------------------------------------------------------------------------
+    def test_ctor_dbn_text(self):
+        """
+        DBIsqliteTest: File dbname exists and contains text. We should throw an
+        exception
+        """
+        self.dbgfunc()
+        hx.util.conditional_rm(self.dbname())
+        f = open(self.dbname(), 'w')
+        f.write('This is a text file, not a database file\n')
+        f.close()
+
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.db_bad_file,
+                             hx.dbi.DBI,
+                             cfg=self.cf,
+                             section=self.section,
+                             dbtype=self.dbtype)
+
+        os.unlink(self.dbname())
+
+    # -------------------------------------------------------------------------
+    def test_ctor_sqlite_dbnreq(self):
+        """
+        DBIsqliteTest: The DBIsqlite ctor requires 'dbname' and 'tbl_prefix' as
+        keyword arguments
+        """
+        self.dbgfunc()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.missing_arg_S % 'dbname',
+                             hx.dbi.DBI,
+                             dbtype=self.dbtype,
+                             tbl_prefix='xyzzy')
+
+    # -------------------------------------------------------------------------
+    def test_ctor_sqlite_other(self):
+        """
+        DBIsqliteTest: The DBIsqlite ctor takes only 'dbname' and 'tbl_prefix'
+        as keyword arguments
+        """
+        self.dbgfunc()
+        self.assertRaisesRegex(hx.dbi.DBIerror,
+                               hx.msg.invalid_attr_rgx,
+                               hx.dbi.DBI,
+                               dbtype=self.dbtype,
+                               dbname=self.dbname(),
+                               tbl_prefix='xyzzy',
+                               something='fribble')
+
+    # -------------------------------------------------------------------------
+    def test_err_handler(self):
+        """
+        DBIsqliteTest: Test the sqlite error handler method
+        """
+        self.dbgfunc()
+        e = sqlite3.OperationalError("no such table: leapfrog")
+        db = self.DBI()
+        self.assertRaisesRegex(hx.dbi.DBIerror,
+                               hx.msg.no_such_table_upd_rgx,
+                               db._dbobj.err_handler,
+                               e)
+
+    # -------------------------------------------------------------------------
+    def test_lazy(self):
+        """
+        DBIsqliteTest: With lazy=True, the database should not be opened until
+        the first operation, and that first connection is not a reconnection.
+        Problems with the file show up then, not in the constructor.
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        self.setup_select(tname).close()
+        db = hx.dbi.DBI(cfg=self.cf, section=self.section, lazy=True)
+        self.expected(None, db._dbobj.dbh)
+        rows = db.select(table=tname, fields=self.nk_fnames)
+        self.expected(sorted(self.testdata), sorted(rows))
+        self.expected(0, db._dbobj.reconnects)
+        db.close()
+
+        db = hx.dbi.DBI(cfg=self.cf, section=self.section, lazy=True)
+        db.close()
+
+        hx.util.conditional_rm(self.dbname())
+        with open(self.dbname(), 'w') as f:
+            f.write('This is a text file, not a database file\n')
+        db = hx.dbi.DBI(cfg=self.cf, section=self.section, lazy=True)
+        self.assertRaises(hx.dbi.DBIerror, db.table_exists, table=tname)
+        os.unlink(self.dbname())
+
+    # -------------------------------------------------------------------------
+    def test_lazy_import(self):
+        """
+        DBIsqliteTest: Importing hx.dbi and using sqlite should not load the
+        mysql or db2 drivers
+        """
+        self.dbgfunc()
+        cmd = ("import hx.dbi, sys; "
+               "db = hx.dbi.DBI(dbtype='sqlite', dbname='%s', "
+               "tbl_prefix='test'); "
+               "db.table_list(); "
+               "print(sorted(set(['MySQLdb', 'ibm_db']) & "
+               "set(sys.modules)))" % self.dbname())
+        result = subprocess.check_output([sys.executable, "-c", cmd])
+        self.expected("[]", result.strip())
+
+    # -------------------------------------------------------------------------
+    def test_lock_retry(self):
+        """
+        DBIsqliteTest: An operation that finds the database locked should
+        wait and try again rather than fail, and the wait should show up in
+        the statistics
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        self.setup_select(tname).close()
+        db = hx.dbi.DBI(cfg=self.cf, section=self.section, busy_timeout=0,
+                        retry_base=0.01, instrument=True)
+        other = sqlite3.connect(self.dbname(), isolation_level=None,
+                                check_same_thread=False)
+        other.execute("begin exclusive")
+        release = threading.Timer(0.3, other.execute, ["commit"])
+        release.start()
+
+        db.insert(table=tname, fields=self.nk_fnames,
+                  data=[('bilbo', 111, 1.11)])
+        release.join()
+        other.close()
+        self.assertTrue(0 < db._dbobj.lock_waits,
+                        "Expected the insert to wait on the lock")
+        self.assertTrue(0.2 < db.stats()['insert'][tname]['lock_wait'],
+                        "Expected the lock wait to be recorded")
+        rows = db.select(table=tname, fields=self.nk_fnames,
+                         where='size = ?', data=(111,))
+        self.expected([('bilbo', 111, 1.11)], rows)
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_lock_timeout(self):
+        """
+        DBIsqliteTest: If the lock doesn't come free within timeout seconds,
+        the operation should fail. Other errors should fail right away.
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        self.setup_select(tname).close()
+        db = hx.dbi.DBI(cfg=self.cf, section=self.section, busy_timeout=0,
+                        retry_base=0.01, timeout=0.3)
+        other = sqlite3.connect(self.dbname(), isolation_level=None)
+        other.execute("begin exclusive")
+        try:
+            self.assertRaisesMsg(hx.dbi.DBIerror,
+                                 hx.msg.retry_deadline_SS %
+                                 (0.3, 'database is locked'),
+                                 db.select,
+                                 table=tname,
+                                 fields=self.nk_fnames)
+        finally:
+            other.execute("rollback")
+            other.close()
+
+        waits = db._dbobj.lock_waits
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             "no such table",
+                             db.select,
+                             table='nosuch',
+                             fields=self.nk_fnames)
+        self.expected(waits, db._dbobj.lock_waits)
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_transaction_commit_fail(self):
+        """
+        DBIsqliteTest: If the commit at the end of transaction() fails, the
+        transaction should be rolled back and the error raised, leaving the
+        connection usable
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        self.setup_select(tname).close()
+        db = hx.dbi.DBI(cfg=self.cf, section=self.section, busy_timeout=0)
+        other = sqlite3.connect(self.dbname(), isolation_level=None)
+        try:
+            with db.transaction():
+                db.insert(table=tname, fields=self.nk_fnames,
+                          data=[('bilbo', 111, 37.5)])
+                # hold a read lock so the commit can't get the database
+                other.execute("begin")
+                other.execute("select * from test_%s" % tname).fetchall()
+            self.fail("Expected the commit to fail")
+        except hx.dbi.DBIerror as e:
+            self.assertTrue("database is locked" in str(e),
+                            "Unexpected error: %s" % str(e))
+        finally:
+            other.execute("rollback")
+            other.close()
+
+        self.expected(0, db._dbobj.txn_depth)
+        rows = db.select(table=tname, fields=self.nk_fnames)
+        self.expected(sorted(self.testdata), sorted(rows))
+        db.insert(table=tname, fields=self.nk_fnames,
+                  data=[('samwise', 333, 80.25)])
+        self.expected(len(self.testdata) + 1,
+                      len(db.select(table=tname, fields=self.nk_fnames)))
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_transaction_rollback_fail(self):
+        """
+        DBIsqliteTest: If the rollback after an exception in transaction()
+        fails too, the caller should still get the original exception
+        """
+        self.dbgfunc()
+        tname = hx.util.my_name().replace('test_', '')
+        db = self.setup_select(tname)
+        try:
+            with db.transaction():
+                db._dbobj.dbh.close()
+                raise hx.util.HXerror("abandon ship")
+        except hx.util.HXerror as e:
+            self.expected("abandon ship", e.value)
+        self.expected(0, db._dbobj.txn_depth)
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def pragma(self, db, name):
+        """
+        DBIsqliteTest: Return the current value of pragma *name* on *db*
+        """
+        c = db.cursor()
+        c.execute("pragma %s" % name)
+        rval = c.fetchone()[0]
+        c.close()
+        return rval
+
+    # -------------------------------------------------------------------------
+    def test_pragma_invalid(self):
+        """
+        DBIsqliteTest: An unknown pragma profile or a pragma value that is not
+        a word or a number should get an exception
+        """
+        self.dbgfunc()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.invalid_opt_SS % ('pragma_profile',
+                                                      'warp-speed'),
+                             hx.dbi.DBI,
+                             cfg=self.cf,
+                             section=self.section,
+                             pragma_profile='warp-speed')
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.invalid_opt_SS % ('synchronous',
+                                                      'off; drop table x'),
+                             hx.dbi.DBI,
+                             cfg=self.cf,
+                             section=self.section,
+                             synchronous='off; drop table x')
+
+    # -------------------------------------------------------------------------
+    def test_pragma_profile(self):
+        """
+        DBIsqliteTest: A pragma profile from the cfg should be applied at
+        connect time, with pragmas set individually taking precedence
+        """
+        self.dbgfunc()
+        self.cf.set(self.section, 'pragma_profile', 'concurrent-read')
+        self.cf.set(self.section, 'synchronous', 'full')
+        try:
+            db = self.DBI()
+        finally:
+            self.cf.remove_option(self.section, 'pragma_profile')
+            self.cf.remove_option(self.section, 'synchronous')
+        self.expected('wal', self.pragma(db, 'journal_mode'))
+        self.expected(2, self.pragma(db, 'synchronous'))
+        self.expected(-65536, self.pragma(db, 'cache_size'))
+        self.expected(30000, self.pragma(db, 'busy_timeout'))
+        db.close()
+
+        db = hx.dbi.DBI(cfg=self.cf, section=self.section,
+                        pragma_profile='bulkload')
+        self.expected(0, self.pragma(db, 'synchronous'))
+        self.expected(2, self.pragma(db, 'temp_store'))
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_pragmas(self):
+        """
+        DBIsqliteTest: Pragmas passed individually should be applied at
+        connect time and the rest left at the library defaults
+        """
+        self.dbgfunc()
+        hx.util.conditional_rm(self.dbname())
+        db = hx.dbi.DBI(cfg=self.cf, section=self.section,
+                        page_size=8192, journal_mode='wal',
+                        synchronous='normal', cache_size=-4096,
+                        temp_store='memory', busy_timeout='1500')
+        self.expected(8192, self.pragma(db, 'page_size'))
+        self.expected('wal', self.pragma(db, 'journal_mode'))
+        self.expected(1, self.pragma(db, 'synchronous'))
+        self.expected(-4096, self.pragma(db, 'cache_size'))
+        self.expected(2, self.pragma(db, 'temp_store'))
+        self.expected(1500, self.pragma(db, 'busy_timeout'))
+        db.close()
+
+        db = self.DBI()
+        self.expected('wal', self.pragma(db, 'journal_mode'))
+        self.expected(0, self.pragma(db, 'temp_store'))
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_repr(self):
+        """
+        DBIsqliteTest: With a config object specifying sqlite as the database
+        type, calling __repr__ on a DBI object should produce a representation
+        that looks like a DBIsqlite object.
+        """
+        self.dbgfunc()
+        exp = "DBIsqlite(dbname='%s')" % self.dbname()
+        a = self.DBI()
+        self.expected(exp, repr(a))
+        a.close()
+        exp = "[closed]" + exp
+        self.expected(exp, repr(a))
+
+    # -------------------------------------------------------------------------
+    def reset_db(self, name=''):
+        """
+        DBIsqliteTest: reset the database
+        """
+        hx.util.conditional_rm(self.dbname())
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.slow
+class DBIdb2Test(DBI_in_Base, DBITestRoot):
+    dbtype = 'db2'     # which database engine it uses
+
+    # -------------------------------------------------------------------------
+    def test_alter_unsupported(self):
+        """
+        DBIdb2Test: alter is not supported for DB2. Calls to it should get an
+        exception.
+        """
+        self.dbgfunc()
+        db = self.DBI()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.db2_unsupported_S % "ALTER",
+                             db.alter,
+                             table="foo",
+                             addcol="new")
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_bulk_unsupported(self):
+        """
+        DBIdb2Test: On a db2 database, bulk_delete() and bulk_update() should
+        throw exceptions
+        """
+        self.dbgfunc()
+        db = self.DBI()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.db2_unsupported_S % "BULK DELETE",
+                             db.bulk_delete,
+                             table="bogus",
+                             keys=['one'],
+                             data=[('a',)])
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.db2_unsupported_S % "BULK UPDATE",
+                             db.bulk_update,
+                             table="bogus",
+                             fields=['one', 'two'],
+                             keys=['one'],
+                             data=[('a', 'b')])
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_ctor_bad_attrs_db2(self):
+        """
+        DBIdb2Test: Attempt to create an object with an invalid attribute
+        should get an exception
+        """
+        self.dbgfunc()
+        self.assertRaisesRegex(hx.dbi.DBIerror,
+                               hx.msg.invalid_attr_rgx,
+                               hx.dbi.DBIdb2,
+                               cfg=self.cf,
+                               section=self.section,
+                               dbname=self.dbname(),
+                               badattr='frooble')
+
+    # -------------------------------------------------------------------------
+    @pytest.mark.jenkins_fail
+    def test_err_handler_db2(self):
+        """
+        DBIdb2Test: The DB2 err handler will accept *err* (an exception object)
+        or *message* (a string). It should alwasy raise a hx.dbi.DBIerror.
+        """
+        self.dbgfunc()
+        import ibm_db_dbi
+        self.dbgfunc()
+        testerrnum = 1438
+        testmsg = "This is a test"
+        db = self.DBI()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             testmsg,
+                             db._dbobj.err_handler,
+                             testmsg)
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             testmsg,
+                             db._dbobj.err_handler,
+                             Exception(testmsg))
+        e = ibm_db_dbi.Error(testmsg)
+        e.args = (testerrnum, testmsg)
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             "%d: %s" % (testerrnum, testmsg),
+                             db._dbobj.err_handler,
+                             e)
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_ctor_nouser_nopass_noconn(self):
+        """
+        DBIdb2Test: Called with no dbname, constructor should throw exception
+        """
+        self.dbgfunc()
+        self.cf.remove_option(self.section, 'password')
+        self.assertRaisesRegex(hx.dbi.DBIerror,
+                               hx.msg.cfg_missing_parm_S % "password",
+                               hx.dbi.DBI,
+                               cfg=self.cf,
+                               section=self.section,
+                               dbtype=self.dbtype,
+                               dbname='nomatter')
+
+    # -------------------------------------------------------------------------
+    def test_ctor_dbname_none(self):
+        """
+        DBIdb2Test: Called with no dbname, constructor should throw exception
+        """
+        self.dbgfunc()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.missing_arg_S % 'dbname',
+                             hx.dbi.DBI,
+                             dbtype=self.dbtype)
+
+    # -------------------------------------------------------------------------
+    def test_ctor_dbtype_db2_dbname_sub_ok(self):
+        """
+        DBIdb2Test: With dbtype value 'db2', good dbname, constructor should
+        be okay
+        """
+        self.dbgfunc()
+        db = self.DBI()
+        self.assertTrue(hasattr(db, "_dbobj"),
+                        "%s: Expected attribute '_dbobj', not present" %
+                        self.dbtype)
+        self.assertTrue(hasattr(db, 'closed'),
+                        "%s: Expected attribute 'closed', not present" %
+                        self.dbtype)
+        self.assertFalse(db.closed,
+                         "%s: Expected db.closed to be False" %
+                         self.dbtype)
+        self.assertTrue(hasattr(db._dbobj, 'dbh'),
+                        "%s: Expected attribute 'dbh', not present" %
+                        self.dbtype)
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_hexstr(self):
+        """
+        DBIdb2Test: Passing a string of binary values to hexstr(), hexstr_uq()
+        should get back the corresponding string of hex digits.
+        """
+        self.dbgfunc()
+        val = ('\x08\xe1"n\xff\xd2\xd9\x11\x80\x14\x10\x00Z\xfau\xbf\xa2' +
+               '\xf9aj6\xfd\xd0\x11\x93\xcb\x00\x00\x00\x00\x00\x04')
+        exp = ("08E1226EFFD2D911801410005AFA75BFA2F9616A36FDD01193CB" +
+               "000000000004")
+        xqexp = "x'" + exp + "'"
+        self.expected(exp, hx.dbi.DBIdb2.hexstr_uq(val))
+        self.expected(xqexp, hx.dbi.DBIdb2.hexstr(val))
+
+    # -------------------------------------------------------------------------
+    def test_hexstr_list(self):
+        """
+        DBIdb2Test: hexstr_list() and hexstr_uq_list() should convert a batch
+        of binary values of any length the same way hexstr() and hexstr_uq()
+        convert them one at a time
+        """
+        self.dbgfunc()
+        vals = ['\x08\xe1"n\xff', '', '\x00\x00\x04', buffer('\xfau\xbf')]
+        self.expected(["08E1226EFF", "", "000004", "FA75BF"],
+                      hx.dbi.DBIdb2.hexstr_uq_list(vals))
+        self.expected([hx.dbi.DBIdb2.hexstr(x) for x in vals],
+                      hx.dbi.DBIdb2.hexstr_list(vals))
+        self.expected([], hx.dbi.DBIdb2.hexstr_list([]))
+        self.expected([hx.dbi.DBIdb2.hexstr_uq(u'bf\x08')],
+                      hx.dbi.DBIdb2.hexstr_uq_list([u'bf\x08']))
+
+    # -------------------------------------------------------------------------
+    def test_hexval(self):
+        """
+        DBIdb2Test: Passing a string of hex digits to hexval() should get back
+        the corresponding binary string.
+        """
+        self.dbgfunc()
+        val = ("08E1226EFFD2D911801410005AFA75BFA2F9616A36FDD01193CB" +
+               "000000000004")
+        xval = "x" + val
+        xqval = "x'" + val + "'"
+        exp = ('\x08\xe1"n\xff\xd2\xd9\x11\x80\x14\x10\x00Z\xfau\xbf\xa2' +
+               '\xf9aj6\xfd\xd0\x11\x93\xcb\x00\x00\x00\x00\x00\x04')
+        self.expected(exp, hx.dbi.DBIdb2.hexval(val))
+        self.expected(exp, hx.dbi.DBIdb2.hexval(xval))
+        self.expected(exp, hx.dbi.DBIdb2.hexval(xqval))
+        self.expected(exp, hx.dbi.DBIdb2.hexval(exp))
+
+    # -------------------------------------------------------------------------
+    def test_hexval_list(self):
+        """
+        DBIdb2Test: hexval_list() should convert a batch of hex strings in
+        any of the forms hexval() takes
+        """
+        self.dbgfunc()
+        vals = ["08E1226eff", "x000004", "x'FA75BF'", "not hex"]
+        exp = ['\x08\xe1"n\xff', '\x00\x00\x04', '\xfau\xbf', "not hex"]
+        self.expected(exp, hx.dbi.DBIdb2.hexval_list(vals))
+        self.expected(exp[:3], hx.dbi.DBIdb2.hexval_list(
+            hx.dbi.DBIdb2.hexstr_list(exp[:3])))
+        self.expected(exp[:3] + [''], hx.dbi.DBIdb2.hexval_list(
+            ["X'08E1226EFF'", "000004", "xFA75BF", "x''"]))
+
+    # -------------------------------------------------------------------------
+    def test_reconnect(self):
+        """
+        DBIdb2Test: After a communication error, err_handler() should drop
+        the connection and its prepared statements. The next select should
+        run on a new connection.
+        """
+        self.dbgfunc()
+        db = self.DBI()
+        db.select(table='cos', fields=['cos_id'])
+        err = Exception("[IBM][CLI Driver] SQL30081N  A communication error "
+                        "has been detected.")
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             str(err),
+                             db._dbobj.err_handler,
+                             err)
+        self.assertTrue(db._dbobj.lost, "Expected the connection to be lost")
+        self.expected(0, len(db._dbobj.stmt_cache))
+        rows = db.select(table='cos', fields=['cos_id'])
+        self.assertTrue(0 < len(rows), "Expected rows from cos")
+        self.expected(1, db._dbobj.reconnects)
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_repr(self):
+        """
+        DBIdb2Test: With a config object specifying sqlite as the database
+        type, calling __repr__ on a DBI object should produce a representation
+        that looks like a DBIsqlite object.
+        """
+        self.dbgfunc()
+        exp = "DBIdb2(dbname='cfg')"
+        a = self.DBI()
+        self.expected(exp, repr(a))
+        a.close()
+        exp = "[closed]" + exp
+        self.expected(exp, repr(a))
+
+    # -------------------------------------------------------------------------
+    def test_scan_binary(self):
+        """
+        DBIdb2Test: Scanning bitfile by its binary bfid should page through
+        the same rows a plain select gets, and resume from a hex position
+        """
+        self.dbgfunc()
+        db = self.DBI()
+        exp = db.select(table='bitfile', fields=['bfid'], orderby='bfid',
+                        limit=12)
+        scan = db.scan(table='bitfile', key='bfid', fields=['bfid'],
+                       batch=5, binary=True)
+        rows = []
+        for row in scan:
+            rows.append(row)
+            if len(rows) == 7:
+                break
+        self.expected(hx.dbi.DBIdb2.hexstr_uq(exp[6]['BFID']), scan.position)
+        rest = db.scan(table='bitfile', key='bfid', fields=['bfid'],
+                       batch=5, binary=True, start=scan.position)
+        for row in rest:
+            rows.append(row)
+            if len(rows) == 12:
+                break
+        self.expected(exp, rows)
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_select_f(self):
+        """
+        DBIdb2Test: Calling select() specifying fields should get only the
+        fields requested
+        """
+        self.dbgfunc()
+        db = self.DBI()
+        rows = db.select(table='cos',
+                         fields=['cos_id', 'hier_id'])
+        self.expected(2, len(rows[0].keys()))
+        for exp in ['HIER_ID', 'COS_ID']:
+            self.assertTrue(exp in rows[0].keys(),
+                            "Expected key '%s' in each row, not found" %
+                            exp)
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_select_stmt_cache(self):
+        """
+        DBIdb2Test: Running the same select twice should prepare the statement
+        once and reuse it the second time. Closing the connection should empty
+        the statement cache.
+        """
+        self.dbgfunc()
+        db = self.DBI()
+        cache = db._dbobj.stmt_cache
+        before = cache.stats()
+        first = db.select(table='cos', fields=['cos_id', 'hier_id'])
+        second = db.select(table='cos', fields=['cos_id', 'hier_id'])
+        after = cache.stats()
+        self.expected(first, second)
+        self.expected(before['misses'] + 1, after['misses'])
+        self.expected(before['hits'] + 1, after['hits'])
+        db.close()
+        self.expected(0, len(cache))
+
+    # -------------------------------------------------------------------------
+    def test_select_gb_f(self):
+        """
+        DBIdb2Test: Select with a group by clause on a field that is present in
+        the table.
+        """
+        self.dbgfunc()
+        db = self.DBI(dbname='sub')
+        rows = db.select(table='bitfile',
+                         fields=['max(bfid) as mbf',
+                                 'bfattr_cos_id'],
+                         groupby='bfattr_cos_id')
+        self.expected(2, len(rows[0].keys()))
+        for exp in ['MBF', 'BFATTR_COS_ID']:
+            self.assertTrue(exp in rows[0].keys(),
+                            "Expected key '%s' in each row, not found" %
+                            exp)
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_select_gb_ns(self):
+        """
+        DBIdb2Test: Select with a group by clause that is not a string --
+        should get an exception.
+        """
+        self.dbgfunc()
+        db = self.DBI(dbname='sub')
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.select_gb_str,
+                             db.select,
+                             table='bitfile',
+                             fields=['max(bfid) as mbf',
+                                     'bfattr_cos_id'],
+                             groupby=17)
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_select_gb_u(self):
+        """
+        DBIdb2Test: Select with a group by clause on a field that is unknown
+        should get an exception.
+        """
+        self.dbgfunc()
+        db = self.DBI(dbname='sub')
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.ctxt_invalid,
+                             db.select,
+                             table='bitfile',
+                             fields=['max(bfid) as mbf',
+                                     'bfattr_cos_id'],
+                             groupby='unknown_field')
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_select_join(self):
+        """
+        DBIdb2Test: Select should support joining tables.
+        """
+        self.dbgfunc()
+        db = self.DBI(dbname='sub')
+        rows = db.select(table=['nsobject', 'bitfile'],
+                         fields=['object_id',
+                                 'name',
+                                 'bitfile_id',
+                                 'bfattr_cos_id'],
+                         where="bitfile_id = bfid")
+        self.assertTrue(0 < len(rows),
+                        "Expected at least one row, got 0")
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_select_join_tn(self):
+        """
+        DBIdb2Test: Select should support joining tables with temporary table
+        names.
+        """
+        self.dbgfunc()
+        db = self.DBI(dbname='sub')
+        rows = db.select(table=['nsobject A', 'bitfile B'],
+                         fields=['A.object_id',
+                                 'A.name',
+                                 'A.bitfile_id',
+                                 'B.bfattr_cos_id'],
+                         where="A.bitfile_id = B.bfid")
+        self.assertTrue(0 < len(rows),
+                        "Expected at least one row, got 0")
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_select_l_nint(self):
+        """
+        DBIdb2Test: select with limit not an int should throw an exception
+        """
+        self.dbgfunc()
+        db = self.DBI()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.select_l_nint,
+                             db.select,
+                             table="cartridge",
+                             fields=['cart',
+                                     'version',
+                                     'cart_sides'],
+                             limit='not an int')
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_select_l_int(self):
+        """
+        DBIdb2Test: select with limit being an int should retrieve the
+        indicated number of records
+        """
+        self.dbgfunc()
+        db = self.DBI(dbname='sub')
+        rlim = 3
+        rows = db.select(table='nsobject',
+                         fields=["object_id",
+                                 "name",
+                                 "bitfile_id"],
+                         limit=rlim)
+        self.expected(rlim, len(rows))
+        db.close()
+
+    # -------------------------------------------------------------------------
+    def test_select_l_float(self):
+        """
+        DBIdb2Test: select with limit being a float should convert the value to
+        an int (without rounding) and retrieve that number of records
+        """
+        self.dbgfunc()
+        db = self.DBI(dbname='sub')
+        rlim = 4.5
+        rows = db.select(table='nsobject',
+                         fields=["object_id",
+                                 "name",
+                                 "bitfile_id"],
+                         limit=rlim)
+        self.expected(int(rlim), len(rows))
+        db.close()
+
     # -------------------------------------------------------------------------
-    def test_ctor_cfg_nosection(self):
+    def test_select_mtf(self):
         """
-        DBIsqliteTest: If the DBI ctor is called with something other than a
-        config object in argv[0], it is expected to throw an exception
+        DBIdb2Test: Calling select() with an empty field list should get an
+        exception -- an empty field list indicates the wildcard option
         """
         self.dbgfunc()
+        db = self.DBI()
         self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.section_required,
-                             hx.dbi.DBI,
-                             cfg=self.cf)
+                             hx.msg.wildcard_selects,
+                             db.select,
+                             table="cos",
+                             fields=[])
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_dbn_db(self):
+    def test_select_nf(self):
         """
-        DBIsqliteTest: File dbname exists and is a database file -- we will use
-        it.
+        DBIdb2Test: Calling select() with no field list should get an exception
+        -- fields should default to the empty list, indicating the wildcard
+        option, which is not supported
         """
         self.dbgfunc()
-        # first, we create a database file from scratch
-        hx.util.conditional_rm(self.dbname())
-        tabname = hx.util.my_name()
-        dba = self.DBI()
-        dba.create(table=tabname, fields=['field1 text'])
-        dba.close()
-        self.assertPathPresent(self.dbname())
-        s = os.stat(self.dbname())
-        self.assertNotEqual(0, s.st_size,
-                            "Expected %s to contain some data" % self.dbname())
+        db = self.DBI()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.wildcard_selects,
+                             db.select,
+                             table='pvlpv')
+        db.close()
 
-        # now, when we try to access it, it should be there
-        dbb = self.DBI()
-        self.assertTrue(dbb.table_exists(table=tabname))
-        dbb.close()
-        self.assertPathPresent(self.dbname())
-        s = os.stat(self.dbname())
-        self.assertNotEqual(0, s.st_size,
-                            "Expected %s to contain some data" % self.dbname())
+    # -------------------------------------------------------------------------
+    def test_select_mto(self):
+        """
+        DBIdb2Test: Calling select() with an empty orderby should get the data
+        in the same order as using no orderby at all.
+        """
+        self.dbgfunc()
+        db = self.DBI(dbname='sub')
+        ordered_rows = db.select(table='bitfile',
+                                 fields=['bfid'],
+                                 orderby='')
+        unordered_rows = db.select(table='bitfile',
+                                   fields=['bfid'])
+        okl = [hx.dbi.DBIdb2.hexstr(x['BFID'])
+               for x in ordered_rows]
+        ukl = [hx.dbi.DBIdb2.hexstr(x['BFID'])
+               for x in unordered_rows]
+        self.expected(ukl, okl)
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_dbn_dir(self):
+    def test_select_mtt(self):
         """
-        DBIsqliteTest: File dbname exists and is a directory -- we throw an
-        exception.
+        DBIdb2Test: Calling select() with an empty table name should get an
+        exception
         """
         self.dbgfunc()
-        hx.util.conditional_rm(self.dbname())
-        os.mkdir(self.dbname(), 0777)
+        db = self.DBI()
+        exp = hx.msg.tbl_name_notmt_S % "select"
         self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.db_open_fail,
-                             hx.dbi.DBI,
-                             cfg=self.cf,
-                             section=self.section,
-                             dbtype=self.dbtype)
+                             exp,
+                             db.select,
+                             table='',
+                             fields=['max(desc_name) as mdn',
+                                     'log_record_type_mask'],
+                             groupby='unknown_field')
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_dbn_empty(self):
+    def test_select_mtw(self):
         """
-        DBIsqliteTest: File dbname exists and is empty -- we will use it as a
-        database.
+        DBIdb2Test: Calling select() with an empty where arg should get the
+        same data as no where arg at all
         """
         self.dbgfunc()
-        hx.util.conditional_rm(self.dbname())
-        hx.util.touch(self.dbname())
-        db = self.DBI()
-        db.create(table='testtab',
-                  fields=['rowid integer primary key autoincrement'])
+        db = self.DBI(dbname='sub')
+        flist = ['object_id', 'name', 'bitfile_id']
+        w_rows = db.select(table='nsobject', fields=flist, where='')
+        x_rows = db.select(table='nsobject', fields=flist)
+        self.expected(len(x_rows), len(w_rows))
+        for exp, actual in zip(x_rows, w_rows):
+            self.expected(actual, exp)
         db.close()
-        self.assertPathPresent(self.dbname())
-        s = os.stat(self.dbname())
-        self.assertNotEqual(0, s.st_size,
-                            "Expected %s to contain some data" % self.dbname())
 
     # -------------------------------------------------------------------------
-    def test_ctor_dbn_fifo(self):
+    def test_select_ntd(self):
         """
-        DBIsqliteTest: File dbname exists and is a fifo -- we throw an
-        exception
+        DBIdb2Test: Calling select() with a non-tuple as the data argument
+        should get an exception
         """
         self.dbgfunc()
-        hx.util.conditional_rm(self.dbname())
-        os.mkfifo(self.dbname())
+        db = self.DBI()
         self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.disk_io_err,
-                             hx.dbi.DBI,
-                             cfg=self.cf,
-                             section=self.section,
-                             dbtype=self.dbtype)
+                             hx.msg.data_tuple_S % "select",
+                             db.select,
+                             table="bitfile",
+                             fields=self.fnames,
+                             where="desc_name = ?",
+                             data='prudhoe')
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_dbname_none(self):
+    def test_select_nlf(self):
         """
-        DBIsqliteTest: Called with no dbname, constructor should throw
-        exception
+        DBIdb2Test: Calling select() with a non-list as the fields argument
+        should get an exception
         """
         self.dbgfunc()
+        db = self.DBI()
         self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.missing_arg_S % 'dbname',
-                             hx.dbi.DBI,
-                             dbtype=self.dbtype)
+                             hx.msg.fields_list_S % "select",
+                             db.select,
+                             table="bitfile",
+                             fields=92,
+                             where="desc_name = ?",
+                             data=('prudhoe', ))
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_no_tbl_prefix(self):
+    def test_select_nq_ld(self):
         """
-        DBIsqliteTest: Called with a dbtype and dbname but no tbl_prefix (or
-        cfg containing one), the DBI ctor should throw an exception
+        DBIdb2Test: Calling select() with where clause with no '?' and data in
+        the list should get an exception -- the data would be ignored
         """
         self.dbgfunc()
+        db = self.DBI()
         self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.missing_arg_S % 'tbl_prefix',
-                             hx.dbi.DBI,
-                             dbtype=self.dbtype,
-                             dbname=self.dbname())
+                             hx.msg.data_ignored,
+                             db.select,
+                             table="bitfile",
+                             fields=self.fnames,
+                             where="desc_name = ''",
+                             data=('prudhoe', ))
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_sqlite(self):
+    def test_select_nq_mtd(self):
         """
-        DBIsqliteTest: With a config object specifying sqlite as the database
-        type, DBI should instantiate itself with an internal DBIsqlite object.
-
-        Note: this test is about verifying that DBI does the right thing based
-        on the configuration it gets, not anything particular about sqlite.
-        What is being tested here is not instantiating an sqlite database
-        connection per se so much as veryfing that if the configuration says to
-        get us an sqlite database connection, DBI does not hand us back a mysql
-        connection.
+        DBIdb2Test: Calling select() with where with no '?' and an empty data
+        list is fine. The data returned should match the where clause.
         """
         self.dbgfunc()
-        a = hx.dbi.DBI(cfg=self.cf, section=self.section)
-        self.assertTrue(hasattr(a, '_dbobj'),
-                        "Expected to find a _dbobj attribute on %s" % a)
-        self.assertTrue(isinstance(a._dbobj, hx.dbi.DBIsqlite),
-                        "Expected %s to be a DBIsqlite object" % a._dbobj)
+        db = self.DBI(dbname='sub')
+        crit = 'logfile'
+        rows = db.select(table='nsobject',
+                         fields=['name', 'object_id', 'bitfile_id'],
+                         where="name like '%%%s%%'" % crit,
+                         data=())
+        for x in rows:
+            self.assertTrue(crit in x['NAME'],
+                            "Expected '%s' in '%s' but it's missing" %
+                            (crit, x['NAME']))
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_dbn_nosuch(self):
+    def test_select_nso(self):
         """
-        DBIsqliteTest: File dbname does not exist -- initializing a db
-        connection to it should create it.
+        DBIdb2Test: Calling select() with a non-string orderby argument should
+        get an exception
         """
         self.dbgfunc()
-        hx.util.conditional_rm(self.dbname())
         db = self.DBI()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.select_nso,
+                             db.select,
+                             table="bitfile",
+                             fields=['bfid'],
+                             orderby=22)
         db.close()
-        self.assertPathPresent(self.dbname())
 
     # -------------------------------------------------------------------------
-    def test_ctor_dbn_sock(self):
+    def test_select_nst(self):
         """
-        DBIsqliteTest: File dbname is a socket -- we throw an exception
+        DBIdb2Test: Calling select() with a non-string table argument should
+        get an exception
         """
         self.dbgfunc()
-        hx.util.conditional_rm(self.dbname())
-        sockname = self.tmpdir(hx.util.my_name())
-        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        sock.bind(sockname)
-
-        self.cf.set(self.section, 'dbname', sockname)
+        db = self.DBI()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.tbl_name_str_S % "select",
+                             db.select,
+                             table=47,
+                             fields=['desc_name'],
+                             orderby=22)
+        db.close()
 
+    # -------------------------------------------------------------------------
+    def test_select_nsw(self):
+        """
+        DBIdb2Test: Calling select() with a non-string where argument should
+        get an exception
+        """
+        self.dbgfunc()
+        db = self.DBI()
         self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.db_open_fail,
-                             hx.dbi.DBI,
-                             cfg=self.cf,
-                             section=self.section,
-                             dbtype=self.dbtype)
+                             hx.msg.where_str_S % "select",
+                             db.select,
+                             table="nsobject",
+                             fields=['name',
+                                     'object_id',
+                                     'bitfile_id'],
+                             where=[])
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_dbn_sym_dir(self):
+    def test_select_o(self):
         """
-        DBIsqliteTest: File dbname exists is a symlink. We should react to what
-        the symlink points at. If it's a directory, we throw an exception.
+        DBIdb2Test: Calling select() specifying orderby should get the rows in
+        the order requested
         """
         self.dbgfunc()
-        # the symlink points at a directory
-        hx.util.conditional_rm(self.dbname() + '_xyz')
-        os.mkdir(self.dbname() + '_xyz', 0777)
-        os.symlink(os.path.basename(self.dbname() + '_xyz'), self.dbname())
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.db_open_fail,
-                             hx.dbi.DBI,
-                             cfg=self.cf,
-                             section=self.section,
-                             dbtype=self.dbtype)
+        db = self.DBI(dbname='sub')
+        ordered_rows = db.select(table='bitfile',
+                                 fields=['bfid'],
+                                 orderby='bfid')
+
+        ford = [hx.dbi.DBIdb2.hexstr(x['BFID'])
+                for x in ordered_rows]
+
+        sord = sorted([hx.dbi.DBIdb2.hexstr(x['BFID'])
+                       for x in ordered_rows])
+
+        self.expected(sord, ford)
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_dbn_sym_empty(self):
+    def test_select_q_ld(self):
         """
-        DBIsqliteTest: File dbname exists and is a symlink pointing at an empty
-        file. We use it.
+        DBIdb2Test: Calling select() with a where clause containing '?' and
+        data in the data list should return the data matching the where clause
         """
         self.dbgfunc()
-        # the symlink points at a directory
-        hx.util.conditional_rm(self.dbname())
-        hx.util.conditional_rm(self.dbname() + '_xyz')
-        hx.util.touch(self.dbname() + '_xyz')
-        os.symlink(os.path.basename(self.dbname() + '_xyz'), self.dbname())
-        db = self.DBI()
-        db.create(table='testtab',
-                  fields=['rowid integer primary key autoincrement'])
-        db.close
-
-        self.assertPathPresent(self.dbname() + '_xyz')
-        s = os.stat(self.dbname())
-        self.assertNotEqual(0, s.st_size,
-                            "Expected %s to contain some data" % self.dbname())
+        db = self.DBI(dbname='sub')
+        crit = 'logfile'
+        rows = db.select(table='nsobject',
+                         fields=['name', 'object_id', 'bitfile_id'],
+                         where="name like '%?%'",
+                         data=(crit,))
+        for x in rows:
+            self.assertTrue(crit in x['NAME'],
+                            "Expected '%s' in '%s' but it's missing" %
+                            (crit, x['NAME']))
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_dbn_sym_nosuch(self):
+    def test_select_q_mtd(self):
         """
-        DBIsqliteTest: File dbname exists and is a symlink pointing at a
-        non-existent file. We create it.
+        DBIdb2Test: Calling select() with a where clause with a '?' and an
+        empty data list should get an exception
         """
         self.dbgfunc()
-        # the symlink points at a non-existent file
-        hx.util.conditional_rm(self.dbname())
-        hx.util.conditional_rm(self.dbname() + '_xyz')
-        os.symlink(os.path.basename(self.dbname() + '_xyz'), self.dbname())
         db = self.DBI()
-        db.create(table='testtab',
-                  fields=['rowid integer primary key autoincrement'])
-        db.close
-
-        self.assertPathPresent(self.dbname() + '_xyz')
-        s = os.stat(self.dbname())
-        self.assertNotEqual(0, s.st_size,
-                            "Expected %s to contain some data" % self.dbname())
+        self.assertRaisesRegex(hx.dbi.DBIerror,
+                               hx.msg.param_bound_rgx,
+                               db.select,
+                               table="bitfile",
+                               fields=['bfid'],
+                               data=(),
+                               where="DESC_NAME = ?")
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_dbn_text(self):
+    def test_select_w(self):
         """
-        DBIsqliteTest: File dbname exists and contains text. We should throw an
-        exception
+        DBIdb2Test: Calling select() specifying where should get only the rows
+        requested
         """
         self.dbgfunc()
-        hx.util.conditional_rm(self.dbname())
-        f = open(self.dbname(), 'w')
-        f.write('This is a text file, not a database file\n')
-        f.close()
-
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.db_bad_file,
-                             hx.dbi.DBI,
-                             cfg=self.cf,
-                             section=self.section,
-                             dbtype=self.dbtype)
-
-        os.unlink(self.dbname())
+        db = self.DBI(dbname='sub')
+        crit = 'logfile'
+        rows = db.select(table='nsobject',
+                         fields=['name', 'object_id', 'bitfile_id'],
+                         where="name like '%%%s%%'" % crit)
+        for x in rows:
+            self.assertTrue(crit in x['NAME'],
+                            "Expected '%s' in '%s' but it's missing" %
+                            (crit, x['NAME']))
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_sqlite_dbnreq(self):
+    def test_table_exists_yes(self):
         """
-        DBIsqliteTest: The DBIsqlite ctor requires 'dbname' and 'tbl_prefix' as
-        keyword arguments
+        DBIdb2Test: For a table that exists, table_exists() should return True.
         """
         self.dbgfunc()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.missing_arg_S % 'dbname',
-                             hx.dbi.DBI,
-                             dbtype=self.dbtype,
-                             tbl_prefix='xyzzy')
+        db = self.DBI()
+        self.expected(True, db.table_exists(table='cartridge'))
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_sqlite_other(self):
+    def test_table_exists_no(self):
         """
-        DBIsqliteTest: The DBIsqlite ctor takes only 'dbname' and 'tbl_prefix'
-        as keyword arguments
+        DBIdb2Test: For a table that does not exist, table_exists() should
+        return False.
         """
         self.dbgfunc()
-        self.assertRaisesRegex(hx.dbi.DBIerror,
-                               hx.msg.invalid_attr_rgx,
-                               hx.dbi.DBI,
-                               dbtype=self.dbtype,
-                               dbname=self.dbname(),
-                               tbl_prefix='xyzzy',
-                               something='fribble')
+        db = self.DBI()
+        self.expected(False, db.table_exists(table='nonesuch'))
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_err_handler(self):
+    def test_insert_exception(self):
         """
-        DBIsqliteTest: Test the sqlite error handler method
+        DBIdb2Test: On a db2 database, insert should throw an exception.
         """
         self.dbgfunc()
-        e = sqlite3.OperationalError("no such table: leapfrog")
         db = self.DBI()
-        self.assertRaisesRegex(hx.dbi.DBIerror,
-                               hx.msg.no_such_table_upd_rgx,
-                               db._dbobj.err_handler,
-                               e)
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.db2_unsupported_S % "INSERT",
+                             db.insert,
+                             table="bogus",
+                             data=[('a', 'b', 'c')])
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_repr(self):
+    def test_create_exception(self):
         """
-        DBIsqliteTest: With a config object specifying sqlite as the database
-        type, calling __repr__ on a DBI object should produce a representation
-        that looks like a DBIsqlite object.
+        DBIdb2Test: On a db2 database, create should throw an exception.
         """
         self.dbgfunc()
-        exp = "DBIsqlite(dbname='%s')" % self.dbname()
-        a = self.DBI()
-        self.expected(exp, repr(a))
-        a.close()
-        exp = "[closed]" + exp
-        self.expected(exp, repr(a))
+        db = self.DBI()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.db2_unsupported_S % "CREATE",
+                             db.create,
+                             table="nonesuch",
+                             fields=self.fdef)
+        db.close()
 
     # -------------------------------------------------------------------------
-    def reset_db(self, name=''):
+    def test_delete_exception(self):
         """
-        DBIsqliteTest: reset the database
+        DBIdb2Test: On a db2 database, delete should throw an exception.
         """
-        hx.util.conditional_rm(self.dbname())
-
-
-# -----------------------------------------------------------------------------
-@pytest.mark.slow
-class DBIdb2Test(DBI_in_Base, DBITestRoot):
-    dbtype = 'db2'     # which database engine it uses
+        self.dbgfunc()
+        db = self.DBI()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.db2_unsupported_S % "DELETE",
+                             db.delete,
+                             table="bogus",
+                             data=[('a',)],
+                             where="field = ?")
+        db.close()
 
     # -------------------------------------------------------------------------
-    def test_alter_unsupported(self):
+    def test_drop_exception(self):
         """
-        DBIdb2Test: alter is not supported for DB2. Calls to it should get an
-        exception.
+        DBIdb2Test: On a db2 database, drop should throw an exception.
         """
         self.dbgfunc()
         db = self.DBI()
         self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.db2_unsupported_S % "ALTER",
-                             db.alter,
-                             table="foo",
-                             addcol="new")
+                             hx.msg.db2_unsupported_S % "DROP",
+                             db.drop,
+                             table="bogus")
         db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_bad_attrs_db2(self):
+    def test_transaction_exception(self):
         """
-        DBIdb2Test: Attempt to create an object with an invalid attribute
-        should get an exception
+        DBIdb2Test: On a db2 database, transaction should throw an exception.
         """
         self.dbgfunc()
-        self.assertRaisesRegex(hx.dbi.DBIerror,
-                               hx.msg.invalid_attr_rgx,
-                               hx.dbi.DBIdb2,
-                               cfg=self.cf,
-                               section=self.section,
-                               dbname=self.dbname(),
-                               badattr='frooble')
+        db = self.DBI()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.db2_unsupported_S % "TRANSACTION",
+                             db.transaction)
+        db.close()
 
     # -------------------------------------------------------------------------
-    @pytest.mark.jenkins_fail
-    def test_err_handler_db2(self):
+    def test_update_exception(self):
         """
-        DBIdb2Test: The DB2 err handler will accept *err* (an exception object)
-        or *message* (a string). It should alwasy raise a hx.dbi.DBIerror.
+        DBIdb2Test: On a db2 database, update should throw an exception.
         """
         self.dbgfunc()
-        import ibm_db_dbi
-        self.dbgfunc()
-        testerrnum = 1438
-        testmsg = "This is a test"
         db = self.DBI()
         self.assertRaisesMsg(hx.dbi.DBIerror,
-                             testmsg,
-                             db._dbobj.err_handler,
-                             testmsg)
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             testmsg,
-                             db._dbobj.err_handler,
-                             Exception(testmsg))
-        e = ibm_db_dbi.Error(testmsg)
-        e.args = (testerrnum, testmsg)
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             "%d: %s" % (testerrnum, testmsg),
-                             db._dbobj.err_handler,
-                             e)
+                             hx.msg.db2_unsupported_S % "UPDATE",
+                             db.update,
+                             table="bogus",
+                             fields=['one', 'two'],
+                             data=[('a', 'b', 'c')],
+                             where="one = ?")
         db.close()
 
     # -------------------------------------------------------------------------
-    def test_ctor_nouser_nopass_noconn(self):
+    def test_upsert_exception(self):
         """
-        DBIdb2Test: Called with no dbname, constructor should throw exception
+        DBIdb2Test: On a db2 database, upsert should throw an exception.
         """
         self.dbgfunc()
-        self.cf.remove_option(self.section, 'password')
-        self.assertRaisesRegex(hx.dbi.DBIerror,
-                               hx.msg.cfg_missing_parm_S % "password",
-                               hx.dbi.DBI,
-                               cfg=self.cf,
-                               section=self.section,
-                               dbtype=self.dbtype,
-                               dbname='nomatter')
+        db = self.DBI()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.db2_unsupported_S % "UPSERT",
+                             db.upsert,
+                             table="bogus",
+                             fields=['one', 'two'],
+                             keys=['one'],
+                             data=[('a', 'b')])
+        db.close()
+
+
+# -----------------------------------------------------------------------------
+class DBIpoolTest(DBITestRoot):
+    """
+    Tests for the DBI connection pool. The pool doesn't care what kind of
+    database is behind it, so sqlite will do.
+    """
+    dbtype = 'sqlite'
 
     # -------------------------------------------------------------------------
-    def test_ctor_dbname_none(self):
+    def pool(self, **kw):
         """
-        DBIdb2Test: Called with no dbname, constructor should throw exception
+        DBIpoolTest: Return a pool built from the test config, with *kw* set
+        in the db section first
+        """
+        for opt in kw:
+            self.cf.set(self.section, opt, str(kw[opt]))
+        return hx.dbi.DBIpool(cfg=self.cf,
+                              section=self.section,
+                              dbname=self.dbname())
+
+    # -------------------------------------------------------------------------
+    def test_pool_bad_size(self):
+        """
+        DBIpoolTest: pool_min larger than pool_max should get an exception
         """
         self.dbgfunc()
         self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.missing_arg_S % 'dbname',
-                             hx.dbi.DBI,
-                             dbtype=self.dbtype)
+                             hx.msg.pool_size_SS % (4, 2),
+                             self.pool,
+                             pool_min=4,
+                             pool_max=2)
 
     # -------------------------------------------------------------------------
-    def test_ctor_dbtype_db2_dbname_sub_ok(self):
+    def test_pool_cfg(self):
         """
-        DBIdb2Test: With dbtype value 'db2', good dbname, constructor should
-        be okay
+        DBIpoolTest: Pool sizing should come from the db section of the cfg
+        and pool_min connections should be opened right away
         """
         self.dbgfunc()
-        db = self.DBI()
-        self.assertTrue(hasattr(db, "_dbobj"),
-                        "%s: Expected attribute '_dbobj', not present" %
-                        self.dbtype)
-        self.assertTrue(hasattr(db, 'closed'),
-                        "%s: Expected attribute 'closed', not present" %
-                        self.dbtype)
-        self.assertFalse(db.closed,
-                         "%s: Expected db.closed to be False" %
-                         self.dbtype)
-        self.assertTrue(hasattr(db._dbobj, 'dbh'),
-                        "%s: Expected attribute 'dbh', not present" %
-                        self.dbtype)
-        db.close()
+        pool = self.pool(pool_min=2, pool_max=3, pool_idle='2min')
+        stats = pool.stats()
+        self.expected(2, stats['size'])
+        self.expected(2, stats['idle'])
+        self.expected(3, stats['pool_max'])
+        self.expected(120, pool.pool_idle)
+        pool.close()
 
     # -------------------------------------------------------------------------
-    def test_hexstr(self):
+    def test_pool_closed(self):
         """
-        DBIdb2Test: Passing a string of binary values to hexstr(), hexstr_uq()
-        should get back the corresponding string of hex digits.
+        DBIpoolTest: Checking out of a closed pool should get an exception.
+        Connections checked in after close() should be closed.
         """
         self.dbgfunc()
-        val = ('\x08\xe1"n\xff\xd2\xd9\x11\x80\x14\x10\x00Z\xfau\xbf\xa2' +
-               '\xf9aj6\xfd\xd0\x11\x93\xcb\x00\x00\x00\x00\x00\x04')
-        exp = ("08E1226EFFD2D911801410005AFA75BFA2F9616A36FDD01193CB" +
-               "000000000004")
-        xqexp = "x'" + exp + "'"
-        self.expected(exp, hx.dbi.DBIdb2.hexstr_uq(val))
-        self.expected(xqexp, hx.dbi.DBIdb2.hexstr(val))
+        pool = self.pool()
+        db = pool.checkout()
+        pool.close()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.pool_closed,
+                             pool.checkout)
+        pool.checkin(db)
+        self.expected(True, db.closed)
+        self.expected(0, pool.stats()['size'])
 
     # -------------------------------------------------------------------------
-    def test_hexval(self):
+    def test_pool_checkin(self):
         """
-        DBIdb2Test: Passing a string of hex digits to hexval() should get back
-        the corresponding binary string.
+        DBIpoolTest: Checking in a connection twice, or one that didn't come
+        from the pool, should get an exception and leave the pool alone
         """
         self.dbgfunc()
-        val = ("08E1226EFFD2D911801410005AFA75BFA2F9616A36FDD01193CB" +
-               "000000000004")
-        xval = "x" + val
-        xqval = "x'" + val + "'"
-        exp = ('\x08\xe1"n\xff\xd2\xd9\x11\x80\x14\x10\x00Z\xfau\xbf\xa2' +
-               '\xf9aj6\xfd\xd0\x11\x93\xcb\x00\x00\x00\x00\x00\x04')
-        self.expected(exp, hx.dbi.DBIdb2.hexval(val))
-        self.expected(exp, hx.dbi.DBIdb2.hexval(xval))
-        self.expected(exp, hx.dbi.DBIdb2.hexval(xqval))
-        self.expected(exp, hx.dbi.DBIdb2.hexval(exp))
+        pool = self.pool(pool_min=0)
+        db = pool.checkout()
+        pool.checkin(db)
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.pool_checkin,
+                             pool.checkin,
+                             db)
+        other = self.DBI()
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.pool_checkin,
+                             pool.checkin,
+                             other)
+        other.close()
+        stats = pool.stats()
+        self.expected(1, stats['size'])
+        self.expected(1, stats['idle'])
+        pool.close()
 
     # -------------------------------------------------------------------------
-    def test_repr(self):
+    def test_pool_idle(self):
         """
-        DBIdb2Test: With a config object specifying sqlite as the database
-        type, calling __repr__ on a DBI object should produce a representation
-        that looks like a DBIsqlite object.
+        DBIpoolTest: Connections idle longer than pool_idle should be closed,
+        but not below pool_min
         """
         self.dbgfunc()
-        exp = "DBIdb2(dbname='cfg')"
-        a = self.DBI()
-        self.expected(exp, repr(a))
-        a.close()
-        exp = "[closed]" + exp
-        self.expected(exp, repr(a))
+        pool = self.pool(pool_min=1, pool_max=3, pool_idle=0)
+        with pool.connection():
+            with pool.connection():
+                pass
+        self.expected(2, pool.stats()['size'])
+        with pool.connection():
+            pass
+        stats = pool.stats()
+        self.expected(1, stats['expired'])
+        self.expected(1, stats['size'])
+        pool.close()
 
     # -------------------------------------------------------------------------
-    def test_select_f(self):
+    def test_pool_reuse(self):
         """
-        DBIdb2Test: Calling select() specifying fields should get only the
-        fields requested
+        DBIpoolTest: A connection checked back in should be handed out again
+        rather than opening a new one
         """
         self.dbgfunc()
-        db = self.DBI()
-        rows = db.select(table='cos',
-                         fields=['cos_id', 'hier_id'])
-        self.expected(2, len(rows[0].keys()))
-        for exp in ['HIER_ID', 'COS_ID']:
-            self.assertTrue(exp in rows[0].keys(),
-                            "Expected key '%s' in each row, not found" %
-                            exp)
-        db.close()
+        pool = self.pool(pool_min=0)
+        with pool.connection() as db:
+            first = db
+            self.expected(1, pool.stats()['in_use'])
+        with pool.connection() as db:
+            self.assertTrue(db is first, "Expected the pooled connection")
+        stats = pool.stats()
+        self.expected(2, stats['checkouts'])
+        self.expected(1, stats['created'])
+        self.expected(0, stats['in_use'])
+        pool.close()
 
     # -------------------------------------------------------------------------
-    def test_select_gb_f(self):
+    def test_pool_threads(self):
         """
-        DBIdb2Test: Select with a group by clause on a field that is present in
-        the table.
+        DBIpoolTest: Several threads writing through the pool should never
+        have more than pool_max connections out and all their rows should land
         """
         self.dbgfunc()
-        db = self.DBI(dbname='sub')
-        rows = db.select(table='bitfile',
-                         fields=['max(bfid) as mbf',
-                                 'bfattr_cos_id'],
-                         groupby='bfattr_cos_id')
-        self.expected(2, len(rows[0].keys()))
-        for exp in ['MBF', 'BFATTR_COS_ID']:
-            self.assertTrue(exp in rows[0].keys(),
-                            "Expected key '%s' in each row, not found" %
-                            exp)
-        db.close()
+        tname = hx.util.my_name().replace('test_', '')
+        pool = self.pool(pool_max=2)
+        with pool.connection() as db:
+            db.create(table=tname, fields=['id int', 'name text'])
+
+        # ---------------------------------------------------------------------
+        def worker(num):
+            """
+            Insert a few rows with a pooled connection
+            """
+            for idx in range(5):
+                with pool.connection() as db:
+                    db.insert(table=tname, fields=['id', 'name'],
+                              data=[(num * 10 + idx, 'thread%d' % num)])
+
+        tl = [threading.Thread(target=worker, args=(x,)) for x in range(6)]
+        for t in tl:
+            t.start()
+        for t in tl:
+            t.join()
+
+        with pool.connection() as db:
+            rows = db.select(table=tname, fields=['id'])
+        self.expected(30, len(rows))
+        stats = pool.stats()
+        self.assertTrue(stats['peak_in_use'] <= 2,
+                        "Expected no more than 2 in use, got %d" %
+                        stats['peak_in_use'])
+        self.expected(32, stats['checkouts'])
+        pool.close()
+
+    # -------------------------------------------------------------------------
+    def test_pool_timeout(self):
+        """
+        DBIpoolTest: With every connection checked out, checkout() should wait
+        pool_wait seconds and then get an exception
+        """
+        self.dbgfunc()
+        pool = self.pool(pool_max=1)
+        pool.pool_wait = 0.2
+        with pool.connection():
+            start = time.time()
+            self.assertRaisesMsg(hx.dbi.DBIerror,
+                                 hx.msg.pool_timeout_S % 0.2,
+                                 pool.checkout)
+            self.assertTrue(0.2 <= time.time() - start,
+                            "Expected checkout() to wait")
+        pool.close()
+
+    # -------------------------------------------------------------------------
+    def test_pool_validate(self):
+        """
+        DBIpoolTest: A connection that has gone bad while idle should be
+        replaced at checkout
+        """
+        self.dbgfunc()
+        pool = self.pool()
+        with pool.connection() as db:
+            bad = db
+            db.close()
+        with pool.connection() as db:
+            self.assertFalse(db is bad, "Expected a fresh connection")
+            self.expected(False, db.table_exists(table='nonesuch'))
+        self.expected(1, pool.stats()['discarded'])
+        pool.close()
 
+
+# -----------------------------------------------------------------------------
+class DBIstatsTest(hx.testhelp.HelpedTestCase):
+    """
+    Tests for DBIstats that don't need a database
+    """
     # -------------------------------------------------------------------------
-    def test_select_gb_ns(self):
+    def test_dump(self):
         """
-        DBIdb2Test: Select with a group by clause that is not a string --
-        should get an exception.
+        DBIstatsTest: With an interval, record() should write the statistics
+        to the log once the interval has passed
         """
         self.dbgfunc()
-        db = self.DBI(dbname='sub')
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.select_gb_str,
-                             db.select,
-                             table='bitfile',
-                             fields=['max(bfid) as mbf',
-                                     'bfattr_cos_id'],
-                             groupby=17)
-        db.close()
+        logpath = self.tmpdir('dbistats.log')
+        hx.cfg.log(logpath=logpath, close=True)
+        stats = hx.dbi.DBIstats(interval=0.1)
+        stats.record('select', 'foo', 0.002, rows_out=5)
+        time.sleep(0.2)
+        stats.record('select', 'foo', 0.001, rows_out=3)
+        hx.cfg.log(close=True)
+        text = hx.util.contents(logpath)
+        self.assertTrue("dbi select foo: calls=2 errors=0 retries=0 "
+                        "rows_in=0 rows_out=8" in text,
+                        "Expected statistics in %s" % text)
 
     # -------------------------------------------------------------------------
-    def test_select_gb_u(self):
+    def test_percentiles(self):
         """
-        DBIdb2Test: Select with a group by clause on a field that is unknown
-        should get an exception.
+        DBIstatsTest: Percentiles should come from the histogram buckets
         """
         self.dbgfunc()
-        db = self.DBI(dbname='sub')
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.ctxt_invalid,
-                             db.select,
-                             table='bitfile',
-                             fields=['max(bfid) as mbf',
-                                     'bfattr_cos_id'],
-                             groupby='unknown_field')
-        db.close()
+        stats = hx.dbi.DBIstats()
+        for n in range(98):
+            stats.record('select', 'foo', 0.000003)
+        stats.record('select', 'foo', 0.0005)
+        stats.record('select', 'foo', 0.1, error=True, retries=2)
+        e = stats.snapshot()['select']['foo']
+        self.expected(100, e['calls'])
+        self.expected(1, e['errors'])
+        self.expected(2, e['retries'])
+        self.expected(0.1, e['max'])
+        self.expected(4 / 1000000.0, e['p50'])
+        self.expected(4 / 1000000.0, e['p90'])
+        self.expected(512 / 1000000.0, e['p99'])
 
+
+# -----------------------------------------------------------------------------
+class CatalogCacheTest(hx.testhelp.HelpedTestCase):
+    """
+    Tests for the catalog cache. These don't need a database -- load() just
+    counts how often it is called.
+    """
     # -------------------------------------------------------------------------
-    def test_select_join(self):
+    def setUp(self):
         """
-        DBIdb2Test: Select should support joining tables.
+        CatalogCacheTest: Start each test with no loads
         """
-        self.dbgfunc()
-        db = self.DBI(dbname='sub')
-        rows = db.select(table=['nsobject', 'bitfile'],
-                         fields=['object_id',
-                                 'name',
-                                 'bitfile_id',
-                                 'bfattr_cos_id'],
-                         where="bitfile_id = bfid")
-        self.assertTrue(0 < len(rows),
-                        "Expected at least one row, got 0")
-        db.close()
+        super(CatalogCacheTest, self).setUp()
+        self.loads = 0
 
     # -------------------------------------------------------------------------
-    def test_select_join_tn(self):
+    def load(self, table=''):
         """
-        DBIdb2Test: Select should support joining tables with temporary table
-        names.
+        CatalogCacheTest: Stand-in for a catalog query
         """
-        self.dbgfunc()
-        db = self.DBI(dbname='sub')
-        rows = db.select(table=['nsobject A', 'bitfile B'],
-                         fields=['A.object_id',
-                                 'A.name',
-                                 'A.bitfile_id',
-                                 'B.bfattr_cos_id'],
-                         where="A.bitfile_id = B.bfid")
-        self.assertTrue(0 < len(rows),
-                        "Expected at least one row, got 0")
-        db.close()
+        self.loads += 1
+        return [(table, self.loads)]
 
     # -------------------------------------------------------------------------
-    def test_select_l_nint(self):
+    def test_copy(self):
         """
-        DBIdb2Test: select with limit not an int should throw an exception
+        CatalogCacheTest: Changing an answer we got back should not change
+        what the cache holds
         """
         self.dbgfunc()
-        db = self.DBI()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.select_l_nint,
-                             db.select,
-                             table="cartridge",
-                             fields=['cart',
-                                     'version',
-                                     'cart_sides'],
-                             limit='not an int')
-        db.close()
+        cache = hx.dbi.CatalogCache(60)
+        rows = cache.get('one', self.load, table='one')
+        rows.append('junk')
+        self.expected([('one', 1)], cache.get('one', self.load, table='one'))
+        self.expected(1, self.loads)
 
     # -------------------------------------------------------------------------
-    def test_select_l_int(self):
+    def test_off(self):
         """
-        DBIdb2Test: select with limit being an int should retrieve the
-        indicated number of records
+        CatalogCacheTest: With a ttl of 0, every get() should load
         """
         self.dbgfunc()
-        db = self.DBI(dbname='sub')
-        rlim = 3
-        rows = db.select(table='nsobject',
-                         fields=["object_id",
-                                 "name",
-                                 "bitfile_id"],
-                         limit=rlim)
-        self.expected(rlim, len(rows))
-        db.close()
+        cache = hx.dbi.CatalogCache(0)
+        for n in range(3):
+            cache.get('one', self.load, table='one')
+        self.expected(3, self.loads)
+        self.expected(0, len(cache))
 
     # -------------------------------------------------------------------------
-    def test_select_l_float(self):
+    def test_ttl(self):
         """
-        DBIdb2Test: select with limit being a float should convert the value to
-        an int (without rounding) and retrieve that number of records
+        CatalogCacheTest: An answer should be reused until it expires or the
+        cache is cleared
         """
         self.dbgfunc()
-        db = self.DBI(dbname='sub')
-        rlim = 4.5
-        rows = db.select(table='nsobject',
-                         fields=["object_id",
-                                 "name",
-                                 "bitfile_id"],
-                         limit=rlim)
-        self.expected(int(rlim), len(rows))
-        db.close()
+        cache = hx.dbi.CatalogCache(0.2)
+        cache.get('one', self.load, table='one')
+        cache.get('one', self.load, table='one')
+        self.expected(1, self.loads)
+        time.sleep(0.3)
+        cache.get('one', self.load, table='one')
+        self.expected(2, self.loads)
+        cache.clear()
+        cache.get('one', self.load, table='one')
+        self.expected(3, self.loads)
+        self.expected({'ttl': 0.2, 'entries': 1, 'hits': 1, 'misses': 3,
+                       'clears': 1}, cache.stats())
 
     # -------------------------------------------------------------------------
-    def test_select_mtf(self):
+    def test_unhashable(self):
         """
-        DBIdb2Test: Calling select() with an empty field list should get an
-        exception -- an empty field list indicates the wildcard option
+        CatalogCacheTest: A key that can't be hashed should go straight to
+        load() without being cached
         """
         self.dbgfunc()
-        db = self.DBI()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.wildcard_selects,
-                             db.select,
-                             table="cos",
-                             fields=[])
-        db.close()
+        cache = hx.dbi.CatalogCache(60)
+        cache.get(('describe', ['bad']), self.load, table='x')
+        self.expected(1, self.loads)
+        self.expected(0, len(cache))
+
+
+# -----------------------------------------------------------------------------
+class CommandCacheTest(hx.testhelp.HelpedTestCase):
+    """
+    Tests for the command cache. These don't need a database -- build()
+    just counts how often it is called.
+    """
+    # -------------------------------------------------------------------------
+    def setUp(self):
+        """
+        CommandCacheTest: Start each test with no builds
+        """
+        super(CommandCacheTest, self).setUp()
+        self.builds = 0
 
     # -------------------------------------------------------------------------
-    def test_select_nf(self):
+    def build(self, table, fields):
         """
-        DBIdb2Test: Calling select() with no field list should get an exception
-        -- fields should default to the empty list, indicating the wildcard
-        option, which is not supported
+        CommandCacheTest: Stand-in for checking arguments and building a
+        statement
         """
-        self.dbgfunc()
-        db = self.DBI()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.wildcard_selects,
-                             db.select,
-                             table='pvlpv')
-        db.close()
+        self.builds += 1
+        return "select %s from %s" % (",".join(fields), table)
 
     # -------------------------------------------------------------------------
-    def test_select_mto(self):
+    def test_full(self):
         """
-        DBIdb2Test: Calling select() with an empty orderby should get the data
-        in the same order as using no orderby at all.
+        CommandCacheTest: When the cache is full, it should start over. With
+        a size of 0, nothing should be kept.
         """
         self.dbgfunc()
-        db = self.DBI(dbname='sub')
-        ordered_rows = db.select(table='bitfile',
-                                 fields=['bfid'],
-                                 orderby='')
-        unordered_rows = db.select(table='bitfile',
-                                   fields=['bfid'])
-        okl = [hx.dbi.DBIdb2.hexstr(x['BFID'])
-               for x in ordered_rows]
-        ukl = [hx.dbi.DBIdb2.hexstr(x['BFID'])
-               for x in unordered_rows]
-        self.expected(ukl, okl)
-        db.close()
+        cache = hx.dbi.CommandCache(2)
+        for table in ['one', 'two', 'three']:
+            cache.get(('select', table), self.build, table, ['a'])
+        self.expected(1, len(cache))
+        self.expected(1, cache.stats()['clears'])
+
+        cache = hx.dbi.CommandCache(0)
+        cache.get(('select', 'one'), self.build, 'one', ['a'])
+        cache.get(('select', 'one'), self.build, 'one', ['a'])
+        self.expected(0, len(cache))
+        self.expected(5, self.builds)
 
     # -------------------------------------------------------------------------
-    def test_select_mtt(self):
+    def test_hit_miss(self):
         """
-        DBIdb2Test: Calling select() with an empty table name should get an
-        exception
+        CommandCacheTest: Asking for the same key again should be a hit and
+        should not build the statement again
         """
         self.dbgfunc()
-        db = self.DBI()
-        exp = hx.msg.tbl_name_notmt_S % "select"
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             exp,
-                             db.select,
-                             table='',
-                             fields=['max(desc_name) as mdn',
-                                     'log_record_type_mask'],
-                             groupby='unknown_field')
-        db.close()
+        cache = hx.dbi.CommandCache(10)
+        for table in ['one', 'one', 'two']:
+            self.expected("select a,b from %s" % table,
+                          cache.get(('select', table, ('a', 'b')),
+                                    self.build, table, ['a', 'b']))
+        stats = cache.stats()
+        self.expected(1, stats['hits'])
+        self.expected(2, stats['misses'])
+        self.expected(2, self.builds)
 
     # -------------------------------------------------------------------------
-    def test_select_mtw(self):
+    def test_unhashable(self):
         """
-        DBIdb2Test: Calling select() with an empty where arg should get the
-        same data as no where arg at all
+        CommandCacheTest: A key that can't be hashed should go straight to
+        build() and not be kept
         """
         self.dbgfunc()
-        db = self.DBI(dbname='sub')
-        flist = ['object_id', 'name', 'bitfile_id']
-        w_rows = db.select(table='nsobject', fields=flist, where='')
-        x_rows = db.select(table='nsobject', fields=flist)
-        self.expected(len(x_rows), len(w_rows))
-        for exp, actual in zip(x_rows, w_rows):
-            self.expected(actual, exp)
-        db.close()
+        cache = hx.dbi.CommandCache(10)
+        cache.get(('select', ['one']), self.build, 'one', ['a'])
+        self.expected(1, self.builds)
+        self.expected(0, len(cache))
 
+
+# -----------------------------------------------------------------------------
+class CursorCacheTest(hx.testhelp.HelpedTestCase):
+    """
+    Tests for the cursor cache. These don't need a database -- 'cursors' are
+    stand-ins that remember whether they've been closed.
+    """
     # -------------------------------------------------------------------------
-    def test_select_ntd(self):
+    class Cursor(object):
         """
-        DBIdb2Test: Calling select() with a non-tuple as the data argument
-        should get an exception
+        CursorCacheTest: Stand-in for a database cursor
         """
-        self.dbgfunc()
-        db = self.DBI()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.data_tuple_S % "select",
-                             db.select,
-                             table="bitfile",
-                             fields=self.fnames,
-                             where="desc_name = ?",
-                             data='prudhoe')
-        db.close()
+        closed = False
+
+        # ---------------------------------------------------------------------
+        def close(self):
+            """
+            CursorCacheTest.Cursor: Note that we've been closed
+            """
+            self.closed = True
 
     # -------------------------------------------------------------------------
-    def test_select_nlf(self):
+    def setUp(self):
         """
-        DBIdb2Test: Calling select() with a non-list as the fields argument
-        should get an exception
+        CursorCacheTest: Set up an empty cache
         """
-        self.dbgfunc()
-        db = self.DBI()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.fields_list_S % "select",
-                             db.select,
-                             table="bitfile",
-                             fields=92,
-                             where="desc_name = ?",
-                             data=('prudhoe', ))
-        db.close()
+        super(CursorCacheTest, self).setUp()
+        self.cache = hx.dbi.CursorCache(self.Cursor)
 
     # -------------------------------------------------------------------------
-    def test_select_nq_ld(self):
+    def test_clear(self):
         """
-        DBIdb2Test: Calling select() with where clause with no '?' and data in
-        the list should get an exception -- the data would be ignored
+        CursorCacheTest: clear() should close the idle cursors. A cursor out
+        on loan at the time should be closed when it comes back.
         """
         self.dbgfunc()
-        db = self.DBI()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.data_ignored,
-                             db.select,
-                             table="bitfile",
-                             fields=self.fnames,
-                             where="desc_name = ''",
-                             data=('prudhoe', ))
-        db.close()
+        with self.cache.cursor('select') as idle:
+            pass
+        with self.cache.cursor('write') as lent:
+            self.cache.clear()
+            self.assertTrue(idle.closed, "Expected idle cursor closed")
+            self.assertFalse(lent.closed, "Expected lent cursor still open")
+        self.assertTrue(lent.closed, "Expected lent cursor closed on return")
+        self.expected(0, len(self.cache))
+        self.expected(1, self.cache.stats()['clears'])
 
     # -------------------------------------------------------------------------
-    def test_select_nq_mtd(self):
+    def test_error(self):
         """
-        DBIdb2Test: Calling select() with where with no '?' and an empty data
-        list is fine. The data returned should match the where clause.
+        CursorCacheTest: A cursor whose with block raises should be closed
+        rather than kept
         """
         self.dbgfunc()
-        db = self.DBI(dbname='sub')
-        crit = 'logfile'
-        rows = db.select(table='nsobject',
-                         fields=['name', 'object_id', 'bitfile_id'],
-                         where="name like '%%%s%%'" % crit,
-                         data=())
-        for x in rows:
-            self.assertTrue(crit in x['NAME'],
-                            "Expected '%s' in '%s' but it's missing" %
-                            (crit, x['NAME']))
-        db.close()
+        try:
+            with self.cache.cursor('select') as cursor:
+                raise ValueError("statement failed")
+        except ValueError:
+            pass
+        self.assertTrue(cursor.closed, "Expected failed cursor closed")
+        self.expected(0, len(self.cache))
 
     # -------------------------------------------------------------------------
-    def test_select_nso(self):
+    def test_reuse(self):
         """
-        DBIdb2Test: Calling select() with a non-string orderby argument should
-        get an exception
+        CursorCacheTest: A cursor should be reused for the same kind of
+        statement. A second one in use at the same time gets its own cursor.
+        Whichever of them comes back last is closed, since by then there's
+        already one idle.
         """
         self.dbgfunc()
-        db = self.DBI()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.select_nso,
-                             db.select,
-                             table="bitfile",
-                             fields=['bfid'],
-                             orderby=22)
-        db.close()
+        with self.cache.cursor('select') as first:
+            with self.cache.cursor('select') as second:
+                self.assertNotEqual(first, second)
+            with self.cache.cursor('write') as write:
+                self.assertNotEqual(first, write)
+        self.assertFalse(second.closed, "Expected second cursor kept")
+        self.assertTrue(first.closed, "Expected surplus cursor closed")
+        with self.cache.cursor('select') as again:
+            self.assertEqual(second, again)
+        stats = self.cache.stats()
+        self.expected(1, stats['hits'])
+        self.expected(3, stats['misses'])
+        self.expected(2, stats['entries'])
+
 
+# -----------------------------------------------------------------------------
+class RetryPolicyTest(hx.testhelp.HelpedTestCase):
+    """
+    Tests for RetryPolicy. The policy gets a fake clock and a sleep() that
+    just advances it, so nothing really waits.
+    """
     # -------------------------------------------------------------------------
-    def test_select_nst(self):
+    def setUp(self):
         """
-        DBIdb2Test: Calling select() with a non-string table argument should
-        get an exception
+        RetryPolicyTest: Start the fake clock
         """
-        self.dbgfunc()
-        db = self.DBI()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.tbl_name_str_S % "select",
-                             db.select,
-                             table=47,
-                             fields=['desc_name'],
-                             orderby=22)
-        db.close()
+        super(RetryPolicyTest, self).setUp()
+        self.now = 1000.0
+        self.sleeps = []
+        self.fails = 0
 
     # -------------------------------------------------------------------------
-    def test_select_nsw(self):
+    def clock(self):
         """
-        DBIdb2Test: Calling select() with a non-string where argument should
-        get an exception
+        RetryPolicyTest: Fake time.time()
         """
-        self.dbgfunc()
-        db = self.DBI()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.where_str_S % "select",
-                             db.select,
-                             table="nsobject",
-                             fields=['name',
-                                     'object_id',
-                                     'bitfile_id'],
-                             where=[])
-        db.close()
+        return self.now
 
     # -------------------------------------------------------------------------
-    def test_select_o(self):
+    def classify(self, err):
         """
-        DBIdb2Test: Calling select() specifying orderby should get the rows in
-        the order requested
+        RetryPolicyTest: Stand-in for err_handler(). ValueErrors are fatal.
         """
-        self.dbgfunc()
-        db = self.DBI(dbname='sub')
-        ordered_rows = db.select(table='bitfile',
-                                 fields=['bfid'],
-                                 orderby='bfid')
+        if isinstance(err, ValueError):
+            raise hx.dbi.DBIerror(str(err))
 
-        ford = [hx.dbi.DBIdb2.hexstr(x['BFID'])
-                for x in ordered_rows]
+    # -------------------------------------------------------------------------
+    def flaky(self, exc=IOError):
+        """
+        RetryPolicyTest: Fail while self.fails is positive, then succeed
+        """
+        if 0 < self.fails:
+            self.fails -= 1
+            raise exc("transient trouble")
+        return "done"
 
-        sord = sorted([hx.dbi.DBIdb2.hexstr(x['BFID'])
-                       for x in ordered_rows])
+    # -------------------------------------------------------------------------
+    def policy(self, **kw):
+        """
+        RetryPolicyTest: Return a policy running on the fake clock
+        """
+        return hx.dbi.RetryPolicy(name='test', sleep=self.sleep,
+                                  clock=self.clock, **kw)
 
-        self.expected(sord, ford)
-        db.close()
+    # -------------------------------------------------------------------------
+    def sleep(self, secs):
+        """
+        RetryPolicyTest: Fake time.sleep()
+        """
+        self.sleeps.append(secs)
+        self.now += secs
 
     # -------------------------------------------------------------------------
-    def test_select_q_ld(self):
+    def test_backoff(self):
         """
-        DBIdb2Test: Calling select() with a where clause containing '?' and
-        data in the data list should return the data matching the where clause
+        RetryPolicyTest: Waits should double up to the cap, less up to the
+        jitter fraction, and start over for the next operation
         """
         self.dbgfunc()
-        db = self.DBI(dbname='sub')
-        crit = 'logfile'
-        rows = db.select(table='nsobject',
-                         fields=['name', 'object_id', 'bitfile_id'],
-                         where="name like '%?%'",
-                         data=(crit,))
-        for x in rows:
-            self.assertTrue(crit in x['NAME'],
-                            "Expected '%s' in '%s' but it's missing" %
-                            (crit, x['NAME']))
-        db.close()
+        pol = self.policy(base=0.1, cap=0.5, jitter=0.5, threshold=0)
+        self.fails = 5
+        self.expected("done", pol.run(IOError, self.classify, self.flaky))
+        for wait, full in zip(self.sleeps, [0.1, 0.2, 0.4, 0.5, 0.5]):
+            self.assertTrue(full / 2 <= wait <= full,
+                            "Expected %s in [%s, %s]" % (wait, full / 2, full))
+        self.fails = 1
+        self.sleeps = []
+        pol.run(IOError, self.classify, self.flaky)
+        self.assertTrue(self.sleeps[0] <= 0.1,
+                        "Expected the backoff to start over, got %s" %
+                        self.sleeps)
+        self.expected(6, pol.stats()['retries'])
 
     # -------------------------------------------------------------------------
-    def test_select_q_mtd(self):
+    def test_breaker(self):
         """
-        DBIdb2Test: Calling select() with a where clause with a '?' and an
-        empty data list should get an exception
+        RetryPolicyTest: After threshold failures in a row, the breaker should
+        open and fail fast. After reset seconds, one trial is let through. If
+        that works, the breaker closes.
         """
         self.dbgfunc()
-        db = self.DBI()
-        self.assertRaisesRegex(hx.dbi.DBIerror,
-                               hx.msg.param_bound_rgx,
-                               db.select,
-                               table="bitfile",
-                               fields=['bfid'],
-                               data=(),
-                               where="DESC_NAME = ?")
-        db.close()
+        pol = self.policy(threshold=3, reset=30.0, jitter=0.0)
+        self.fails = 100
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.breaker_open_S % "transient trouble",
+                             pol.run, IOError, self.classify, self.flaky)
+        self.expected(2, len(self.sleeps))
+        self.expected('open', pol.stats()['state'])
+
+        self.fails = 0
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.breaker_open_S % "transient trouble",
+                             pol.run, IOError, self.classify, self.flaky)
+        self.now += 30.0
+        self.expected("done", pol.run(IOError, self.classify, self.flaky))
+        stats = pol.stats()
+        self.expected('closed', stats['state'])
+        self.expected(1, stats['fast_fails'])
+        self.expected(1, stats['breaker_opens'])
+        self.expected(1, stats['breaker_half_opens'])
+        self.expected(1, stats['breaker_closes'])
 
     # -------------------------------------------------------------------------
-    def test_select_w(self):
+    def test_deadline(self):
         """
-        DBIdb2Test: Calling select() specifying where should get only the rows
-        requested
+        RetryPolicyTest: An operation should give up once the next wait would
+        take it past the deadline
         """
         self.dbgfunc()
-        db = self.DBI(dbname='sub')
-        crit = 'logfile'
-        rows = db.select(table='nsobject',
-                         fields=['name', 'object_id', 'bitfile_id'],
-                         where="name like '%%%s%%'" % crit)
-        for x in rows:
-            self.assertTrue(crit in x['NAME'],
-                            "Expected '%s' in '%s' but it's missing" %
-                            (crit, x['NAME']))
-        db.close()
+        pol = self.policy(deadline=1.0, base=0.1, cap=10.0, jitter=0.0,
+                          threshold=0)
+        self.fails = 100
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             hx.msg.retry_deadline_SS %
+                             (1.0, "transient trouble"),
+                             pol.run, IOError, self.classify, self.flaky)
+        self.expected([0.1, 0.2, 0.4], self.sleeps)
+        self.expected(1, pol.stats()['deadline_exceeded'])
 
     # -------------------------------------------------------------------------
-    def test_table_exists_yes(self):
+    def test_fatal(self):
         """
-        DBIdb2Test: For a table that exists, table_exists() should return True.
+        RetryPolicyTest: An error the classifier rejects should not be
+        retried or count toward the breaker
         """
         self.dbgfunc()
-        db = self.DBI()
-        self.expected(True, db.table_exists(table='cartridge'))
-        db.close()
+        pol = self.policy(threshold=1)
+        self.fails = 1
+        self.assertRaisesMsg(hx.dbi.DBIerror,
+                             "transient trouble",
+                             pol.run, ValueError, self.classify, self.flaky,
+                             exc=ValueError)
+        self.expected([], self.sleeps)
+        self.expected('closed', pol.stats()['state'])
 
+
+# -----------------------------------------------------------------------------
+class StatementCacheTest(hx.testhelp.HelpedTestCase):
+    """
+    Tests for the prepared statement cache. These don't need a database --
+    'statements' are just strings and release() keeps track of what was
+    freed.
+    """
     # -------------------------------------------------------------------------
-    def test_table_exists_no(self):
+    def setUp(self):
         """
-        DBIdb2Test: For a table that does not exist, table_exists() should
-        return False.
+        StatementCacheTest: Set up a cache of three entries
         """
-        self.dbgfunc()
-        db = self.DBI()
-        self.expected(False, db.table_exists(table='nonesuch'))
-        db.close()
+        super(StatementCacheTest, self).setUp()
+        self.freed = []
+        self.cache = hx.dbi.StatementCache(3, release=self.freed.append)
 
     # -------------------------------------------------------------------------
-    def test_insert_exception(self):
+    def prepare(self, cmd):
         """
-        DBIdb2Test: On a db2 database, insert should throw an exception.
+        StatementCacheTest: Stand-in for preparing a statement
         """
-        self.dbgfunc()
-        db = self.DBI()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.db2_unsupported_S % "INSERT",
-                             db.insert,
-                             table="bogus",
-                             data=[('a', 'b', 'c')])
-        db.close()
+        return "stmt(%s)" % cmd
 
     # -------------------------------------------------------------------------
-    def test_create_exception(self):
+    def test_clear(self):
         """
-        DBIdb2Test: On a db2 database, create should throw an exception.
+        StatementCacheTest: clear() should empty the cache and release
+        everything that was in it
         """
         self.dbgfunc()
-        db = self.DBI()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.db2_unsupported_S % "CREATE",
-                             db.create,
-                             table="nonesuch",
-                             fields=self.fdef)
-        db.close()
+        for cmd in ['one', 'two']:
+            self.cache.get(cmd, self.prepare)
+        self.cache.clear()
+        self.expected(0, len(self.cache))
+        self.expected(['stmt(one)', 'stmt(two)'], self.freed)
+        self.expected(1, self.cache.stats()['clears'])
 
     # -------------------------------------------------------------------------
-    def test_delete_exception(self):
+    def test_discard(self):
         """
-        DBIdb2Test: On a db2 database, delete should throw an exception.
+        StatementCacheTest: discard() should drop just the named statement
         """
         self.dbgfunc()
-        db = self.DBI()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.db2_unsupported_S % "DELETE",
-                             db.delete,
-                             table="bogus",
-                             data=[('a',)],
-                             where="field = ?")
-        db.close()
+        for cmd in ['one', 'two']:
+            self.cache.get(cmd, self.prepare)
+        self.cache.discard('one')
+        self.cache.discard('nonesuch')
+        self.expected(['stmt(one)'], self.freed)
+        self.expected(1, len(self.cache))
 
     # -------------------------------------------------------------------------
-    def test_drop_exception(self):
+    def test_evict_lru(self):
         """
-        DBIdb2Test: On a db2 database, drop should throw an exception.
+        StatementCacheTest: When the cache is full, adding a statement should
+        push out the one used least recently
         """
         self.dbgfunc()
-        db = self.DBI()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.db2_unsupported_S % "DROP",
-                             db.drop,
-                             table="bogus")
-        db.close()
+        for cmd in ['one', 'two', 'three', 'one', 'four']:
+            self.cache.get(cmd, self.prepare)
+        self.expected(['stmt(two)'], self.freed)
+        self.expected(3, len(self.cache))
+        self.expected(1, self.cache.stats()['evictions'])
 
     # -------------------------------------------------------------------------
-    def test_update_exception(self):
+    def test_hit_miss(self):
         """
-        DBIdb2Test: On a db2 database, update should throw an exception.
+        StatementCacheTest: Asking for the same statement again should be a
+        hit and should not prepare it again
         """
         self.dbgfunc()
-        db = self.DBI()
-        self.assertRaisesMsg(hx.dbi.DBIerror,
-                             hx.msg.db2_unsupported_S % "UPDATE",
-                             db.update,
-                             table="bogus",
-                             fields=['one', 'two'],
-                             data=[('a', 'b', 'c')],
-                             where="one = ?")
-        db.close()
+        self.expected('stmt(one)', self.cache.get('one', self.prepare))
+        self.expected('stmt(one)', self.cache.get('one', str.upper))
+        stats = self.cache.stats()
+        self.expected(1, stats['hits'])
+        self.expected(1, stats['misses'])
+        self.expected([], self.freed)